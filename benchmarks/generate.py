@@ -0,0 +1,262 @@
+"""
+Generator of synthetic libraries for the benchmarks.
+
+The libraries look like real ones: entries of several types spread over
+nested folders, titles and author names full of LaTeX commands and accents,
+and notes and PDFs for some of the entries. The same seed always generates
+the same library.
+
+Usage: python benchmarks/generate.py DIRECTORY --entries 10000
+"""
+
+from pathlib import Path
+import argparse
+import random
+
+LIBRARY_NAME = "library"
+IMPORT_FILE = "import.bib"
+
+# fraction of the entries with a note and with a PDF
+NOTE_FRACTION = 0.3
+PDF_FRACTION = 0.2
+
+ENTRY_TYPES = (
+    ("article", 60),
+    ("inproceedings", 15),
+    ("book", 10),
+    ("phdthesis", 5),
+    ("misc", 10),
+)
+
+TOPICS = {
+    "chemistry": ("dft", "crystals", "spectroscopy", "catalysis"),
+    "physics": ("quantum", "condensed_matter", "optics"),
+    "biology": ("proteins", "genomics"),
+    "mathematics": ("numerics", "statistics", "topology"),
+    "computing": ("machine_learning", "hpc"),
+}
+SUBFOLDERS = ("reviews", "methods", "applications")
+
+WORDS = (
+    "density functional theory model structure prediction dynamics "
+    "molecular crystal energy surface quantum electronic method analysis "
+    "approach efficient accurate large scale system network learning "
+    "transition state reaction protein folding spectrum measurement "
+    "algorithm convergence stability simulation materials organic "
+    "interaction correlation exchange potential field"
+).split()
+
+# LaTeX fragments inserted in the titles
+LATEX = (
+    r"$\alpha$-helix",
+    r"$\mathrm{H_2O}$",
+    r"\emph{ab initio}",
+    r"\textit{in situ}",
+    r"{DNA}",
+    r"Schr{\"o}dinger",
+    r"$\pi$--$\pi$ stacking",
+    r"{\textsc{Gaussian}}",
+    r"$O(N^3)$",
+    r"M{\o}ller--Plesset",
+    r"{\AA}ngstr{\"o}m",
+    r"$\beta$-sheet",
+)
+
+LAST_NAMES = (
+    "Smith",
+    "Jones",
+    r"M{\"u}ller",
+    r"Garc{\'\i}a",
+    "Ludeña",
+    r"Nagy",
+    r"Kowalczyk",
+    r"Dvo{\v{r}}{\'a}k",
+    "Chen",
+    "Tanaka",
+    r"Gonz{\'a}lez",
+    r"Bront{\"e}",
+    "Okafor",
+    r"Andr{\'e}",
+)
+FIRST_NAMES = (
+    "A.",
+    "Maria",
+    "J. P.",
+    r"Fran{\c{c}}ois",
+    r"J{\"o}rg",
+    "Wei",
+    "Eduardo V.",
+    r"{\'E}milie",
+)
+
+JOURNALS = (
+    "Chemical Science",
+    "Physical Review B",
+    r"Journal of Chemical Physics",
+    r"Nature Communications",
+    r"Proceedings of the {IEEE}",
+)
+
+PDF_BYTES = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n" + b"0" * 1024 + b"\n%%EOF\n"
+
+
+def folders(depth: int = 3) -> list[str]:
+    """
+    Folders of the library, relative to it. The entries are spread over all
+    of them and over the library itself.
+
+    :param depth: Maximum depth of the folders, from 1 to 3
+    :type depth: int
+    :return: List of relative POSIX paths, "" is the library itself
+    :rtype: list[str]
+    """
+    paths = [""]
+    for topic, subtopics in TOPICS.items():
+        paths.append(topic)
+        if depth < 2:
+            continue
+        for subtopic in subtopics:
+            paths.append(f"{topic}/{subtopic}")
+            if depth < 3:
+                continue
+            for subfolder in SUBFOLDERS:
+                paths.append(f"{topic}/{subtopic}/{subfolder}")
+
+    return paths
+
+
+def make_title(rng: random.Random) -> str:
+    words = rng.sample(WORDS, rng.randint(4, 12))
+    for _ in range(rng.randint(1, 3)):
+        words.insert(rng.randrange(len(words) + 1), rng.choice(LATEX))
+    words[0] = words[0][0].upper() + words[0][1:]
+
+    return " ".join(words)
+
+
+def make_entry(rng: random.Random, key: str) -> str:
+    """
+    BibTeX source of a random entry
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param key: Key of the entry
+    :type key: str
+    :return: BibTeX entry
+    :rtype: str
+    """
+    entry_type = rng.choices(
+        [name for name, _ in ENTRY_TYPES],
+        [weight for _, weight in ENTRY_TYPES],
+    )[0]
+    authors = " and ".join(
+        f"{rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}"
+        for _ in range(rng.randint(1, 8))
+    )
+    fields = [
+        ("title", make_title(rng)),
+        ("author", authors),
+        ("year", str(rng.randint(1950, 2025))),
+    ]
+    if entry_type == "article":
+        fields.extend(
+            (
+                ("journal", rng.choice(JOURNALS)),
+                ("volume", str(rng.randint(1, 150))),
+                ("pages", f"{rng.randint(1, 500)}--{rng.randint(501, 999)}"),
+            )
+        )
+    elif entry_type == "book":
+        fields.append(("publisher", "Springer"))
+    elif entry_type == "inproceedings":
+        fields.append(("booktitle", rng.choice(JOURNALS)))
+    elif entry_type == "phdthesis":
+        fields.append(("school", r"Universit{\'e} de Lyon"))
+    if rng.random() < 0.7:
+        fields.append(("doi", f"10.{rng.randint(1000, 9999)}/{key}"))
+    if rng.random() < 0.3:
+        fields.append(
+            ("abstract", " ".join(rng.choices(WORDS, k=rng.randint(50, 150))))
+        )
+
+    lines = [f"@{entry_type}{{{key},"]
+    lines.extend(f"    {name:<10} = {{{value}}}," for name, value in fields)
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+
+def make_key(rng: random.Random, used: set[str]) -> str:
+    """
+    Unique key in the usual author_word_year form
+    """
+    last = rng.choice(LAST_NAMES)
+    last = "".join(c for c in last.lower() if c.isascii() and c.isalpha())
+    key = f"{last}_{rng.choice(WORDS)}_{rng.randint(1950, 2025)}"
+    unique = key
+    suffix = 0
+    while unique in used:
+        suffix += 1
+        unique = f"{key}_{suffix}"
+    used.add(unique)
+
+    return unique
+
+
+def generate_library(root: Path, entries: int, seed: int = 0) -> Path:
+    """
+    Generate a library with a .bibman.toml file in a directory, and a file
+    with as many other entries to be imported into it.
+
+    :param root: Directory of the .bibman.toml file, created if needed
+    :type root: Path
+    :param entries: Number of entries of the library
+    :type entries: int
+    :param seed: Seed of the random number generator
+    :type seed: int
+    :return: Path to the library
+    :rtype: Path
+    """
+    from bibmancli.config_file import create_toml_contents
+
+    rng = random.Random(seed)
+    library = root / LIBRARY_NAME
+    library.mkdir(parents=True)
+    (root / ".bibman.toml").write_text(create_toml_contents(LIBRARY_NAME))
+
+    paths = folders()
+    for folder in paths[1:]:
+        (library / folder).mkdir(parents=True)
+
+    used = set()
+    for _ in range(entries):
+        key = make_key(rng, used)
+        folder = library / rng.choice(paths)
+        (folder / f"{key}.bib").write_text(make_entry(rng, key))
+        if rng.random() < NOTE_FRACTION:
+            (folder / f".{key}.txt").write_text(
+                " ".join(rng.choices(WORDS, k=rng.randint(10, 80))) + "\n"
+            )
+        if rng.random() < PDF_FRACTION:
+            (folder / f"{key}.pdf").write_bytes(PDF_BYTES)
+
+    with open(root / IMPORT_FILE, "w") as f:
+        for _ in range(entries):
+            f.write(make_entry(rng, make_key(rng, used)) + "\n")
+
+    return library
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", type=Path, help="Directory to create")
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    library = generate_library(args.directory, args.entries, args.seed)
+    print(f"Library with {args.entries} entries written in '{library}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Benchmarks of the commands that go through the whole library.
+
+For every size, a synthetic library is generated (see generate.py) and each
+benchmark is run several times in a new process, so the times include the
+startup of bibman like for a user. The results are written as JSON, and can
+be compared with the results of a previous run to find the benchmarks that
+got slower.
+
+Usage:
+    python benchmarks/run.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/run.py --sizes 1000 --compare results.json
+"""
+
+from pathlib import Path
+from collections.abc import Callable
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate import generate_library, IMPORT_FILE
+
+FORMAT_VERSION = 1
+DEFAULT_SIZES = (1000, 10000, 100000)
+# ratio of the median times from which a benchmark is reported as slower
+REGRESSION_THRESHOLD = 1.2
+
+
+def bibman(*args: str) -> list[str]:
+    """
+    Command running bibman without the daemon
+    """
+    return [sys.executable, "-m", "bibmancli", "--no-daemon", *args]
+
+
+def python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def benchmarks(root: Path, library: Path) -> dict[str, Callable[[int], list]]:
+    """
+    Commands of the benchmarks, by name. Each function gets the number of the
+    run and returns the command to time.
+
+    The benchmarks run in this order, the ones that change the library last.
+
+    :param root: Directory of the .bibman.toml file
+    :type root: Path
+    :param library: Path to the library
+    :type library: Path
+    :return: Dictionary of benchmark names and functions
+    :rtype: dict[str, Callable[[int], list]]
+    """
+    location = ("--location", str(root))
+    return {
+        "iterate_files": lambda run: python(
+            "from pathlib import Path\n"
+            "from bibmancli.utils import iterate_files\n"
+            f"for _ in iterate_files(Path({str(library)!r}), use_index=False):\n"
+            "    pass\n"
+        ),
+        "show": lambda run: bibman("show", *location),
+        "export": lambda run: bibman(
+            "export", "--filename", str(root / f"export_{run}.bib"), *location
+        ),
+        "html": lambda run: bibman("html", "--yes", "--rebuild", *location),
+        "check library": lambda run: bibman(
+            "check", "library", "--no-cache", *location
+        ),
+        "index build": lambda run: bibman("index", "build", *location),
+        "iterate_files (index)": lambda run: python(
+            "from pathlib import Path\n"
+            "from bibmancli.utils import iterate_files\n"
+            f"for _ in iterate_files(Path({str(library)!r})):\n"
+            "    pass\n"
+        ),
+        # every run imports the entries in a new folder
+        "import": lambda run: bibman(
+            "import",
+            str(root / IMPORT_FILE),
+            "--folder",
+            f"imported_{run}",
+            *location,
+        ),
+    }
+
+
+def time_command(command: list[str]) -> float:
+    """
+    Run a command and measure its wall time
+
+    :param command: Command to run
+    :type command: list[str]
+    :return: Time in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        command,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"{' '.join(command)} failed:\n{process.stderr.decode()}"
+        )
+
+    return elapsed
+
+
+def run_size(size: int, repeat: int, selected: set[str] | None) -> dict:
+    """
+    Generate a library and run the benchmarks on it
+
+    :param size: Number of entries of the library
+    :type size: int
+    :param repeat: Number of runs of each benchmark
+    :type repeat: int
+    :param selected: Names of the benchmarks to run, all if None
+    :type selected: set[str] | None
+    :return: Results of the benchmarks, by name
+    :rtype: dict
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as dir:
+        root = Path(dir)
+        start = time.perf_counter()
+        library = generate_library(root, size)
+        print(
+            f"{size} entries: generated in {time.perf_counter() - start:.1f}s"
+        )
+
+        for name, command in benchmarks(root, library).items():
+            if selected is not None and name not in selected:
+                continue
+
+            times = [time_command(command(run)) for run in range(repeat)]
+            results[name] = {
+                "times": times,
+                "min": min(times),
+                "median": statistics.median(times),
+            }
+            print(f"  {name:<24} {results[name]['median']:8.3f}s")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compare the median times of two runs of the benchmarks
+
+    :param results: Results of this run
+    :type results: dict
+    :param baseline: Results of a previous run
+    :type baseline: dict
+    :param threshold: Ratio of the times from which a benchmark is slower
+    :type threshold: float
+    :return: Names of the benchmarks that got slower, with their size
+    :rtype: list[str]
+    """
+    slower = []
+    print(f"\nCompared with the run of {baseline['date']}:")
+    for size, benchmarks in results["results"].items():
+        for name, result in benchmarks.items():
+            previous = baseline["results"].get(size, {}).get(name)
+            if previous is None:
+                continue
+
+            ratio = result["median"] / previous["median"]
+            mark = ""
+            if ratio >= threshold:
+                mark = "  SLOWER"
+                slower.append(f"{name} ({size} entries)")
+            print(
+                f"  {size:>7} {name:<24} {previous['median']:8.3f}s "
+                f"-> {result['median']:8.3f}s  x{ratio:.2f}{mark}"
+            )
+
+    return slower
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", nargs="+", help="Names of the benchmarks to run"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file of the results")
+    parser.add_argument(
+        "--compare", type=Path, help="JSON file of a previous run"
+    )
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    from bibmancli.version import __version__
+
+    results = {
+        "format": FORMAT_VERSION,
+        "bibman": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "repeat": args.repeat,
+        # sizes are strings, the keys of JSON objects
+        "results": {
+            str(size): run_size(
+                size, args.repeat, None if args.only is None else set(args.only)
+            )
+            for size in args.sizes
+        },
+    }
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print("\nSlower: " + ", ".join(slower))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
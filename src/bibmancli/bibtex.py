@@ -8,6 +8,11 @@ from bibtexparser.model import Entry as BibEntry
 from bibtexparser.entrypoint import parse_string, parse_file, write_string
 from bibtexparser.writer import BibtexFormat
 from pathlib import Path
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import os
+import re
 
 
 # From https://github.com/timothygebhard/doi2bibtex/blob/main/doi2bibtex/bibtex.py
@@ -82,6 +87,114 @@ def file_to_bib(file: Path) -> Library:
     return bib_library
 
 
+def resolve_jobs(jobs: int) -> int:
+    """
+    Get the number of worker processes to use. 0 means one per CPU core.
+
+    :param jobs: Requested number of worker processes
+    :type jobs: int
+    :return: Number of worker processes
+    :rtype: int
+    """
+    if jobs <= 0:
+        return os.cpu_count() or 1
+
+    return jobs
+
+
+def chunk_size(count: int, jobs: int) -> int:
+    """
+    Number of files sent to each worker process at once. A few chunks are
+    created per worker, so the load stays balanced.
+
+    :param count: Number of files to parse
+    :type count: int
+    :param jobs: Number of worker processes
+    :type jobs: int
+    :return: Chunk size
+    :rtype: int
+    """
+    return max(1, min(256, count // (jobs * 4)))
+
+
+def try_file_to_bib(file: Path) -> Library | None:
+    """
+    Parse a file into a BibTeX library, like file_to_bib, without raising
+    an error if the file can not be parsed.
+
+    :param file: Path to the file
+    :type file: pathlib.Path
+    :return: BibTeX library, or None if the file can not be read or parsed or does not contain exactly one entry
+    :rtype: bibtexparser.library.Library | None
+    """
+    try:
+        return file_to_bib(file)
+    except Exception:
+        return None
+
+
+def files_to_bib(
+    files: Iterable[Path], jobs: int = 1, skip_errors: bool = False
+) -> Iterator[Library | None]:
+    """
+    Parse many files into BibTeX libraries, using file_to_bib on each of them.
+    With more than one job the files are parsed in chunks by a pool of worker
+    processes. The libraries are always yielded in the same order as the files.
+
+    :param files: Paths to the files
+    :type files: Iterable[pathlib.Path]
+    :param jobs: Number of worker processes, 0 means one per CPU core
+    :type jobs: int
+    :param skip_errors: Yield None for the files that can not be parsed instead of raising an error
+    :type skip_errors: bool
+    :return: Generator yielding BibTeX libraries
+    :rtype: Iterator[bibtexparser.library.Library | None]
+    """
+    parse = try_file_to_bib if skip_errors else file_to_bib
+    jobs = resolve_jobs(jobs)
+    if jobs == 1:
+        yield from map(parse, files)
+        return
+
+    files = list(files)
+    if len(files) == 0:
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(
+            parse, files, chunksize=chunk_size(len(files), jobs)
+        )
+
+
+# Key of the first entry of a BibTeX string, if the string starts with it
+ENTRY_KEY = re.compile(rb"\A\s*@\s*(\w+)\s*[{(]\s*([^\s,{}()]+)\s*,")
+
+# Format used to write the entries
+FORMAT = BibtexFormat()
+FORMAT.value_column = 13
+FORMAT.trailing_comma = True
+FORMAT.indent = "    "
+
+
+def raw_entry_key(contents: bytes) -> str | None:
+    """
+    Get the key of the entry in the contents of a .bib file without parsing it.
+
+    :param contents: Contents of the .bib file
+    :type contents: bytes
+    :return: Key of the entry, or None if the contents do not start with an entry
+    :rtype: str | None
+    """
+    match = ENTRY_KEY.match(contents)
+    if match is None:
+        return None
+
+    if match.group(1).lower() in (b"comment", b"string", b"preamble"):
+        return None
+
+    return match.group(2).decode()
+
+
 def bib_to_string(bib_library: Library | BibEntry) -> str:
     """
     Convert a BibTeX library or entry to a string.
@@ -96,16 +209,169 @@ def bib_to_string(bib_library: Library | BibEntry) -> str:
         bib_library = Library()
         bib_library.add(entry)
 
-    format = BibtexFormat()
-    format.value_column = 13
-    format.trailing_comma = True
-    format.indent = "    "
-
-    bib_str = write_string(bib_library, bibtex_format=format)
+    bib_str = write_string(bib_library, bibtex_format=FORMAT)
 
     return bib_str
 
 
+# Type of the block starting in a line, if the line starts a block
+BLOCK_START = re.compile(r"\s*@\s*(\w+)\s*([{(])")
+# characters after which a block whose braces are not balanced is ended at
+# the next line starting with '@', so a broken entry can not take the rest
+# of the file
+MAX_BLOCK_SIZE = 1 << 20
+
+
+def iter_entry_chunks(
+    file: Path, chunk_size: int = 500
+) -> Iterator[tuple[str, int]]:
+    """
+    Read a .bib file in chunks of whole entries, without loading the whole
+    file in memory. Entries are split at the lines starting with '@' that
+    are not inside the braces or quotes of the previous block.
+
+    @string and @preamble blocks are kept and added at the start of every
+    following chunk, so the string references can be resolved when parsing
+    each chunk on its own. @comment blocks are dropped.
+
+    :param file: Path to the file
+    :type file: pathlib.Path
+    :param chunk_size: Number of entries in each chunk
+    :type chunk_size: int
+    :return: Generator yielding the chunk text and the number of bytes read so far
+    :rtype: Iterator[tuple[str, int]]
+    """
+    definitions = []  # @string and @preamble blocks
+    chunk = []
+    entries = 0
+    block = []
+    block_type = None
+    block_size = 0
+    position = 0
+    # state of the block being read
+    inside = False
+    paren = False
+    depth = 0
+    in_quote = False
+
+    def scan(text: str):
+        """
+        Follow the braces and quotes of the block until it is closed
+        """
+        nonlocal inside, depth, in_quote
+        i = 0
+        while i < len(text):
+            c = text[i]
+            if c == "\\":
+                i += 1
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if not paren and depth <= 0:
+                    inside = False
+                    return
+            elif c == '"' and depth == (0 if paren else 1):
+                in_quote = not in_quote
+            elif c == ")" and paren and depth == 0 and not in_quote:
+                inside = False
+                return
+            i += 1
+
+    def end_block():
+        nonlocal entries
+        if block_type is None:
+            return
+        if block_type in ("string", "preamble"):
+            definitions.append("".join(block))
+        elif block_type != "comment":
+            chunk.append("".join(block))
+            entries += 1
+
+    with open(file, "rb") as f:
+        for raw_line in f:
+            position += len(raw_line)
+            line = raw_line.decode("utf-8", errors="replace")
+
+            match = BLOCK_START.match(line)
+            if match is not None and (
+                not inside or block_size > MAX_BLOCK_SIZE
+            ):
+                end_block()
+                block = []
+                block_type = match.group(1).lower()
+                block_size = 0
+
+                if entries >= chunk_size:
+                    yield "".join(definitions + chunk), position - len(raw_line)
+                    chunk = []
+                    entries = 0
+
+                inside = True
+                paren = match.group(2) == "("
+                depth = 0 if paren else 1
+                in_quote = False
+                scan(line[match.end() :])
+            elif inside:
+                scan(line)
+
+            block.append(line)
+            block_size += len(line)
+
+        end_block()
+        if entries > 0:
+            yield "".join(definitions + chunk), position
+
+
+def parse_chunk(chunk: str) -> tuple[list[tuple[str, str]], int]:
+    """
+    Parse a chunk of BibTeX entries and write each of them as a string.
+
+    :param chunk: BibTeX string
+    :type chunk: str
+    :return: List of (key, BibTeX string) pairs and number of blocks that could not be parsed
+    :rtype: tuple[list[tuple[str, str]], int]
+    """
+    bib_library = parse_string(chunk)
+
+    entries = [
+        (entry.key, bib_to_string(entry)) for entry in bib_library.entries
+    ]
+
+    return entries, len(bib_library.failed_blocks)
+
+
+def parse_chunks(
+    chunks: Iterable[str], jobs: int = 1
+) -> Iterator[tuple[list[tuple[str, str]], int]]:
+    """
+    Parse chunks of BibTeX entries with parse_chunk, in order. With more than
+    one job the chunks are parsed by a pool of worker processes, keeping only
+    a few chunks in flight so that memory use stays bounded.
+
+    :param chunks: BibTeX strings
+    :type chunks: Iterable[str]
+    :param jobs: Number of worker processes, 0 means one per CPU core
+    :type jobs: int
+    :return: Generator yielding the result of parse_chunk for each chunk
+    :rtype: Iterator[tuple[list[tuple[str, str]], int]]
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1:
+        yield from map(parse_chunk, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(parse_chunk, chunk))
+            if len(in_flight) >= 2 * jobs:
+                yield in_flight.popleft().result()
+
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
 def file_to_library(file: Path) -> Library:
     """
     Parse a file into a BibTeX library.
@@ -2,31 +2,20 @@ import typer
 from typing_extensions import Annotated
 from typing import Optional, List
 from pathlib import Path
-from rich.prompt import Confirm
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.syntax import Syntax
 from rich.console import Console
 import shutil
-from pyfzf import FzfPrompt
 from collections.abc import Iterable
-from bibmancli.resolve import resolve_identifier
-from bibmancli.bibtex import bib_to_string, file_to_bib, file_to_library
-from bibmancli.utils import (
-    in_path,
-    Entry,
-    QueryFields,
-    iterate_files,
-    create_html,
-)
 from bibmancli.config_file import (
     find_library,
     get_library,
     create_toml_contents,
 )
-from bibmancli.subcommands import check, pdf
-from bibmancli.tui import BibApp
+from bibmancli.subcommands import check, pdf, index, daemon
 from bibmancli.version import __version__
-from requests import ReadTimeout
+
+# Heavy dependencies (textual, requests, bibtexparser, pylatexenc, ...) are
+# imported inside the commands that use them, so that each command only pays
+# for what it needs at startup.
 
 
 app = typer.Typer(
@@ -42,6 +31,8 @@ app = typer.Typer(
 )
 app.add_typer(check.app, name="check")
 app.add_typer(pdf.app, name="pdf")
+app.add_typer(index.app, name="index")
+app.add_typer(daemon.app, name="daemon")
 
 console = Console()
 err_console = Console(stderr=True)
@@ -58,6 +49,7 @@ def version_callback(value: bool):
 
 @app.callback()
 def app_callback(
+    ctx: typer.Context,
     value: Annotated[
         Optional[bool],
         typer.Option(
@@ -67,21 +59,144 @@ def app_callback(
             callback=version_callback,
         ),
     ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs",
+            "-j",
+            min=0,
+            help="Number of processes used to parse the library, 0 uses all CPU cores",
+        ),
+    ] = 1,
+    use_daemon: Annotated[
+        bool,
+        typer.Option(
+            "--daemon/--no-daemon",
+            help="Use the daemon of the library if it is running",
+        ),
+    ] = True,
 ):
     """
     Add app options.
 
     --version shows the version number.
+    --jobs is the number of processes used to parse the library files. Default is 1.
+    --daemon/--no-daemon sends the show, search, export and note commands to the daemon of the library when it is running (see bibman daemon). Default is --daemon.
+    """
+    ctx.obj = {"jobs": jobs, "daemon": use_daemon}
+
+
+def daemon_messages(
+    ctx: typer.Context, location: Path, command: str, args: dict
+) -> Iterable[dict] | None:
+    """
+    Send a command to the daemon of the library, if one is running
+
+    :param ctx: Context of the running command
+    :type ctx: typer.Context
+    :param location: Path to the library
+    :type location: Path
+    :param command: Name of the command
+    :type command: str
+    :param args: Arguments of the command
+    :type args: dict
+    :return: Messages of the answer, or None if the command must run locally
+    :rtype: Iterable[dict] | None
+    """
+    obj = ctx.find_root().obj
+    if isinstance(obj, dict) and not obj.get("daemon", True):
+        return None
+
+    from itertools import chain
+    from bibmancli.daemon import request
+
+    messages = request(location, command, args)
+    if messages is None:
+        return None
+
+    try:
+        first = next(messages)
+    except (OSError, ValueError, StopIteration):
+        # the daemon is stopping or broken, run locally
+        return None
+    if "fallback" in first:
+        return None
+
+    def remaining() -> Iterable[dict]:
+        try:
+            yield from messages
+        except (OSError, ValueError) as e:
+            err_console.print(
+                f"[bold red]ERROR[/] Lost connection to the daemon: {e}"
+            )
+            raise typer.Exit(1)
+
+    return chain([first], remaining())
+
+
+def run_in_daemon(
+    ctx: typer.Context, location: Path, command: str, args: dict
+) -> bool:
     """
-    pass
+    Run a command in the daemon of the library, if one is running, and print
+    its output
+
+    :param ctx: Context of the running command
+    :type ctx: typer.Context
+    :param location: Path to the library
+    :type location: Path
+    :param command: Name of the command
+    :type command: str
+    :param args: Arguments of the command
+    :type args: dict
+    :return: False if the command must run locally
+    :rtype: bool
+    """
+    messages = daemon_messages(ctx, location, command, args)
+    if messages is None:
+        return False
+
+    for message in messages:
+        if "out" in message:
+            console.print("\n".join(message["out"]))
+        if "err" in message:
+            err_console.print("\n".join(message["err"]))
+        if message.get("exit"):
+            raise typer.Exit(message["exit"])
+
+    return True
 
 
 @app.command()
 def add(
-    identifier: Annotated[str, typer.Argument(help="Identifier of the entry")],
+    identifier: Annotated[
+        Optional[str], typer.Argument(help="Identifier of the entry")
+    ] = None,
+    from_file: Annotated[
+        Optional[typer.FileText],
+        typer.Option(
+            help="File with one identifier per line, '-' to read them from stdin"
+        ),
+    ] = None,
+    workers: Annotated[
+        int,
+        typer.Option(
+            min=1, help="Number of identifiers resolved at the same time"
+        ),
+    ] = 8,
     timeout: Annotated[
         float, typer.Option(min=1.0, help="Request timeout in seconds")
     ] = 5.0,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache/--no-cache", help="Use the cache of resolved identifiers"
+        ),
+    ] = True,
+    refresh: Annotated[
+        bool,
+        typer.Option(help="Resolve the identifiers again, even if cached"),
+    ] = False,
     name: Annotated[Optional[str], typer.Option(help="Name of file")] = None,
     folder: Annotated[
         Optional[str],
@@ -113,7 +228,12 @@ def add(
     Add a new BibTeX entry to the library.
 
     IDENTIFIER can be a URL of an article, DOI, PMCID or PMID.
+    The identifier is resolved with the Wikipedia citation API and CrossRef. The one that answered faster in previous runs is asked first, and the other one is also asked if there is no answer after one second.
+    --from-file adds the identifiers of a file (one per line, '-' to read from stdin) instead of IDENTIFIER. They are resolved concurrently and saved without confirmation as they arrive, with the key of each entry as file name.
+    --workers is the number of identifiers resolved at the same time with --from-file. Default is 8.
     --timeout is the time in seconds to wait for the request. Default is 5 seconds.
+    --cache uses the responses cached in the user cache directory for the identifiers resolved before, also when offline. --no-cache disables it. Default is --cache.
+    --refresh resolves the identifiers again and updates the cache.
     --name is the name of the file to save the entry. If not provided, the key of the entry is used.
     --folder is the folder where the entry will be saved. If not provided, the file is saved in the root of the library location.
     --note is a note to save with the entry. Default is "No notes for this entry."
@@ -136,18 +256,67 @@ def add(
             )
             raise typer.Exit(1)
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn(text_format="[progress.description]{task.description}"),
-        transient=True,
-        console=console,
-    ) as progress:
+    if (identifier is None) == (from_file is None):
+        err_console.print(
+            "[bold red]ERROR[/] Provide either an IDENTIFIER or the --from-file option"
+        )
+        raise typer.Exit(1)
+
+    if from_file is not None:
+        if name is not None:
+            err_console.print(
+                "[bold red]ERROR[/] --name can not be used with --from-file"
+            )
+            raise typer.Exit(1)
+
+        # skip empty lines, comments and repeated identifiers
+        identifiers = dict.fromkeys(
+            line.strip()
+            for line in from_file
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+
+        if folder is None:
+            save_location: Path = location
+        else:
+            save_location: Path = location.joinpath(*folder.split("/"))
+            save_location.mkdir(parents=True, exist_ok=True)
+
+        add_identifiers(
+            list(identifiers),
+            save_location,
+            note,
+            timeout,
+            workers,
+            cache,
+            refresh,
+        )
+        return
+
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.syntax import Syntax
+    from rich.prompt import Confirm
+    from requests import ReadTimeout
+    from bibmancli.resolve import ResolverChain
+    from bibmancli.bibtex import bib_to_string
+    from bibmancli.response_cache import open_cache
+
+    with (
+        open_cache(cache) as response_cache,
+        ResolverChain(cache=response_cache, refresh=refresh) as chain,
+        Progress(
+            SpinnerColumn(),
+            TextColumn(text_format="[progress.description]{task.description}"),
+            transient=True,
+            console=console,
+        ) as progress,
+    ):
         # get the bibtex citation
         progress.add_task(
             description=f"Searching BibTeX entry for {identifier}..."
         )
         try:
-            bibtex_library = resolve_identifier(identifier, timeout)
+            bibtex_library = chain.resolve(identifier, timeout)
         except RuntimeError as e:
             progress.stop()
             err_console.print(
@@ -222,6 +391,114 @@ def add(
         f.write(note)
 
 
+def add_identifiers(
+    identifiers: list[str],
+    save_location: Path,
+    note: str,
+    timeout: float,
+    workers: int,
+    cache: bool = True,
+    refresh: bool = False,
+) -> None:
+    """
+    Resolve many identifiers concurrently and save each entry as soon as it
+    is resolved, printing a summary of the failures at the end.
+
+    :param identifiers: Identifiers of the entries
+    :type identifiers: list[str]
+    :param save_location: Folder where the entries are saved
+    :type save_location: Path
+    :param note: Note saved with every entry
+    :type note: str
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param workers: Number of identifiers resolved at the same time
+    :type workers: int
+    :param cache: Use the cache of resolved identifiers
+    :type cache: bool
+    :param refresh: Resolve the identifiers again, even if cached
+    :type refresh: bool
+    """
+    from rich.progress import (
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        BarColumn,
+        MofNCompleteColumn,
+    )
+    from bibmancli.resolve import resolve_identifiers, ResolverChain
+    from bibmancli.bibtex import bib_to_string
+    from bibmancli.companions import note_name
+    from bibmancli.response_cache import open_cache
+
+    if len(identifiers) == 0:
+        err_console.print("[bold yellow]WARNING[/] No identifiers found")
+        raise typer.Exit(1)
+
+    added = 0
+    existing = []
+    failed = []
+    with (
+        open_cache(cache) as response_cache,
+        ResolverChain(cache=response_cache, refresh=refresh) as chain,
+        Progress(
+            SpinnerColumn(),
+            TextColumn(text_format="[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            transient=True,
+            console=console,
+        ) as progress,
+    ):
+        task = progress.add_task(
+            description="Resolving identifiers...", total=len(identifiers)
+        )
+        results = resolve_identifiers(
+            identifiers,
+            timeout,
+            workers,
+            chain,
+        )
+        for result in results:
+            progress.advance(task)
+            if result.error is not None:
+                progress.console.print(
+                    f":red_circle: [red]Could not resolve[/] '{result.identifier}': {result.error}"
+                )
+                failed.append(result)
+                continue
+
+            entry = result.library.entries[0]
+            save_path = save_location / (entry.key + ".bib")
+            note_path = save_location / note_name(save_path.name)
+            if save_path.is_file() or note_path.is_file():
+                progress.console.print(
+                    f"[yellow]Entry '{entry.key}' already exists[/], skipping '{result.identifier}'"
+                )
+                existing.append(result)
+                continue
+
+            with open(save_path, "w") as f:
+                f.write(bib_to_string(result.library))
+
+            with open(note_path, "w") as f:
+                f.write(note)
+
+            progress.console.print(
+                f"[green]Added[/] '{result.identifier}' as '{save_path.name}'"
+            )
+            added += 1
+
+    console.print(
+        f"[bold green]{added}[/] entries added to '{save_location}', [yellow]{len(existing)}[/] already existed, [red]{len(failed)}[/] identifiers could not be resolved"
+    )
+    if failed:
+        err_console.print("Identifiers that could not be resolved:")
+        for result in failed:
+            err_console.print(f"  {result.identifier}: {result.error}")
+        raise typer.Exit(1)
+
+
 @app.command()
 def remove(
     name: Annotated[str, typer.Argument(help="Name of the entry to remove")],
@@ -276,20 +553,25 @@ def remove(
     if not name.endswith(".bib"):
         name = name + ".bib"
 
-    entry_path = search_location / name
-    note_path = search_location / ("." + name.replace(".bib", ".txt"))
-    pdf_path = search_location / name.replace(".bib", ".pdf")
+    from bibmancli.companions import CompanionResolver
+
+    # list the folder once to find the entry, its note and its PDF
+    companions = CompanionResolver().resolve(search_location / name)
 
-    if not entry_path.is_file():
+    if companions.entry is None:
         err_console.print(
             f"[red]Entry for '{name}' in '{search_location}' not found![/]"
         )
-        raise typer.Exit(1)
+        from bibmancli.fuzzy import suggestion_names
 
-    note_exists = note_path.is_file()
-    pdf_exists = pdf_path.is_file()
+        suggestions = suggestion_names(location, name)
+        if suggestions:
+            err_console.print("Did you mean: " + ", ".join(suggestions))
+        raise typer.Exit(1)
 
     if not yes:
+        from rich.prompt import Confirm
+
         if not Confirm.ask(
             f"Do you want to remove '{name}' and its associated note and pdf?",
             console=console,
@@ -297,24 +579,29 @@ def remove(
             err_console.print("[red]Entry left untouched[/]")
             raise typer.Exit(1)
 
-    entry_path.unlink()
+    companions.entry.unlink()
     console.print(f"[bold green]Entry '{name}' removed![/]")
-    if note_exists:
+    if companions.note is not None:
         console.print(f"[bold green]Note for '{name}' removed![/]")
-        note_path.unlink()
-    if pdf_exists:
+        companions.note.unlink()
+    if companions.pdf is not None:
         console.print(f"[bold green]PDF for '{name}' removed![/]")
-        pdf_path.unlink()
+        companions.pdf.unlink()
 
 
 @app.command()
 def show(
+    ctx: typer.Context,
     filter_title: Annotated[
         Optional[str], typer.Option(help="Filter by title")
     ] = None,
     filter_entry_types: Annotated[
         Optional[List[str]], typer.Option(help="Filter by entry type")
     ] = None,
+    fuzzy: Annotated[
+        Optional[str],
+        typer.Option(help="Typo-tolerant search by key, title or author"),
+    ] = None,
     output_format: Annotated[
         str, typer.Option(help="Output format of the entries")
     ] = "{path}: {title}",  # path, title, author, year, month, entry
@@ -328,7 +615,6 @@ def show(
         List[str], typer.Option(help="Default options for fzf")
     ] = [
         "-m",
-        "--preview='cat {}'",
         "--preview-window=wrap",
     ],
     location: Annotated[
@@ -348,10 +634,11 @@ def show(
 
     --filter-title filters the entries by title.
     --filter-entry-types filters the entries by type. For example, 'article', 'book', 'inproceedings', etc.
-    --output-format is the format of the output. Default is "{path}: {title}". Available fields are: path, title, author, year, month, entry_name, entry_type.
+    --fuzzy shows the entries whose key, title or author last names are the closest to the text, tolerating typos. The closest matches are shown first.
+    --output-format is the format of the output. Default is "{path}: {title}". Available fields are: path, entry_name, entry_type and any field of the entry (title, author, year, month, doi, ...). Use "{field|default}" to set the text shown when a field is missing.
     --simple-output shows only the path of the entry. Overrides --output-format, setting it to "{path}".
-    --interactive uses fzf to interactively search the entries.
-    --fzf-default-opts are the default options for fzf. Defaults are ["-m", "--preview='cat {}'", "--preview-window=wrap"].
+    --interactive uses fzf to interactively search the key, title, authors and year of the entries, read from the library index. The index is created if it does not exist.
+    --fzf-default-opts are the default options for fzf. Defaults are ["-m", "--preview-window=wrap"]. The path of the entry is the field {3} of the lines.
     --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
     """
     if location is None:
@@ -369,9 +656,31 @@ def show(
             )
             raise typer.Exit(1)
 
+    from bibmancli.utils import (
+        in_path,
+        get_jobs,
+        Entry,
+        QueryFields,
+        iterate_files,
+    )
+    from bibmancli.template import compile_format
+
     if simple_output:  # overrides output_format
         output_format = "{path}"
 
+    if not interactive and run_in_daemon(
+        ctx,
+        location,
+        "show",
+        {
+            "output_format": output_format,
+            "filter_title": filter_title,
+            "filter_entry_types": filter_entry_types,
+            "fuzzy": fuzzy,
+        },
+    ):
+        return
+
     # filters
     filter_dict = {
         QueryFields.TITLE.name: filter_title,
@@ -380,23 +689,72 @@ def show(
 
     # load the citations in --location
     # maybe more efficient to put in a function and yield the results
-    if not interactive:
-        for entry in iterate_files(location):
+    template = compile_format(output_format)
+
+    jobs = get_jobs(ctx)
+    if fuzzy:
+        from bibmancli.fuzzy import fuzzy_entries
+
+        for entry in fuzzy_entries(location, fuzzy, jobs=jobs):
             if entry.apply_filters(filter_dict):
-                console.print(entry.format_string(output_format))
+                console.print(template.render(entry))
+    elif not interactive:
+        for entry in iterate_files(location, jobs=jobs):
+            if entry.apply_filters(filter_dict):
+                console.print(template.render(entry))
     else:  # interactive with fzf
         if in_path("fzf"):
+            import tempfile
+            from contextlib import ExitStack
+            from pyfzf import FzfPrompt
+            from bibmancli.index import LibraryIndex
+            from bibmancli.latex import converter as latex_converter
+            from bibmancli.fzf import (
+                fzf_lines,
+                fzf_lines_without_index,
+                fzf_options,
+                split_line,
+                PATH,
+                ENTRY_TYPE,
+                TITLE,
+            )
 
-            def fzf_func() -> Iterable[Entry]:
-                for entry in iterate_files(location):
-                    if entry.apply_filters(filter_dict):
-                        yield str(entry.path)
-
-            fzf = FzfPrompt(default_options=fzf_default_opts)
-            result_paths = fzf.prompt(fzf_func())
-            for path in result_paths:
-                entry = Entry(Path(path), file_to_bib(Path(path)).entries[0])
-                console.print(entry.format_string(output_format))
+            with ExitStack() as stack:
+                # the index is only used if the library has one
+                library_index = LibraryIndex.open(location)
+                if library_index is None:
+                    folder = stack.enter_context(tempfile.TemporaryDirectory())
+                    lines, previews = fzf_lines_without_index(
+                        location, Path(folder), jobs
+                    )
+                else:
+                    stack.enter_context(library_index)
+                    stack.enter_context(
+                        latex_converter.use_store(library_index)
+                    )
+                    library_index.refresh(jobs)
+                    lines, previews = fzf_lines(library_index)
+
+                # the filters are applied to the plain text fields of the lines
+                def fzf_func() -> Iterable[str]:
+                    for line in lines:
+                        fields = split_line(line)
+                        if filter_title and filter_title not in fields[TITLE]:
+                            continue
+                        if (
+                            filter_entry_types
+                            and fields[ENTRY_TYPE] not in filter_entry_types
+                        ):
+                            continue
+                        yield line
+
+                fzf = FzfPrompt(default_options=fzf_default_opts)
+                result_lines = fzf.prompt(fzf_func(), *fzf_options(previews))
+                for line in result_lines:
+                    path = location.joinpath(*split_line(line)[PATH].split("/"))
+                    # read from the index, unless the file changed since
+                    entry = Entry.from_path(path, library_index)
+                    console.print(template.render(entry))
         else:
             err_console.print("Error fzf not in path")
             raise typer.Exit(1)
@@ -404,6 +762,7 @@ def show(
 
 @app.command()
 def note(
+    ctx: typer.Context,
     name: Annotated[
         str, typer.Argument(help="Name of the entry to show the note of")
     ],
@@ -459,6 +818,12 @@ def note(
             )
             raise typer.Exit(1)
 
+    if not contents and not file_contents:
+        if run_in_daemon(
+            ctx, location, "note", {"name": name, "folder": folder}
+        ):
+            return
+
     if folder is None:
         search_location = location
     else:
@@ -476,6 +841,11 @@ def note(
         err_console.print(
             f"[red]Note for '{name}' in '{search_location}' not found![/]"
         )
+        from bibmancli.fuzzy import suggestion_names
+
+        suggestions = suggestion_names(location, name)
+        if suggestions:
+            err_console.print("Did you mean: " + ", ".join(suggestions))
         raise typer.Exit(1)
 
     if contents:
@@ -491,6 +861,87 @@ def note(
     console.print(note_path.read_text())
 
 
+@app.command()
+def search(
+    ctx: typer.Context,
+    query: Annotated[str, typer.Argument(help="Search query")],
+    limit: Annotated[
+        int, typer.Option(min=1, help="Maximum number of results")
+    ] = 20,
+    output_format: Annotated[
+        str, typer.Option(help="Output format of the entries")
+    ] = "{path}: {title}",
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Search the entries by title, author, abstract, keywords and note.
+    Results are sorted by relevance.
+
+    QUERY is the text to search. Use quotes for phrases ('"density functional"'), a trailing * for prefixes (dens*), AND/OR/NOT to combine terms and field:term to search a single field (author:jones).
+    --limit is the maximum number of results. Default is 20.
+    --output-format is the format of the output, see the show command. Default is "{path}: {title}".
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+
+    The search uses the library index, it is created if it does not exist.
+    """
+    if location is None:
+        location = find_library()
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in current directory or parents!"
+            )
+            raise typer.Exit(1)
+    else:
+        location = get_library(location)
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in the provided directory!"
+            )
+            raise typer.Exit(1)
+
+    if run_in_daemon(
+        ctx,
+        location,
+        "search",
+        {"query": query, "limit": limit, "output_format": output_format},
+    ):
+        return
+
+    from bibmancli.index import LibraryIndex
+    from bibmancli.latex import converter as latex_converter
+    from bibmancli.template import compile_format
+    from bibmancli.utils import Entry, get_jobs
+
+    index = LibraryIndex.open(location, create=True)
+    if index is None:
+        err_console.print(
+            "[bold red]ERROR[/] Could not find the cache directory of the library!"
+        )
+        raise typer.Exit(1)
+
+    template = compile_format(output_format)
+    with index, latex_converter.use_store(index):
+        index.refresh(get_jobs(ctx))
+        results = index.search(query, limit)
+
+        if len(results) == 0:
+            err_console.print(f"[yellow]No entries found for '{query}'[/]")
+            raise typer.Exit(1)
+
+        for path, contents, _ in results:
+            console.print(template.render(Entry(path, contents)))
+
+
 @app.command()
 def tui(
     location: Annotated[
@@ -525,15 +976,18 @@ def tui(
             )
             raise typer.Exit(1)
 
+    from bibmancli.tui import BibApp
+
     app = BibApp(location=location)
     app.run()
 
 
 @app.command()
 def export(
+    ctx: typer.Context,
     filename: Annotated[
         Optional[str], typer.Option(help="Name of the file to save the entries")
-    ],
+    ] = None,
     rename: Annotated[
         bool,
         typer.Option("--rename/--skip", help="Rename entries with same name"),
@@ -575,69 +1029,55 @@ def export(
             )
             raise typer.Exit(1)
 
+    from rich.syntax import Syntax
+    from bibmancli.utils import export_entries
+
     if filename:
         filepath: Path = Path(filename)
         if filepath.is_file():
             err_console.print(f"File with name '{filename}' already exists!")
             raise typer.Exit(1)
 
-        # must check that there are no repeated entry names
-        entry_names = []
-        with open(filepath, "w") as f:
-            for entry in iterate_files(location):
-                if entry.contents.key in entry_names:
-                    if not rename:
-                        err_console.print(
-                            "Entry with same name already exists! Skipping..."
-                        )
-                        continue
+    # keys must be unique, entries with repeated keys are renamed or skipped
+    def report(entry) -> bool:
+        if entry.text is None:
+            err_console.print(
+                "Entry with same name already exists! Skipping..."
+            )
+            return False
 
-                    # Rename entry
-                    err_console.print(
-                        "Entry with same name already exists! Renaming...",
-                        end=" ",
-                    )
-                    idx = 1
-                    original = entry.contents.key
-                    while entry.contents.key in entry_names:
-                        entry.contents.key = original + "_" + str(idx)
-                        idx += 1
-                    err_console.print(
-                        f"old: {original}, new: {entry.contents.key}"
-                    )
+        if entry.key != entry.original_key:
+            err_console.print(
+                "Entry with same name already exists! Renaming...", end=" "
+            )
+            err_console.print(f"old: {entry.original_key}, new: {entry.key}")
+
+        return True
 
-                entry_names.append(entry.contents.key)
-                f.write(bib_to_string(entry.contents))
-                f.write("\n")
+    messages = daemon_messages(ctx, location, "export", {"rename": rename})
+    if messages is None:
+        entries = export_entries(location, rename)
     else:
-        entry_names = []
-        for entry in iterate_files(location):
-            if entry.contents.key in entry_names:
-                if not rename:
-                    err_console.print(
-                        "Entry with same name already exists! Skipping..."
-                    )
-                    continue
+        from bibmancli.daemon import exported_entries
 
-                # Rename entry
-                err_console.print(
-                    "Entry with same name already exists! Renaming...", end=" "
-                )
-                idx = 1
-                original = entry.contents.key
-                while entry.contents.key in entry_names:
-                    entry.contents.key = original + "_" + str(idx)
-                    idx += 1
-                err_console.print(f"old: {original}, new: {entry.contents.key}")
-
-            entry_names.append(entry.contents.key)
-            console.print(
-                Syntax(bib_to_string(entry.contents), "bibtex"), end="\n"
-            )
+        entries = exported_entries(messages)
+
+    if filename:
+        # entries are copied as they are, in large buffered writes
+        with open(filepath, "wb", buffering=1024 * 1024) as f:
+            for entry in entries:
+                if report(entry):
+                    f.write(entry.text)
+                    f.write(b"\n")
+    else:
+        for entry in entries:
+            if report(entry):
+                console.print(Syntax(entry.text.decode(), "bibtex"), end="\n")
 
 
 @app.command()
 def html(
+    ctx: typer.Context,
     folder_name: Annotated[
         str, typer.Option(help="Output folder name, must start with '_'")
     ] = "_site",
@@ -648,6 +1088,23 @@ def html(
         bool, typer.Option(help="Launch the site in the browser")
     ] = False,
     yes: Annotated[bool, typer.Option("--yes/--no")] = False,
+    rebuild: Annotated[
+        bool,
+        typer.Option(
+            help="Read all the library again instead of only the changes"
+        ),
+    ] = False,
+    watch: Annotated[
+        bool,
+        typer.Option(help="Keep updating the site when the library changes"),
+    ] = False,
+    interval: Annotated[
+        float,
+        typer.Option(
+            min=0.1,
+            help="Seconds between checks for changes in --watch without inotify",
+        ),
+    ] = 1.0,
     location: Annotated[
         Optional[Path],
         typer.Option(
@@ -664,9 +1121,12 @@ def html(
     Create a simple HTML site with the BibTeX entries.
 
     --folder-name is the name of the folder where the site will be created. Default is '_site'.
-    --overwrite/--no-overwrite overwrites the folder if it already exists. Default is --overwrite.
+    If the folder already contains a site created by bibman, it is updated: only the folders of the library whose .bib or note files changed are read again.
+    --overwrite/--no-overwrite overwrites the folder if it already exists and does not contain a site. Default is --overwrite.
     --launch/--no-launch launches the site in the default browser. Default is --no-launch.
     --yes/--no skips the confirmation prompts. Default is --no.
+    --rebuild reads every file of the library again, even if it did not change.
+    --watch keeps watching the library for changes and updates the site, until stopped with Ctrl+C. The changes are reported by inotify, on systems without it the library is checked every --interval seconds (default 1).
     --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
     """
     if location is None:
@@ -690,8 +1150,11 @@ def html(
         )
         folder_name = "_" + folder_name
 
+    from bibmancli.utils import get_jobs
+    from bibmancli.website import write_site, load_manifest
+
     folder = location / folder_name
-    if folder.is_dir():
+    if folder.is_dir() and load_manifest(folder) is None:
         err_console.print(f"Folder with name '{folder_name}' already exists!")
 
         if not overwrite:
@@ -699,6 +1162,8 @@ def html(
 
         # Delete previous folder
         if not yes:
+            from rich.prompt import Confirm
+
             if not Confirm.ask(
                 "Do you want to overwrite its contents?", console=console
             ):
@@ -709,21 +1174,54 @@ def html(
 
     folder.mkdir(parents=True, exist_ok=True)
 
-    html = create_html(location)
+    jobs = get_jobs(ctx)
+    result = write_site(location, folder, jobs=jobs, full=rebuild)
 
-    with open(folder / "index.html", "w") as f:
-        f.write(html)
-
-    console.print(f"[bold green]HTML site created in '{folder}'[/]")
+    console.print(
+        f"[bold green]HTML site written in '{folder}'[/]: {result.entries} entries in {result.shards} data files, {result.folders} folders updated"
+    )
 
     if launch:
         console.print("Launching site in the default browser... ", end="")
         typer.launch(str(folder / "index.html"), wait=False)
         console.print("[bold green]Done![/]")
 
+    if watch:
+        import threading
+        from bibmancli.watcher import LibraryWatcher
+
+        changed = threading.Event()
+
+        def on_change(events) -> None:
+            # the site only uses the .bib and note files
+            if any(not event.path.endswith(".pdf") for event in events):
+                changed.set()
+
+        watcher = LibraryWatcher(location, interval)
+        watcher.subscribe(on_change)
+
+        console.print(
+            f"Watching '{location}' for changes, press [bold]Ctrl+C[/] to stop..."
+        )
+        with watcher:
+            try:
+                while True:
+                    # short waits, so that Ctrl+C is handled
+                    if not changed.wait(0.5):
+                        continue
+                    changed.clear()
+                    result = write_site(location, folder, jobs=jobs)
+                    if result.folders or result.page:
+                        console.print(
+                            f"[green]Site updated[/]: {result.entries} entries, {result.folders} folders updated"
+                        )
+            except KeyboardInterrupt:
+                console.print("[bold]Stopped watching[/]")
+
 
 @app.command(name="import")
 def func_import(
+    ctx: typer.Context,
     file: Annotated[
         Path,
         typer.Argument(
@@ -778,11 +1276,16 @@ def func_import(
 
         raise typer.Exit(1)
 
-    bib_library = file_to_library(file)
-
-    if len(bib_library.entries) == 0:
-        err_console.print(f"[bold yellow]WARNING[/] No entries found in {file}")
-        raise typer.Exit(1)
+    from collections import deque
+    from rich.progress import (
+        Progress,
+        BarColumn,
+        DownloadColumn,
+        TextColumn,
+        TimeRemainingColumn,
+    )
+    from bibmancli.bibtex import iter_entry_chunks, parse_chunks
+    from bibmancli.utils import get_jobs
 
     if folder is None:
         save_location: Path = location
@@ -793,24 +1296,70 @@ def func_import(
         # create necessary folders
         save_location.mkdir(parents=True, exist_ok=True)
 
-    for entry in bib_library.entries:
-        text = bib_to_string(entry)
-        save_path: Path = save_location / (entry.key + ".bib")
-        note_path: Path = save_location / ("." + entry.key + ".txt")
-        if save_path.is_file():
-            err_console.print(
-                f"[bold yellow]WARNING[/] File with same name '{entry.key}' already exists! Skipping..."
-            )
-            continue
+    # the file is read and parsed in chunks of entries, and the entries are
+    # written as soon as their chunk is parsed
+    positions = deque()
 
-        with open(save_path, "w") as f:
-            f.write(text)
+    def chunks() -> Iterable[str]:
+        for chunk, position in iter_entry_chunks(file):
+            positions.append(position)
+            yield chunk
 
-        with open(note_path, "w") as f:
-            f.write("No notes for this entry.")
+    saved_count = 0
+    failed_count = 0
+    duplicates = []
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TimeRemainingColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task(
+            f"Importing '{file.name}'...", total=file.stat().st_size
+        )
+        for entries, failed in parse_chunks(chunks(), get_jobs(ctx)):
+            failed_count += failed
+            for key, text in entries:
+                save_path: Path = save_location / (key + ".bib")
+                note_path: Path = save_location / ("." + key + ".txt")
+                if save_path.is_file():
+                    progress.console.print(
+                        f"[bold yellow]WARNING[/] File with same name '{key}' already exists! Skipping..."
+                    )
+                    duplicates.append(key)
+                    continue
 
+                with open(save_path, "w") as f:
+                    f.write(text)
+
+                with open(note_path, "w") as f:
+                    f.write("No notes for this entry.")
+
+                saved_count += 1
+
+            progress.update(
+                task,
+                completed=positions.popleft(),
+                description=f"Importing '{file.name}'... {saved_count} entries saved",
+            )
+
+    if saved_count == 0 and len(duplicates) == 0:
+        err_console.print(f"[bold yellow]WARNING[/] No entries found in {file}")
+        raise typer.Exit(1)
+
+    console.print(
+        f"[bold green]{saved_count} entries saved in '{save_location}'[/]"
+    )
+    if duplicates:
+        console.print(
+            f"[yellow]{len(duplicates)} entries skipped because an entry with the same name already exists[/]: "
+            + ", ".join(duplicates)
+        )
+    if failed_count:
         console.print(
-            f"[bold green]Entry '{entry.key}' saved in '{save_path}'[/]"
+            f"[red]{failed_count} blocks could not be parsed and were skipped[/]"
         )
 
 
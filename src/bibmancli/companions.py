@@ -0,0 +1,172 @@
+"""
+Module to find the companion files of the entries of the library.
+
+Each entry <name>.bib can have a note (.<name>.txt) and a PDF (<name>.pdf) in
+the same folder. Instead of checking each of these files with a stat call,
+which is a round trip on network file systems, every folder is listed once
+and the companions are resolved from the set of names in the folder.
+"""
+
+import os
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Iterable
+
+
+def note_name(entry_name: str) -> str:
+    """
+    Name of the note of an entry
+
+    :param entry_name: Name of the .bib file
+    :type entry_name: str
+    :return: Name of the note file
+    :rtype: str
+    """
+    return "." + entry_name.removesuffix(".bib") + ".txt"
+
+
+def pdf_name(entry_name: str) -> str:
+    """
+    Name of the PDF of an entry
+
+    :param entry_name: Name of the .bib file
+    :type entry_name: str
+    :return: Name of the PDF file
+    :rtype: str
+    """
+    return entry_name.removesuffix(".bib") + ".pdf"
+
+
+def entry_name(name: str) -> str | None:
+    """
+    Name of the entry a note or PDF belongs to
+
+    :param name: Name of the note or PDF file
+    :type name: str
+    :return: Name of the .bib file, or None if the file is not a note or a PDF
+    :rtype: str | None
+    """
+    if name.endswith(".txt"):
+        return name[1:-4] + ".bib"
+    if name.endswith(".pdf"):
+        return name[:-4] + ".bib"
+
+    return None
+
+
+def resolve_names(
+    entry: str, names: frozenset[str] | set[str]
+) -> tuple[str | None, str | None]:
+    """
+    Find the note and PDF of an entry in the names of its folder
+
+    :param entry: Name of the .bib file
+    :type entry: str
+    :param names: Names of the files in the folder
+    :type names: frozenset[str] | set[str]
+    :return: Names of the note and the PDF, None for the missing ones
+    :rtype: tuple[str | None, str | None]
+    """
+    note = note_name(entry)
+    pdf = pdf_name(entry)
+
+    return (note if note in names else None, pdf if pdf in names else None)
+
+
+class Companions(NamedTuple):
+    """
+    Files of an entry, None for the files that do not exist
+    """
+
+    entry: Path | None
+    note: Path | None
+    pdf: Path | None
+
+
+class CompanionResolver:
+    """
+    Find the files of the entries, listing each folder only once. The listings
+    are kept until forget() is called, so the resolver should not outlive the
+    operation that uses it if the library can change.
+    """
+
+    def __init__(self):
+        """
+        Create a resolver without any listing
+        """
+        self._listings: dict[str, frozenset[str]] = {}
+
+    def listing(self, folder: Path | str) -> frozenset[str]:
+        """
+        Names of the files of a folder, listing it if it was not listed before
+
+        :param folder: Path to the folder
+        :type folder: Path | str
+        :return: Names of the files, empty if the folder does not exist
+        :rtype: frozenset[str]
+        """
+        key = os.fspath(folder)
+        names = self._listings.get(key)
+        if names is None:
+            try:
+                names = frozenset(os.listdir(key))
+            except (FileNotFoundError, NotADirectoryError):
+                names = frozenset()
+            self._listings[key] = names
+
+        return names
+
+    def add_listing(self, folder: Path | str, names: Iterable[str]) -> None:
+        """
+        Use the names of a folder that was already listed, e.g. while walking
+        the library
+
+        :param folder: Path to the folder
+        :type folder: Path | str
+        :param names: Names of the files of the folder
+        :type names: Iterable[str]
+        """
+        self._listings[os.fspath(folder)] = frozenset(names)
+
+    def forget(self, folder: Path | str | None = None) -> None:
+        """
+        Forget the listing of a folder, or of all folders, after the files
+        were modified
+
+        :param folder: Path to the folder, None for all folders
+        :type folder: Path | str | None
+        """
+        if folder is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(os.fspath(folder), None)
+
+    def exists(self, path: Path) -> bool:
+        """
+        Check if a file exists using the listing of its folder
+
+        :param path: Path to the file
+        :type path: Path
+        :return: True if the file exists
+        :rtype: bool
+        """
+        return path.name in self.listing(path.parent)
+
+    def resolve(self, entry_path: Path) -> Companions:
+        """
+        Find the files of an entry
+
+        :param entry_path: Path to the .bib file of the entry
+        :type entry_path: Path
+        :return: The existing files of the entry
+        :rtype: Companions
+        """
+        folder = entry_path.parent
+        names = self.listing(folder)
+        note, pdf = resolve_names(entry_path.name, names)
+
+        return Companions(
+            entry_path if entry_path.name in names else None,
+            None if note is None else folder / note,
+            None if pdf is None else folder / pdf,
+        )
@@ -12,6 +12,8 @@ File format:
     location = "name_of_library_directory"
 """
 
+CACHE_DIR_NAME = ".bibman_cache"
+
 
 def find_library() -> Path | None:
     """
@@ -76,3 +78,40 @@ def create_toml_contents(library_name: str) -> str:
     :rtype: str
     """
     return f'[library]\nlocation = "{library_name}"\n'
+
+
+def find_cache_dir(library: Path) -> Path | None:
+    """
+    Find the cache directory of a library. The cache directory is located next
+    to the .bibman.toml file that points to the library.
+
+    The directory is not created, it may or may not exist.
+
+    :param library: Path to the library
+    :type library: Path
+    :return: Path to the cache directory, or None if no .bibman.toml file is found
+    :rtype: Path | None
+    """
+    library = library.resolve()
+    for current_dir in (library, *library.parents):
+        if (current_dir / ".bibman.toml").is_file():
+            library_path = get_library(current_dir)
+            if library_path is None or library_path.resolve() != library:
+                return None
+            return current_dir / CACHE_DIR_NAME
+
+    return None
+
+
+def create_cache_dir(cache_dir: Path) -> None:
+    """
+    Create the cache directory of a library if it does not exist, with a
+    .gitignore file so that it is never committed with the library.
+
+    :param cache_dir: Path to the cache directory, see find_cache_dir
+    :type cache_dir: Path
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    gitignore = cache_dir / ".gitignore"
+    if not gitignore.exists():
+        gitignore.write_text("*\n")
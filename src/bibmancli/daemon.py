@@ -0,0 +1,800 @@
+"""
+Resident daemon keeping the parsed library in memory.
+
+`bibman daemon start` loads the library once and answers the requests of the
+show, search, export and note commands on a Unix domain socket. These
+commands look for the socket of their library first and, if a daemon
+answers, print its output instead of reading the library themselves.
+
+The protocol is one JSON object per line. The client sends a request
+{"version": ..., "command": ..., "args": {...}} and the daemon answers with
+messages {"out": [lines]}, {"err": [lines]} or {"entries": [...]}, ended by
+{"exit": code}. The daemon answers {"fallback": reason} to requests it can
+not run (e.g. from another version of bibman), so the client runs the
+command itself.
+
+The daemon subscribes to a LibraryWatcher (see bibmancli.watcher) and only
+parses the files that changed. Before every request it collects the changes
+that already happened, so the answers are always up to date.
+
+Only the client functions (socket_path, connect, request) are loaded by the
+CLI commands, the rest of the module imports the library modules lazily.
+"""
+
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Iterable, Iterator
+
+
+SOCKET_SUFFIX = ".sock"
+# seconds between two scans of the library when inotify is not available
+POLL_INTERVAL = 2.0
+# lines or entries sent in each message
+MESSAGE_BATCH = 500
+CONNECT_TIMEOUT = 0.5
+# seconds the client waits for each message, the first request after a
+# change can parse files or update the index
+READ_TIMEOUT = 120.0
+
+
+def runtime_dir() -> Path:
+    """
+    Directory of the sockets of the daemons: $XDG_RUNTIME_DIR/bibman, or a
+    bibman-<uid> folder in the temporary directory
+
+    :return: Path to the directory
+    :rtype: Path
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        return Path(base) / "bibman"
+
+    import tempfile
+
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return Path(tempfile.gettempdir()) / f"bibman-{user}"
+
+
+def is_private(path: Path) -> bool:
+    """
+    Check that a path can be trusted for the sockets of the daemons: not a
+    symbolic link, owned by the current user and with no permissions for
+    the group and the others
+
+    :param path: Path to the directory or the socket
+    :type path: Path
+    :return: True if the path is private to the current user
+    :rtype: bool
+    """
+    import stat
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+
+    if stat.S_ISLNK(st.st_mode):
+        return False
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        return False
+
+    return st.st_mode & 0o077 == 0
+
+
+def socket_path(location: Path) -> Path:
+    """
+    Path to the socket of the daemon of a library
+
+    :param location: Path to the library
+    :type location: Path
+    :return: Path to the socket
+    :rtype: Path
+    """
+    digest = hashlib.sha1(os.fsencode(location.resolve())).hexdigest()
+    return runtime_dir() / (digest[:16] + SOCKET_SUFFIX)
+
+
+def connect(location: Path) -> socket.socket | None:
+    """
+    Connect to the daemon of a library
+
+    :param location: Path to the library
+    :type location: Path
+    :return: Connected socket, or None if no daemon is running
+    :rtype: socket.socket | None
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    path = socket_path(location)
+    if not path.exists():
+        return None
+    # another user could have created the directory and bound the socket
+    if not is_private(path.parent) or not is_private(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(os.fspath(path))
+    except OSError:
+        sock.close()
+        return None
+
+    sock.settimeout(READ_TIMEOUT)
+    return sock
+
+
+def request(location: Path, command: str, args: dict) -> Iterator[dict] | None:
+    """
+    Send a request to the daemon of a library
+
+    :param location: Path to the library
+    :type location: Path
+    :param command: Name of the command
+    :type command: str
+    :param args: Arguments of the command
+    :type args: dict
+    :return: Generator yielding the messages of the answer, or None if no daemon is running
+    :rtype: Iterator[dict] | None
+    """
+    sock = connect(location)
+    if sock is None:
+        return None
+
+    from bibmancli.version import __version__
+
+    message = {"version": __version__, "command": command, "args": args}
+    try:
+        sock.sendall(json.dumps(message).encode() + b"\n")
+    except OSError:
+        sock.close()
+        return None
+
+    return _messages(sock)
+
+
+def _messages(sock: socket.socket) -> Iterator[dict]:
+    with sock, sock.makefile("rb") as f:
+        for line in f:
+            message = json.loads(line)
+            yield message
+            if "exit" in message or "fallback" in message:
+                return
+
+    raise ConnectionError("The daemon closed the connection")
+
+
+class ExportedText(NamedTuple):
+    """
+    Entry exported by the daemon, see bibmancli.utils.ExportedEntry
+    """
+
+    original_key: str
+    key: str
+    text: bytes | None
+
+
+def exported_entries(messages: Iterable[dict]) -> Iterator[ExportedText]:
+    """
+    Get the entries of the answer to an export request, its warnings are
+    printed on stderr
+
+    :param messages: Messages of the answer
+    :type messages: Iterable[dict]
+    :return: Generator yielding the exported entries
+    :rtype: Iterator[ExportedText]
+    """
+    for message in messages:
+        if "err" in message:
+            from rich.console import Console
+
+            Console(stderr=True).print("\n".join(message["err"]))
+        for text, original_key, key in message.get("entries", ()):
+            if text is not None:
+                text = text.encode("utf-8", "surrogateescape")
+            yield ExportedText(original_key, key, text)
+
+
+class StateEntry(NamedTuple):
+    """
+    Entry of the library kept in memory by the daemon
+    """
+
+    signature: tuple[int, int]  # modification time and size of the file
+    contents: object  # bibtexparser.model.Entry
+    raw: bytes
+
+
+class LibraryState:
+    """
+    Parsed entries of a library, kept up to date with the changes reported
+    by a LibraryWatcher. The generation counter changes every time the
+    library changes.
+
+    :param location: Path to the library
+    :type location: Path
+    """
+
+    def __init__(self, location: Path):
+        """
+        Create an empty state, see load
+
+        :param location: Path to the library
+        :type location: Path
+        """
+        self.location = location
+        self.entries: dict[str, StateEntry] = {}
+        self.notes: dict[str, tuple[int, int]] = {}
+        # .bib files that can not be parsed
+        self.skipped: set[str] = set()
+        self.generation = 0
+        self.lock = threading.RLock()
+        self._sorted: list[tuple[Path, object, bytes]] | None = None
+        self._fuzzy = None
+
+    def load(self, jobs: int = 1) -> None:
+        """
+        Read the whole library, from its index if it has one
+
+        :param jobs: Number of worker processes used to parse the files
+        :type jobs: int
+        """
+        from bibmancli.index import LibraryIndex
+
+        index = LibraryIndex.open(self.location)
+        if index is None:
+            self.refresh(jobs)
+            return
+
+        with index:
+            index.refresh(jobs)
+            self.refresh(jobs, index)
+
+    def _parse(self, relatives: list[str], jobs: int, index=None) -> dict:
+        from bibmancli.bibtex import files_to_bib, file_to_bib
+
+        parsed = {}
+        pending = []
+        for relative in relatives:
+            path = self.location.joinpath(*relative.split("/"))
+            contents = None if index is None else index.get(path)
+            if contents is None:
+                pending.append((relative, path))
+            else:
+                parsed[relative] = contents
+
+        try:
+            libraries = files_to_bib([path for _, path in pending], jobs)
+            for (relative, _), library in zip(pending, libraries):
+                parsed[relative] = library.entries[0]
+        except Exception:
+            # a file can not be parsed, skip it
+            for relative, path in pending:
+                if relative in parsed:
+                    continue
+                try:
+                    parsed[relative] = file_to_bib(path).entries[0]
+                except Exception:
+                    pass
+
+        return parsed
+
+    def refresh(self, jobs: int = 1, index=None) -> bool:
+        """
+        Scan the library and parse the new and modified files. Only one
+        refresh runs at a time.
+
+        :param jobs: Number of worker processes used to parse the files
+        :type jobs: int
+        :param index: Index of the library, used to avoid parsing unchanged files
+        :type index: bibmancli.index.LibraryIndex | None
+        :return: True if the library changed
+        :rtype: bool
+        """
+        with self.lock:
+            return self._refresh(jobs, index)
+
+    def _refresh(self, jobs: int, index) -> bool:
+        from bibmancli.index import scan_library
+
+        bibs = {}
+        notes = {}
+        for batch in scan_library(self.location):
+            for relative, stat in batch:
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if relative.endswith(".bib"):
+                    bibs[relative] = signature
+                else:
+                    notes[relative] = signature
+
+        changed = [
+            relative
+            for relative, signature in bibs.items()
+            if relative not in self.entries
+            or self.entries[relative].signature != signature
+        ]
+        removed = self.entries.keys() - bibs.keys()
+        modified = bool(changed or removed) or notes != self.notes
+        self.notes = notes
+        if not modified:
+            return False
+
+        for relative in removed:
+            del self.entries[relative]
+        self.skipped &= bibs.keys()
+
+        self._update(changed, bibs, jobs, index)
+        self._changed()
+
+        return True
+
+    def _update(
+        self, relatives: list[str], signatures: dict, jobs: int, index=None
+    ) -> None:
+        parsed = self._parse(relatives, jobs, index)
+        for relative in relatives:
+            path = self.location.joinpath(*relative.split("/"))
+            try:
+                raw = path.read_bytes()
+            except OSError:
+                raw = None
+            if relative in parsed and raw is not None:
+                self.entries[relative] = StateEntry(
+                    signatures[relative], parsed[relative], raw
+                )
+                self.skipped.discard(relative)
+            else:
+                self.entries.pop(relative, None)
+                if raw is None:
+                    self.skipped.discard(relative)
+                else:
+                    self.skipped.add(relative)
+
+    def _changed(self) -> None:
+        self.generation += 1
+        self._sorted = None
+        self._fuzzy = None
+
+    def apply(self, events: Iterable, jobs: int = 1) -> bool:
+        """
+        Update the state with the changes of the library
+
+        :param events: Changes reported by a LibraryWatcher
+        :type events: Iterable[bibmancli.watcher.ChangeEvent]
+        :param jobs: Number of worker processes used to parse the files
+        :type jobs: int
+        :return: True if the entries or notes changed
+        :rtype: bool
+        """
+        from bibmancli.watcher import DELETED, MOVED
+
+        with self.lock:
+            modified = False
+            changed = {}
+            for event in events:
+                if event.kind == MOVED:
+                    self.skipped.discard(event.old_path)
+                    entry = self.entries.pop(event.old_path, None)
+                    if entry is not None and event.path.endswith(".bib"):
+                        # same file, no need to parse it again
+                        self.entries[event.path] = entry
+                        modified = True
+                        continue
+                    modified |= entry is not None
+                    modified |= self.notes.pop(event.old_path, None) is not None
+                elif event.kind == DELETED:
+                    self.skipped.discard(event.path)
+                    modified |= self.entries.pop(event.path, None) is not None
+                    modified |= self.notes.pop(event.path, None) is not None
+                    changed.pop(event.path, None)
+                    continue
+
+                # created, modified or moved to a new name
+                path = self.location.joinpath(*event.path.split("/"))
+                try:
+                    result = os.stat(path)
+                except OSError:
+                    continue
+                signature = (result.st_mtime_ns, result.st_size)
+                if event.path.endswith(".bib"):
+                    changed[event.path] = signature
+                elif event.path.endswith(".txt"):
+                    self.notes[event.path] = signature
+                    modified = True
+
+            if changed:
+                self._update(list(changed), changed, jobs)
+                modified = True
+            if modified:
+                self._changed()
+
+            return modified
+
+    def skipped_warnings(self) -> list[str]:
+        """
+        Warnings for the .bib files of the library that can not be parsed
+
+        :return: List of warnings, see bibmancli.utils.skipped_warning
+        :rtype: list[str]
+        """
+        from bibmancli.utils import skipped_warning
+
+        with self.lock:
+            return [
+                skipped_warning(self.location.joinpath(*relative.split("/")))
+                for relative in sorted(self.skipped)
+            ]
+
+    def sorted_entries(self) -> list[tuple[Path, object, bytes]]:
+        """
+        Entries of the library sorted by path
+
+        :return: List of (path, entry, contents of the file)
+        :rtype: list[tuple[Path, bibtexparser.model.Entry, bytes]]
+        """
+        with self.lock:
+            if self._sorted is None:
+                self._sorted = [
+                    (
+                        self.location.joinpath(*relative.split("/")),
+                        entry.contents,
+                        entry.raw,
+                    )
+                    for relative, entry in sorted(self.entries.items())
+                ]
+
+            return self._sorted
+
+    def fuzzy(self, query: str, limit: int = 20) -> list[Path]:
+        """
+        Entries whose key, title or author last names are the closest to the
+        query, see bibmancli.fuzzy
+
+        :param query: Text to search
+        :type query: str
+        :param limit: Maximum number of entries
+        :type limit: int
+        :return: Paths to the entries, best match first
+        :rtype: list[Path]
+        """
+        from bibmancli.fuzzy import TrigramIndex, entry_texts
+
+        with self.lock:
+            if self._fuzzy is None:
+                self._fuzzy = TrigramIndex()
+                for path, contents, _ in self.sorted_entries():
+                    for text in entry_texts(contents):
+                        self._fuzzy.add(text, path)
+
+            return [path for path, _ in self._fuzzy.search(query, limit)]
+
+
+def _batches(items: Iterable, size: int = MESSAGE_BATCH) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DaemonServer:
+    """
+    Server answering the requests of the CLI commands for one library
+
+    :param location: Path to the library
+    :type location: Path
+    :param jobs: Number of worker processes used to parse the files
+    :type jobs: int
+    :param interval: Seconds between two scans of the library when inotify is not available
+    :type interval: float
+    """
+
+    def __init__(
+        self, location: Path, jobs: int = 1, interval: float = POLL_INTERVAL
+    ):
+        """
+        Create the server, see serve
+
+        :param location: Path to the library
+        :type location: Path
+        :param jobs: Number of worker processes used to parse the files
+        :type jobs: int
+        :param interval: Seconds between two scans of the library when inotify is not available
+        :type interval: float
+        """
+        self.location = location
+        self.jobs = jobs
+        self.interval = interval
+        self.path = socket_path(location)
+        self.state = LibraryState(location)
+        self.watcher = None
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._index = None
+        self._index_generation = -1
+
+    def serve(self, ready: threading.Event | None = None) -> None:
+        """
+        Load the library and answer requests until a stop request arrives
+
+        :param ready: Event set once the daemon accepts requests
+        :type ready: threading.Event | None
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("The daemon needs Unix sockets")
+
+        directory = self.path.parent
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not is_private(directory):
+            raise RuntimeError(
+                f"{directory} must be a directory of the current user, "
+                "without permissions for the group and the others"
+            )
+
+        sock = connect(self.location)
+        if sock is not None:
+            sock.close()
+            raise RuntimeError(f"A daemon is already running on {self.path}")
+        self.path.unlink(missing_ok=True)
+
+        from bibmancli.watcher import LibraryWatcher
+
+        # changes made while the library is loaded are applied afterwards
+        self.watcher = LibraryWatcher(self.location, self.interval)
+        self.watcher.subscribe(self._changed)
+        self.watcher.start()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.state.load(self.jobs)
+
+            # the socket is created with no permissions for the others
+            umask = os.umask(0o177)
+            try:
+                server.bind(os.fspath(self.path))
+            finally:
+                os.umask(umask)
+            server.listen()
+            server.settimeout(0.5)
+
+            if ready is not None:
+                ready.set()
+
+            while not self._stop.is_set():
+                try:
+                    conn, _ = server.accept()
+                except TimeoutError:
+                    continue
+                with conn:
+                    conn.settimeout(READ_TIMEOUT)
+                    self._handle(conn)
+        finally:
+            self._stop.set()
+            server.close()
+            self.path.unlink(missing_ok=True)
+            self.watcher.stop()
+            if self._index is not None:
+                self._index.close()
+
+    def stop(self) -> None:
+        """
+        Stop the server after the current request
+        """
+        self._stop.set()
+
+    def _changed(self, events: list) -> None:
+        self.state.apply(events, self.jobs)
+
+    def _handle(self, conn: socket.socket) -> None:
+        reader = conn.makefile("rb")
+        writer = conn.makefile("wb")
+
+        def send(message: dict) -> None:
+            writer.write(json.dumps(message).encode() + b"\n")
+
+        try:
+            line = reader.readline()
+            if not line:
+                # the client only checked that the daemon is running
+                return
+            try:
+                for answer in self.answer(json.loads(line)):
+                    send(answer)
+            except OSError:
+                raise
+            except Exception as e:
+                send({"err": [f"[bold red]ERROR[/] Daemon error: {e}"]})
+                send({"exit": 1})
+            writer.flush()
+        except OSError:
+            # the client disconnected, the daemon keeps running
+            pass
+        finally:
+            reader.close()
+            try:
+                writer.close()
+            except OSError:
+                pass
+
+    def answer(self, message: dict) -> Iterator[dict]:
+        """
+        Answer a request
+
+        :param message: Request of a client
+        :type message: dict
+        :return: Generator yielding the messages of the answer
+        :rtype: Iterator[dict]
+        """
+        from bibmancli.version import __version__
+
+        if message.get("version") != __version__:
+            yield {"fallback": "version"}
+            return
+
+        handlers = {
+            "status": self._status,
+            "stop": self._stop_daemon,
+            "show": self._show,
+            "search": self._search,
+            "export": self._export,
+            "note": self._note,
+        }
+        handler = handlers.get(message.get("command"))
+        if handler is None:
+            yield {"fallback": "command"}
+            return
+
+        self.watcher.sync()
+        code = yield from handler(**message.get("args", {}))
+        yield {"exit": code or 0}
+
+    def _status(self) -> Iterator[dict]:
+        uptime = int(time.time() - self.started)
+        yield {
+            "out": [
+                f"Daemon of '{self.location}' running (pid {os.getpid()}, "
+                f"{len(self.state.entries)} entries, up {uptime} s, "
+                f"watching with {self.watcher.backend})"
+            ]
+        }
+
+    def _stop_daemon(self) -> Iterator[dict]:
+        self.stop()
+        yield {"out": ["[green]Daemon stopped[/]"]}
+
+    def _show(
+        self,
+        output_format: str,
+        filter_title: str | None = None,
+        filter_entry_types: list[str] | None = None,
+        fuzzy: str | None = None,
+    ) -> Iterator[dict]:
+        from bibmancli.utils import Entry, QueryFields
+        from bibmancli.template import compile_format
+
+        template = compile_format(output_format)
+        warnings = self.state.skipped_warnings()
+        if warnings:
+            yield {"err": warnings}
+
+        filter_dict = {
+            QueryFields.TITLE.name: filter_title,
+            QueryFields.ENTRY.name: filter_entry_types,
+        }
+
+        if fuzzy:
+            entries = self.state.sorted_entries()
+            by_path = {path: contents for path, contents, _ in entries}
+            entries = (
+                Entry(path, by_path[path]) for path in self.state.fuzzy(fuzzy)
+            )
+        else:
+            entries = (
+                Entry(path, contents)
+                for path, contents, _ in self.state.sorted_entries()
+            )
+
+        lines = (
+            template.render(entry)
+            for entry in entries
+            if entry.apply_filters(filter_dict)
+        )
+        for batch in _batches(lines):
+            yield {"out": batch}
+
+    def _search(
+        self, query: str, limit: int, output_format: str
+    ) -> Iterator[dict]:
+        from bibmancli.index import LibraryIndex
+        from bibmancli.latex import converter as latex_converter
+        from bibmancli.template import compile_format
+        from bibmancli.utils import Entry
+
+        if self._index is None:
+            self._index = LibraryIndex.open(self.location, create=True)
+            if self._index is None:
+                yield {
+                    "err": [
+                        "[bold red]ERROR[/] Could not find the cache directory of the library!"
+                    ]
+                }
+                return 1
+
+        template = compile_format(output_format)
+        with latex_converter.use_store(self._index):
+            # the index is only scanned when the library changed
+            if self._index_generation != self.state.generation:
+                self._index.refresh(self.jobs)
+                self._index_generation = self.state.generation
+            results = self._index.search(query, limit)
+
+            if len(results) == 0:
+                yield {"err": [f"[yellow]No entries found for '{query}'[/]"]}
+                return 1
+
+            lines = (
+                template.render(Entry(path, contents))
+                for path, contents, _ in results
+            )
+            for batch in _batches(lines):
+                yield {"out": batch}
+
+    def _export(self, rename: bool = True) -> Iterator[dict]:
+        from bibmancli.utils import export_contents
+
+        warnings = self.state.skipped_warnings()
+        if warnings:
+            yield {"err": warnings}
+
+        files = ((path, raw) for path, _, raw in self.state.sorted_entries())
+        entries = (
+            [
+                None
+                if entry.text is None
+                else entry.text.decode("utf-8", "surrogateescape"),
+                entry.original_key,
+                entry.key,
+            ]
+            for entry in export_contents(files, rename)
+        )
+        for batch in _batches(entries):
+            yield {"entries": batch}
+
+    def _note(self, name: str, folder: str | None = None) -> Iterator[dict]:
+        if not name.endswith(".txt"):
+            name = name + ".txt"
+        if not name.startswith("."):
+            name = "." + name
+
+        prefix = ""
+        if folder is not None:
+            prefix = "".join(part + "/" for part in folder.split("/") if part)
+        relative = prefix + name
+        search_location = self.location.joinpath(*prefix.split("/"))
+        if relative in self.state.notes:
+            note_path = self.location.joinpath(*relative.split("/"))
+            yield {"out": [note_path.read_text()]}
+            return 0
+
+        errors = [
+            f"[red]Note for '{name}' in '{search_location}' not found![/]"
+        ]
+        stem = name.removesuffix(".txt").removeprefix(".")
+        suggestions = [
+            path.relative_to(self.location).with_suffix("").as_posix()
+            for path in self.state.fuzzy(stem, 5)
+        ]
+        if suggestions:
+            errors.append("Did you mean: " + ", ".join(suggestions))
+        yield {"err": errors}
+        return 1
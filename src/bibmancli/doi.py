@@ -0,0 +1,360 @@
+"""
+Verification of the DOIs of the entries of the library.
+
+Every DOI is resolved with the citation API (see bibmancli.resolve) by a pool
+of threads. The requests go through a shared rate limiter and a session with
+a bounded number of connections per host, and are retried with exponential
+backoff when the server is overloaded or can not be reached. A DOI is dead if
+the API does not know it, and mismatched if the entry returned for it is not
+the entry of the library (another DOI or title).
+"""
+
+import time
+import random
+import threading
+import requests
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bibmancli.response_cache import ResponseCache
+
+
+OK = "ok"
+DEAD = "dead"
+MISMATCH = "mismatch"
+ERROR = "error"
+
+# statuses of the responses that are retried
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# minimum trigram similarity between the titles of the entry and the response
+TITLE_THRESHOLD = 0.5
+
+_DOI_PREFIXES = (
+    "https://doi.org/",
+    "http://doi.org/",
+    "https://dx.doi.org/",
+    "http://dx.doi.org/",
+    "doi:",
+)
+
+
+def normalize_doi(doi: str) -> str:
+    """
+    Remove the URL or "doi:" prefix of a DOI and lower case it, DOIs are case
+    insensitive
+
+    :param doi: DOI
+    :type doi: str
+    :return: Normalized DOI
+    :rtype: str
+    """
+    doi = doi.strip()
+    lowered = doi.lower()
+    for prefix in _DOI_PREFIXES:
+        if lowered.startswith(prefix):
+            return lowered[len(prefix) :].strip()
+
+    return lowered
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of requests per second of several
+    threads
+
+    :param rate: Maximum number of requests per second, 0 for no limit
+    :type rate: float
+    :param burst: Number of requests that can be sent at once
+    :type burst: int
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Create a full bucket
+
+        :param rate: Maximum number of requests per second, 0 for no limit
+        :type rate: float
+        :param burst: Number of requests that can be sent at once
+        :type burst: int
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Wait until a request can be sent
+        """
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    Seconds to wait before retrying a request
+
+    :param attempt: Number of the failed attempt, starting at 0
+    :type attempt: int
+    :param retry_after: Retry-After header of the response, if any
+    :type retry_after: str | None
+    :return: Seconds to wait
+    :rtype: float
+    """
+    if retry_after is not None:
+        try:
+            return min(BACKOFF_MAX, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+
+    # full jitter, so that the threads do not retry at the same time
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class DoiResult(NamedTuple):
+    """
+    Result of verifying the DOI of an entry. Paths are relative to the
+    library, in POSIX format.
+    """
+
+    path: str
+    doi: str
+    status: str  # OK, DEAD, MISMATCH or ERROR
+    message: str | None = None
+
+
+def collect_dois(location: Path, jobs: int = 1) -> tuple[list[tuple], int]:
+    """
+    Get the DOI and title of every entry of the library, from the index if
+    the library has one
+
+    :param location: Path to the library
+    :type location: Path
+    :param jobs: Number of worker processes used to parse the files
+    :type jobs: int
+    :return: List of (relative path, DOI, title) and number of entries without DOI
+    :rtype: tuple[list[tuple], int]
+    """
+    from bibmancli.utils import iterate_files
+
+    dois = []
+    without = 0
+    for entry in iterate_files(location, jobs=jobs):
+        fields = entry.contents.fields_dict
+        if "doi" not in fields or not str(fields["doi"].value).strip():
+            without += 1
+            continue
+
+        title = str(fields["title"].value) if "title" in fields else None
+        relative = entry.path.relative_to(location).as_posix()
+        dois.append((relative, str(fields["doi"].value).strip(), title))
+
+    return dois, without
+
+
+def compare_entry(
+    doi: str, title: str | None, text: str
+) -> tuple[str, str | None]:
+    """
+    Compare the entry of the library with the entry returned for its DOI
+
+    :param doi: DOI of the entry
+    :type doi: str
+    :param title: Title of the entry
+    :type title: str | None
+    :param text: BibTeX returned by the API
+    :type text: str
+    :return: Status (OK or MISMATCH) and message
+    :rtype: tuple[str, str | None]
+    """
+    from bibmancli.bibtex import string_to_bib
+    from bibmancli.fuzzy import similarity, trigrams
+    from bibmancli.latex import latex_to_text
+
+    library = string_to_bib(text)
+    if len(library.entries) == 0:
+        return MISMATCH, "No BibTeX entry in the response"
+
+    fields = library.entries[0].fields_dict
+    if "doi" in fields:
+        found = normalize_doi(str(fields["doi"].value))
+        if found != normalize_doi(doi):
+            return MISMATCH, f"The DOI resolves to {found}"
+    elif title is not None and "title" in fields:
+        found = latex_to_text(str(fields["title"].value))
+        score = similarity(trigrams(latex_to_text(title)), trigrams(found))
+        if score < TITLE_THRESHOLD:
+            return MISMATCH, f"The DOI resolves to '{found}'"
+
+    return OK, None
+
+
+def verify_doi(
+    doi: str,
+    title: str | None,
+    timeout: float,
+    session: requests.Session,
+    limiter: RateLimiter,
+    retries: int = 3,
+    base_url: str | None = None,
+    cache: ResponseCache | None = None,
+    refresh: bool = False,
+) -> tuple[str, str | None]:
+    """
+    Verify a DOI with the citation API
+
+    :param doi: DOI of the entry
+    :type doi: str
+    :param title: Title of the entry, used if the response has no DOI
+    :type title: str | None
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param session: Session used to send the requests
+    :type session: requests.Session
+    :param limiter: Rate limiter shared by all the requests
+    :type limiter: RateLimiter
+    :param retries: Number of retries of a failed request
+    :type retries: int
+    :param base_url: URL of the API, see bibmancli.resolve.get_base_url
+    :type base_url: str | None
+    :param cache: Cache of the responses, None to always send the requests
+    :type cache: ResponseCache | None
+    :param refresh: Send the request even if the response is cached
+    :type refresh: bool
+    :return: Status and message
+    :rtype: tuple[str, str | None]
+    """
+    from bibmancli.resolve import get_base_url, cached_fetch, send_get
+    from bibmancli.resolve import ResolveError
+
+    if base_url is None:
+        base_url = get_base_url()
+    doi = normalize_doi(doi)
+
+    def fetch() -> tuple[int, str]:
+        attempt = 0
+        while True:
+            limiter.acquire()
+            retry_after = None
+            try:
+                r = send_get(doi, timeout, session, base_url)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return r.status_code, r.text
+                retry_after = r.headers.get("Retry-After")
+
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    try:
+        text = cached_fetch(cache, base_url, doi, refresh, fetch)
+    except ResolveError as e:
+        if e.status == 404:
+            return DEAD, "The DOI was not found"
+        return ERROR, str(e)
+    except requests.Timeout:
+        return ERROR, "Request timed out"
+    except Exception as e:
+        return ERROR, str(e) or type(e).__name__
+
+    try:
+        return compare_entry(doi, title, text)
+    except Exception as e:
+        return ERROR, f"Could not parse the response: {e}"
+
+
+def verify_dois(
+    dois: Iterable[tuple],
+    timeout: float,
+    workers: int = 8,
+    rate: float = 10.0,
+    per_host: int = 4,
+    retries: int = 3,
+    base_url: str | None = None,
+    cache: ResponseCache | None = None,
+    refresh: bool = False,
+) -> Iterator[DoiResult]:
+    """
+    Verify the DOIs of many entries concurrently. Entries with the same DOI
+    are verified once. Results are yielded as soon as they arrive.
+
+    :param dois: (relative path, DOI, title) of the entries, see collect_dois
+    :type dois: Iterable[tuple]
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param workers: Number of DOIs verified at the same time
+    :type workers: int
+    :param rate: Maximum number of requests per second, 0 for no limit
+    :type rate: float
+    :param per_host: Maximum number of connections to each host
+    :type per_host: int
+    :param retries: Number of retries of a failed request
+    :type retries: int
+    :param base_url: URL of the API, see bibmancli.resolve.get_base_url
+    :type base_url: str | None
+    :param cache: Cache of the responses, None to always send the requests
+    :type cache: ResponseCache | None
+    :param refresh: Send the requests even if the responses are cached
+    :type refresh: bool
+    :return: Generator yielding the result of each entry
+    :rtype: Iterator[DoiResult]
+    """
+    from bibmancli.resolve import create_session
+
+    entries: dict[str, list[tuple]] = {}
+    for relative, doi, title in dois:
+        entries.setdefault(normalize_doi(doi), []).append(
+            (relative, doi, title)
+        )
+
+    limiter = RateLimiter(rate, burst=max(1, per_host))
+
+    def verify(doi: str) -> tuple[str, str, str | None]:
+        title = entries[doi][0][2]
+        status, message = verify_doi(
+            doi,
+            title,
+            timeout,
+            session,
+            limiter,
+            retries,
+            base_url,
+            cache,
+            refresh,
+        )
+        return doi, status, message
+
+    # the pool blocks the threads when all the connections to a host are used
+    with create_session(per_host, block=True) as session:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(verify, doi) for doi in entries]
+            try:
+                for future in as_completed(futures):
+                    doi, status, message = future.result()
+                    for relative, original, _ in entries[doi]:
+                        yield DoiResult(relative, original, status, message)
+            finally:
+                # stop the requests not sent yet if the consumer stops
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,302 @@
+"""
+Typo-tolerant lookup of entries using trigrams.
+
+Every text (entry key, title, author last names) is split into its set of
+character trigrams. An inverted index maps each trigram to the texts that
+contain it, so a lookup only looks at the texts that share at least one
+trigram with the query instead of scanning every entry. Candidates are
+ranked by the mean of the Jaccard similarity of the trigram sets and the
+fraction of the query trigrams found in the text, so that a word of a long
+title can still match.
+"""
+
+import re
+from pathlib import Path
+from collections import Counter
+from collections.abc import Hashable, Iterable
+
+
+SIMILARITY_THRESHOLD = 0.35
+
+_NON_ALNUM = re.compile(r"[^\w]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Lower case the text and replace punctuation and underscores by spaces
+
+    :param text: Text to normalize
+    :type text: str
+    :return: Normalized text
+    :rtype: str
+    """
+    return " ".join(_NON_ALNUM.sub(" ", text.lower()).replace("_", " ").split())
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Get the set of trigrams of a text. Each word is padded with spaces so
+    that short words and word boundaries also produce trigrams.
+
+    :param text: Text
+    :type text: str
+    :return: Set of trigrams
+    :rtype: set[str]
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+def _score(common: int, query: int, text: int) -> float:
+    jaccard = common / (query + text - common)
+    containment = common / query
+    return (jaccard + containment) / 2
+
+
+def similarity(query: set[str], text: set[str]) -> float:
+    """
+    Similarity between the trigrams of a query and the trigrams of a text
+
+    :param query: Trigrams of the query
+    :type query: set[str]
+    :param text: Trigrams of the text
+    :type text: set[str]
+    :return: Similarity between 0 and 1
+    :rtype: float
+    """
+    if not query or not text:
+        return 0.0
+
+    return _score(len(query & text), len(query), len(text))
+
+
+def author_last_names(author: str) -> list[str]:
+    """
+    Get the last names of a BibTeX author list ("Last, First and First Last")
+
+    :param author: Value of the author field
+    :type author: str
+    :return: List of last names
+    :rtype: list[str]
+    """
+    names = []
+    for person in re.split(r"\s+and\s+", author):
+        person = person.strip()
+        if not person:
+            continue
+        if "," in person:
+            names.append(person.split(",")[0].strip())
+        else:
+            names.append(person.split()[-1])
+
+    return names
+
+
+def entry_texts(contents) -> list[str]:
+    """
+    Texts of an entry used for the fuzzy lookup: key, title and author last names
+
+    :param contents: Contents of the entry
+    :type contents: bibtexparser.model.Entry
+    :return: List of texts
+    :rtype: list[str]
+    """
+    from bibmancli.latex import latex_to_text
+
+    fields = contents.fields_dict
+    texts = [contents.key]
+    if "title" in fields:
+        texts.append(latex_to_text(str(fields["title"].value)))
+    if "author" in fields:
+        texts.extend(
+            author_last_names(latex_to_text(str(fields["author"].value)))
+        )
+
+    return texts
+
+
+def best_similarity(query: set[str], texts: Iterable[str]) -> float:
+    """
+    Best similarity between a query and a group of texts
+
+    :param query: Trigrams of the query
+    :type query: set[str]
+    :param texts: Texts to compare with
+    :type texts: Iterable[str]
+    :return: Similarity between 0 and 1
+    :rtype: float
+    """
+    return max((similarity(query, trigrams(text)) for text in texts), default=0)
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index of texts, each of them associated with a value.
+    Several texts can point to the same value (e.g. the key and the title of
+    an entry).
+    """
+
+    def __init__(self):
+        """
+        Create an empty index
+        """
+        self._postings: dict[str, list[int]] = {}
+        self._grams: list[set[str]] = []
+        self._values: list[Hashable] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, text: str, value: Hashable) -> None:
+        """
+        Add a text to the index
+
+        :param text: Text to index
+        :type text: str
+        :param value: Value returned when the text matches
+        :type value: Hashable
+        """
+        grams = trigrams(text)
+        position = len(self._values)
+        self._grams.append(grams)
+        self._values.append(value)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(position)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> list[tuple[Hashable, float]]:
+        """
+        Find the values whose texts are the most similar to the query
+
+        :param query: Text to search
+        :type query: str
+        :param limit: Maximum number of results
+        :type limit: int
+        :param threshold: Minimum similarity of the results
+        :type threshold: float
+        :return: List of (value, similarity) pairs, best match first
+        :rtype: list[tuple[Hashable, float]]
+        """
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        best: dict[Hashable, float] = {}
+        for position, common in shared.items():
+            grams = self._grams[position]
+            score = _score(common, len(query_grams), len(grams))
+            value = self._values[position]
+            if score >= threshold and score > best.get(value, 0):
+                best[value] = score
+
+        results = sorted(best.items(), key=lambda item: -item[1])
+        return results[:limit]
+
+
+def suggest_entries(location: Path, name: str, limit: int = 5) -> list[Path]:
+    """
+    Suggest the entries of the library closest to a name that was not found.
+
+    If the library has an index, the keys, titles and author last names of the
+    entries are used. Otherwise only the file names are compared.
+
+    :param location: Path to the library
+    :type location: Path
+    :param name: Name that was not found
+    :type name: str
+    :param limit: Maximum number of suggestions
+    :type limit: int
+    :return: Paths to the .bib files of the suggested entries
+    :rtype: list[Path]
+    """
+    from bibmancli.index import LibraryIndex, scan_library
+
+    name = name.removesuffix(".bib").removesuffix(".txt").removeprefix(".")
+
+    index = LibraryIndex.open(location)
+    if index is not None:
+        with index:
+            index.refresh()
+            return [path for path, _ in index.fuzzy(name, limit)]
+
+    trigram_index = TrigramIndex()
+    for batch in scan_library(location):
+        for relative, _ in batch:
+            if relative.endswith(".bib"):
+                stem = relative.rpartition("/")[2][: -len(".bib")]
+                trigram_index.add(stem, relative)
+
+    return [
+        location.joinpath(*relative.split("/"))
+        for relative, _ in trigram_index.search(name, limit)
+    ]
+
+
+def suggestion_names(location: Path, name: str, limit: int = 5) -> list[str]:
+    """
+    Names of the entries closest to a name that was not found, relative to
+    the library location and without extension (folder/entry_name).
+
+    :param location: Path to the library
+    :type location: Path
+    :param name: Name that was not found
+    :type name: str
+    :param limit: Maximum number of suggestions
+    :type limit: int
+    :return: List of entry names
+    :rtype: list[str]
+    """
+    return [
+        path.relative_to(location).with_suffix("").as_posix()
+        for path in suggest_entries(location, name, limit)
+    ]
+
+
+def fuzzy_entries(location: Path, query: str, limit: int = 20, jobs: int = 1):
+    """
+    Find the entries whose key, title or author last names are the closest
+    to the query, best match first.
+
+    If the library has an index, only the entries that share trigrams with the
+    query are read. Otherwise the whole library is parsed.
+
+    :param location: Path to the library
+    :type location: Path
+    :param query: Text to search
+    :type query: str
+    :param limit: Maximum number of entries
+    :type limit: int
+    :param jobs: Number of worker processes used to parse the library
+    :type jobs: int
+    :return: List of entries
+    :rtype: list[bibmancli.utils.Entry]
+    """
+    from bibmancli.index import LibraryIndex
+    from bibmancli.utils import Entry, iterate_files
+
+    index = LibraryIndex.open(location)
+    if index is not None:
+        with index:
+            index.refresh(jobs)
+            return [
+                Entry.from_path(path, index)
+                for path, _ in index.fuzzy(query, limit)
+            ]
+
+    entries = {}
+    trigram_index = TrigramIndex()
+    for entry in iterate_files(location, jobs=jobs):
+        entries[entry.path] = entry
+        for text in entry_texts(entry.contents):
+            trigram_index.add(text, entry.path)
+
+    return [entries[path] for path, _ in trigram_index.search(query, limit)]
@@ -0,0 +1,185 @@
+"""
+Input of fzf for `bibman show --interactive`, read from the library index.
+
+fzf receives one line per entry, with the fields separated by tabs:
+
+    offset, length, path, entry type, key, title, authors, year
+
+Only the key, title, authors and year are shown. The preview of every entry
+(its title, authors, BibTeX source and note) is written once to a file in the
+cache directory of the library, and fzf shows the bytes of the entry with
+`tail` and `head` instead of reading and rendering the .bib file again.
+Both files are kept until the index changes. Libraries without index are
+read with iterate_files and their files are written to a temporary folder.
+"""
+
+import os
+import shlex
+from pathlib import Path
+from collections.abc import Iterable, Iterator
+from bibmancli.index import LibraryIndex, EntrySummary, summarize
+
+
+FZF_FOLDER = "fzf"
+FIELD_SEPARATOR = "\t"
+# fields of the lines of fzf
+OFFSET, LENGTH, PATH, ENTRY_TYPE, KEY, TITLE, AUTHORS, YEAR = range(8)
+
+
+def render_preview(summary: EntrySummary, source: str, note: str | None) -> str:
+    """
+    Text shown by fzf in the preview window of an entry
+
+    :param summary: Summary of the entry
+    :type summary: bibmancli.index.EntrySummary
+    :param source: BibTeX source of the entry
+    :type source: str
+    :param note: Note of the entry, if it has one
+    :type note: str | None
+    :return: Preview text
+    :rtype: str
+    """
+    lines = [summary.title, summary.authors]
+    lines.append(" · ".join(filter(None, (summary.year, summary.entry_type))))
+    lines.extend(("", source.strip(), ""))
+    if note:
+        lines.extend(("Note:", note.strip(), ""))
+
+    return "\n".join(lines)
+
+
+def _write_files(
+    sources: Iterable[tuple[EntrySummary, str, str | None]],
+    library: Path,
+    lines_path: Path,
+    previews_path: Path,
+):
+    """
+    Write the lines and the previews of all the entries
+    """
+    lines_tmp = lines_path.with_name(lines_path.name + ".tmp")
+    previews_tmp = previews_path.with_name(previews_path.name + ".tmp")
+    with (
+        open(lines_tmp, "w", encoding="utf-8") as lines,
+        open(previews_tmp, "wb") as previews,
+    ):
+        offset = 0
+        for summary, source, note in sources:
+            preview = render_preview(summary, source, note).encode()
+            previews.write(preview)
+            fields = (
+                # tail counts the bytes from 1
+                str(offset + 1),
+                str(len(preview)),
+                summary.path.relative_to(library).as_posix(),
+                summary.entry_type,
+                summary.key,
+                summary.title,
+                summary.authors,
+                summary.year,
+            )
+            lines.write(FIELD_SEPARATOR.join(fields) + "\n")
+            offset += len(preview)
+
+    # the previews first, the lines are the marker of complete files
+    os.replace(previews_tmp, previews_path)
+    os.replace(lines_tmp, lines_path)
+
+
+def fzf_lines(index: LibraryIndex) -> tuple[Iterator[str], Path]:
+    """
+    Lines of all the entries of the library and the file of their previews.
+    The files are written again only if the index changed since they were
+    written, refresh the index first.
+
+    :param index: Index of the library
+    :type index: bibmancli.index.LibraryIndex
+    :return: Lines for fzf, without the newline, and path to the previews
+    :rtype: tuple[Iterator[str], Path]
+    """
+    folder = index.db_path.parent / FZF_FOLDER
+    generation = index.generation
+    lines_path = folder / f"{generation}.tsv"
+    previews_path = folder / f"{generation}.txt"
+
+    if not lines_path.is_file():
+        folder.mkdir(exist_ok=True)
+        for old in folder.iterdir():
+            old.unlink()
+        _write_files(index.sources(), index.library, lines_path, previews_path)
+
+    return _read_lines(lines_path), previews_path
+
+
+def fzf_lines_without_index(
+    location: Path, folder: Path, jobs: int = 1
+) -> tuple[Iterator[str], Path]:
+    """
+    Lines of all the entries of a library without index and the file of
+    their previews, like fzf_lines. The library is read with iterate_files.
+
+    :param location: Path to the library
+    :type location: Path
+    :param folder: Folder where the files are written, a temporary one
+    :type folder: Path
+    :param jobs: Number of worker processes used to parse the files
+    :type jobs: int
+    :return: Lines for fzf, without the newline, and path to the previews
+    :rtype: tuple[Iterator[str], Path]
+    """
+    from bibmancli.utils import iterate_files
+    from bibmancli.companions import note_name
+
+    sources = []
+    for entry in iterate_files(location, use_index=False, jobs=jobs):
+        try:
+            note = entry.path.with_name(note_name(entry.path.name)).read_text()
+        except (OSError, UnicodeDecodeError):
+            note = None
+        summary = summarize(entry.path, entry.contents)
+        sources.append((summary, entry.contents.raw or "", note))
+    sources.sort(key=lambda source: source[0].path)
+
+    lines_path = folder / "entries.tsv"
+    previews_path = folder / "entries.txt"
+    _write_files(sources, location, lines_path, previews_path)
+
+    return _read_lines(lines_path), previews_path
+
+
+def _read_lines(lines_path: Path) -> Iterator[str]:
+    with open(lines_path, encoding="utf-8") as lines:
+        for line in lines:
+            yield line.rstrip("\n")
+
+
+def fzf_options(previews_path: Path) -> list[tuple[str, str]]:
+    """
+    Options of fzf to show the lines of fzf_lines and their previews
+
+    :param previews_path: Path to the previews, from fzf_lines
+    :type previews_path: Path
+    :return: fzf options as (name, value) pairs
+    :rtype: list[tuple[str, str]]
+    """
+    previews = shlex.quote(str(previews_path))
+    return [
+        ("--delimiter", FIELD_SEPARATOR),
+        ("--with-nth", f"{KEY + 1}.."),
+        (
+            "--preview",
+            f"tail -c +{{{OFFSET + 1}}} {previews} | head -c {{{LENGTH + 1}}}",
+        ),
+    ]
+
+
+def split_line(line: str) -> list[str]:
+    """
+    Fields of a line of fzf
+
+    :param line: Line of fzf_lines
+    :type line: str
+    :return: Fields of the line, see the constants of this module
+    :rtype: list[str]
+    """
+    return line.split(FIELD_SEPARATOR)
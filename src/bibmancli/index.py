@@ -0,0 +1,814 @@
+"""
+Persistent on-disk index of the library entries.
+
+The index is a SQLite database stored in the cache directory next to the
+.bibman.toml file (see bibmancli.config_file.find_cache_dir). It stores the
+path, key, entry type and parsed fields of every entry, so commands that go
+through the whole library do not need to parse unchanged files again.
+
+The index is optional, it is only used if it has been created with
+`bibman index build`.
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Iterator
+from bibtexparser.model import Entry as BibEntry, Field
+from bibmancli.bibtex import files_to_bib
+from bibmancli.latex import converter as latex_converter
+from bibmancli.fuzzy import (
+    entry_texts,
+    trigrams,
+    best_similarity,
+    SIMILARITY_THRESHOLD,
+)
+from bibmancli.companions import note_name, entry_name
+from bibmancli.config_file import (
+    find_cache_dir,
+    create_cache_dir,
+    CACHE_DIR_NAME,
+)
+
+
+INDEX_NAME = "index.sqlite"
+SCHEMA_VERSION = 5
+
+# fields of the entries included in the full-text search index, and their
+# weight when ranking the results
+SEARCH_FIELDS = {
+    "title": 10.0,
+    "author": 5.0,
+    "abstract": 1.0,
+    "keywords": 3.0,
+}
+NOTE_WEIGHT = 1.0
+
+# folders that never contain entries, not scanned when refreshing the index
+SKIP_FOLDERS = {".git", CACHE_DIR_NAME}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    entry_type TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    raw TEXT,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    year TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_key ON entries (key);
+CREATE TABLE IF NOT EXISTS notes (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS latex (
+    source TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5 (
+    title, author, abstract, keywords, note,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    gram TEXT NOT NULL,
+    entry INTEGER NOT NULL,
+    PRIMARY KEY (gram, entry)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trigrams_entry ON trigrams (entry);
+"""
+
+# number of candidates, sharing the most trigrams with the query, that are
+# compared with it in a fuzzy lookup
+FUZZY_CANDIDATES = 100
+# trigrams of more entries than this (e.g. " th") are not used to find the
+# candidates of a fuzzy lookup, unless the query only has such trigrams
+COMMON_TRIGRAM = 1000
+
+
+class RefreshResult(NamedTuple):
+    """
+    Summary of an index refresh
+    """
+
+    parsed: int
+    """Number of .bib files parsed"""
+    notes: int
+    """Number of note files read"""
+    removed: int
+    """Number of .bib and note files dropped from the index"""
+
+
+class EntrySummary(NamedTuple):
+    """
+    Fields of an entry shown in lists of entries, as plain text
+    """
+
+    path: Path
+    """Path to the .bib file"""
+    key: str
+    """Key of the entry"""
+    entry_type: str
+    """Type of the entry"""
+    title: str
+    """Title, converted from LaTeX"""
+    authors: str
+    """Authors, converted from LaTeX"""
+    year: str
+    """Year, empty if the entry has none"""
+
+
+def summarize(path: Path, entry: BibEntry) -> EntrySummary:
+    """
+    Summary of an entry, as stored in the index. Used to list the entries of
+    a library without index.
+
+    :param path: Path to the .bib file
+    :type path: Path
+    :param entry: Entry of the file
+    :type entry: bibtexparser.model.Entry
+    :return: Summary of the entry
+    :rtype: EntrySummary
+    """
+    fields = entry.fields_dict
+
+    def text(name: str) -> str:
+        if name not in fields:
+            return ""
+        # on one line
+        return " ".join(
+            latex_converter.convert(str(fields[name].value)).split()
+        )
+
+    year = str(fields["year"].value) if "year" in fields else ""
+    return EntrySummary(
+        path, entry.key, entry.entry_type, text("title"), text("author"), year
+    )
+
+
+def scan_library(library: Path) -> Iterator[list[tuple[str, os.stat_result]]]:
+    """
+    Scan the library with os.scandir, without reading any file.
+    Yields one batch per directory with the name (relative to the library,
+    as a POSIX path) and stat result of every .bib and note (.txt) file.
+
+    :param library: Path to the library
+    :type library: Path
+    :return: Generator yielding batches of (relative path, stat) pairs
+    :rtype: Iterator[list[tuple[str, os.stat_result]]]
+    """
+    pending = [(os.fspath(library), "")]
+    while pending:
+        directory, prefix = pending.pop()
+        batch = []
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    if item.is_dir(follow_symlinks=False):
+                        if item.name not in SKIP_FOLDERS:
+                            pending.append(
+                                (item.path, prefix + item.name + "/")
+                            )
+                    elif item.name.endswith(".bib") or (
+                        item.name.startswith(".") and item.name.endswith(".txt")
+                    ):
+                        batch.append((prefix + item.name, item.stat()))
+        except (FileNotFoundError, NotADirectoryError):
+            # directory removed while scanning
+            continue
+
+        if batch:
+            yield batch
+
+
+class LibraryIndex:
+    """
+    Class to read and update the persistent index of a library
+
+    :param library: Path to the library
+    :type library: Path
+    :param db_path: Path to the SQLite database file
+    :type db_path: Path
+    """
+
+    library: Path
+    db_path: Path
+
+    def __init__(self, library: Path, db_path: Path):
+        """
+        Open (and create if needed) the index database
+
+        :param library: Path to the library
+        :type library: Path
+        :param db_path: Path to the SQLite database file
+        :type db_path: Path
+        """
+        self.library = library
+        self.db_path = db_path
+
+        create_cache_dir(db_path.parent)
+
+        self._pending_latex: list[tuple[str, str]] = []
+        # .bib files that could not be parsed in the last refresh
+        self.skipped: list[str] = []
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._check_schema()
+
+    @classmethod
+    def open(cls, library: Path, create: bool = False) -> "LibraryIndex | None":
+        """
+        Open the index of a library.
+
+        :param library: Path to the library
+        :type library: Path
+        :param create: Create the index if it does not exist
+        :type create: bool
+        :return: The index, or None if it does not exist and create is False
+        :rtype: LibraryIndex | None
+        """
+        cache_dir = find_cache_dir(library)
+        if cache_dir is None:
+            return None
+
+        db_path = cache_dir / INDEX_NAME
+        if not create and not db_path.is_file():
+            return None
+
+        return cls(library, db_path)
+
+    @staticmethod
+    def exists(library: Path) -> bool:
+        """
+        Check if a library has an index
+
+        :param library: Path to the library
+        :type library: Path
+        :return: True if the index exists, False otherwise
+        :rtype: bool
+        """
+        cache_dir = find_cache_dir(library)
+        return cache_dir is not None and (cache_dir / INDEX_NAME).is_file()
+
+    def _check_schema(self) -> None:
+        """
+        Create the tables, dropping them first if they were created by another
+        version of bibman.
+        """
+        version = None
+        try:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE name = 'schema_version'"
+            ).fetchone()
+            version = None if row is None else int(row[0])
+        except sqlite3.OperationalError:
+            pass
+
+        if version != SCHEMA_VERSION:
+            tables = self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+            for (table,) in tables:
+                if not table.startswith("sqlite_"):
+                    self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),),
+        )
+        self.conn.commit()
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.library).as_posix()
+
+    def _absolute(self, relative: str) -> Path:
+        return self.library.joinpath(*relative.split("/"))
+
+    def _store(self, relative: str, entry: BibEntry, stat: os.stat_result):
+        self._unindex(relative)
+
+        fields = [[field.key, field.value] for field in entry.fields]
+        # full-text search texts, also stored in the entry for the lists
+        fields_dict = entry.fields_dict
+        texts = [
+            latex_converter.convert(str(fields_dict[name].value))
+            if name in fields_dict
+            else ""
+            for name in SEARCH_FIELDS
+        ]
+        summary = summarize(self._absolute(relative), entry)
+        cursor = self.conn.execute(
+            "INSERT OR REPLACE INTO entries "
+            "(path, mtime_ns, size, inode, key, entry_type, fields, raw, "
+            "title, authors, year) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                relative,
+                stat.st_mtime_ns,
+                stat.st_size,
+                stat.st_ino,
+                entry.key,
+                entry.entry_type,
+                json.dumps(fields, ensure_ascii=False),
+                entry.raw,
+                summary.title,
+                summary.authors,
+                summary.year,
+            ),
+        )
+
+        # full-text search row, with the same rowid as the entry
+        row = self.conn.execute(
+            "SELECT text FROM notes WHERE path = ?",
+            (self._note_path(relative),),
+        ).fetchone()
+        self.conn.execute(
+            "INSERT INTO search "
+            "(rowid, title, author, abstract, keywords, note) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (cursor.lastrowid, *texts, "" if row is None else row[0]),
+        )
+
+        # trigrams of the key, title and author last names, for fuzzy lookups
+        grams = set()
+        for text in entry_texts(entry):
+            grams.update(trigrams(text))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO trigrams (gram, entry) VALUES (?, ?)",
+            [(gram, cursor.lastrowid) for gram in grams],
+        )
+
+    def _unindex(self, relative: str) -> None:
+        """
+        Remove the full-text search row of an entry
+        """
+        row = self.conn.execute(
+            "SELECT rowid FROM entries WHERE path = ?", (relative,)
+        ).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM search WHERE rowid = ?", row)
+            self.conn.execute("DELETE FROM trigrams WHERE entry = ?", row)
+
+    def _index_note(self, relative: str, text: str) -> None:
+        """
+        Update the note of an entry in the full-text search index
+        """
+        row = self.conn.execute(
+            "SELECT rowid FROM entries WHERE path = ?", (relative,)
+        ).fetchone()
+        if row is not None:
+            self.conn.execute(
+                "UPDATE search SET note = ? WHERE rowid = ?", (text, row[0])
+            )
+
+    def _read_note(self, relative: str) -> str | None:
+        """
+        Contents of a note, or None if it was removed since the scan or can
+        not be read
+        """
+        try:
+            return self._absolute(relative).read_text()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    @staticmethod
+    def _note_path(relative: str) -> str:
+        """
+        Relative path of the note of an entry
+        """
+        folder, _, name = relative.rpartition("/")
+        note = note_name(name)
+        return folder + "/" + note if folder else note
+
+    @staticmethod
+    def _entry_path(relative: str) -> str:
+        """
+        Relative path of the entry of a note
+        """
+        folder, _, name = relative.rpartition("/")
+        entry = entry_name(name)
+        return folder + "/" + entry if folder else entry
+
+    @staticmethod
+    def _row_to_entry(key: str, entry_type: str, fields: str, raw) -> BibEntry:
+        return BibEntry(
+            entry_type,
+            key,
+            [Field(k, v) for k, v in json.loads(fields)],
+            raw=raw,
+        )
+
+    def refresh(self, jobs: int = 1) -> RefreshResult:
+        """
+        Bring the index up to date with the files in the library.
+
+        The library is scanned with a stat-only pass. Only the .bib and note
+        files whose modification time, size or inode changed are read again,
+        and files that no longer exist are dropped from the index. The .bib
+        files that can not be parsed are left out of the index and listed in
+        the skipped attribute. When entries changed, the saved LaTeX
+        conversions of field values that no longer exist are removed.
+
+        :param jobs: Number of worker processes used to parse the modified files
+        :type jobs: int
+        :return: Number of .bib files parsed, note files read and files removed
+        :rtype: RefreshResult
+        """
+        stored_entries = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, mtime_ns, size, inode FROM entries"
+            )
+        }
+        stored_notes = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, mtime_ns, size, inode FROM notes"
+            )
+        }
+
+        changed_entries = []
+        changed_notes = []
+        seen = set()
+        for batch in scan_library(self.library):
+            for relative, stat in batch:
+                seen.add(relative)
+                key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                if relative.endswith(".bib"):
+                    if stored_entries.get(relative) != key:
+                        changed_entries.append((relative, stat))
+                elif stored_notes.get(relative) != key:
+                    changed_notes.append((relative, stat))
+
+        notes = {}
+        for relative, stat in changed_notes:
+            text = self._read_note(relative)
+            if text is None:
+                continue
+            notes[relative] = text
+            self.conn.execute(
+                "INSERT OR REPLACE INTO notes "
+                "(path, mtime_ns, size, inode, text) VALUES (?, ?, ?, ?, ?)",
+                (relative, stat.st_mtime_ns, stat.st_size, stat.st_ino, text),
+            )
+
+        # files that can not be parsed are left out of the index, and parsed
+        # again by the next refresh
+        bibs = files_to_bib(
+            (self._absolute(relative) for relative, _ in changed_entries),
+            jobs,
+            skip_errors=True,
+        )
+        self.skipped = []
+        with latex_converter.use_store(self):
+            for (relative, stat), bib in zip(changed_entries, bibs):
+                if bib is None:
+                    self.skipped.append(relative)
+                else:
+                    self._store(relative, bib.entries[0], stat)
+
+        # notes of entries that were not parsed again
+        parsed = {relative for relative, _ in changed_entries}
+        for relative, text in notes.items():
+            entry = self._entry_path(relative)
+            if entry not in parsed:
+                self._index_note(entry, text)
+
+        skipped = set(self.skipped)
+        removed_entries = [
+            p for p in stored_entries if p not in seen or p in skipped
+        ]
+        removed_notes = [p for p in stored_notes if p not in seen]
+        for relative in removed_entries:
+            self._unindex(relative)
+            self.conn.execute("DELETE FROM entries WHERE path = ?", (relative,))
+        for relative in removed_notes:
+            self._index_note(self._entry_path(relative), "")
+            self.conn.execute("DELETE FROM notes WHERE path = ?", (relative,))
+        result = RefreshResult(
+            len(changed_entries) - len(self.skipped),
+            len(notes),
+            len(removed_entries) + len(removed_notes),
+        )
+        if any(result):
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('generation', ?)",
+                (str(self.generation + 1),),
+            )
+        self._flush_latex()
+        if changed_entries or removed_entries:
+            self._prune_latex()
+        self.conn.commit()
+
+        return result
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of refreshes that changed the index, to know if data computed
+        from the index is still up to date
+        """
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE name = 'generation'"
+        ).fetchone()
+
+        return 0 if row is None else int(row[0])
+
+    def entries(self) -> Iterator[tuple[Path, BibEntry]]:
+        """
+        Iterate over all the entries stored in the index, sorted by path
+
+        :return: Generator yielding (path, entry) pairs
+        :rtype: Iterator[tuple[Path, BibEntry]]
+        """
+        rows = self.conn.execute(
+            "SELECT path, key, entry_type, fields, raw FROM entries ORDER BY path"
+        )
+        for path, key, entry_type, fields, raw in rows:
+            yield (
+                self._absolute(path),
+                self._row_to_entry(key, entry_type, fields, raw),
+            )
+
+    def summaries(self) -> Iterator[EntrySummary]:
+        """
+        Iterate over the plain text fields of all the entries, sorted by path.
+        Faster than entries, the fields of the entries are not decoded.
+
+        :return: Generator yielding the summaries of the entries
+        :rtype: Iterator[EntrySummary]
+        """
+        rows = self.conn.execute(
+            "SELECT path, key, entry_type, title, authors, year FROM entries "
+            "ORDER BY path"
+        )
+        for path, *row in rows:
+            yield EntrySummary(self._absolute(path), *row)
+
+    def sources(self) -> Iterator[tuple[EntrySummary, str, str | None]]:
+        """
+        Iterate over the summaries of all the entries with the BibTeX source
+        of the entry and its note, sorted by path
+
+        :return: Generator yielding (summary, source, note) tuples
+        :rtype: Iterator[tuple[EntrySummary, str, str | None]]
+        """
+        notes = dict(self.conn.execute("SELECT path, text FROM notes"))
+        rows = self.conn.execute(
+            "SELECT path, key, entry_type, title, authors, year, raw "
+            "FROM entries ORDER BY path"
+        )
+        for path, *row, raw in rows:
+            yield (
+                EntrySummary(self._absolute(path), *row),
+                raw or "",
+                notes.get(self._note_path(path)),
+            )
+
+    def get(self, path: Path) -> BibEntry | None:
+        """
+        Get the entry of a file from the index, if the file has not changed
+        since it was indexed
+
+        :param path: Path to the .bib file
+        :type path: Path
+        :return: The entry, or None if it is not indexed or out of date
+        :rtype: BibEntry | None
+        """
+        try:
+            relative = self._relative(path)
+            stat = path.stat()
+        except (ValueError, OSError):
+            return None
+
+        row = self.conn.execute(
+            "SELECT mtime_ns, size, inode, key, entry_type, fields, raw "
+            "FROM entries WHERE path = ?",
+            (relative,),
+        ).fetchone()
+        if row is None or row[:3] != (
+            stat.st_mtime_ns,
+            stat.st_size,
+            stat.st_ino,
+        ):
+            return None
+
+        return self._row_to_entry(*row[3:])
+
+    def get_note(self, path: Path) -> str | None:
+        """
+        Get the note of an entry from the index
+
+        :param path: Path to the .bib file of the entry
+        :type path: Path
+        :return: Contents of the note, or None if the entry has no indexed note
+        :rtype: str | None
+        """
+        try:
+            relative = self._note_path(self._relative(path))
+        except ValueError:
+            return None
+
+        row = self.conn.execute(
+            "SELECT text FROM notes WHERE path = ?", (relative,)
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    def count(self) -> int:
+        """
+        Number of entries in the index
+
+        :return: Number of entries
+        :rtype: int
+        """
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def lookup_latex(self, source: str) -> str | None:
+        """
+        Get the plain text conversion of a LaTeX string, if it was converted before
+
+        :param source: LaTeX string
+        :type source: str
+        :return: Plain text, or None if the string was never converted
+        :rtype: str | None
+        """
+        row = self.conn.execute(
+            "SELECT text FROM latex WHERE source = ?", (source,)
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    def save_latex(self, source: str, text: str) -> None:
+        """
+        Save the plain text conversion of a LaTeX string.
+        Conversions are written to the database when the index is closed.
+
+        :param source: LaTeX string
+        :type source: str
+        :param text: Plain text
+        :type text: str
+        """
+        self._pending_latex.append((source, text))
+
+    def _flush_latex(self) -> None:
+        """
+        Write the pending LaTeX conversions to the database
+        """
+        if self._pending_latex:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO latex (source, text) VALUES (?, ?)",
+                self._pending_latex,
+            )
+            self._pending_latex = []
+
+    def _prune_latex(self) -> None:
+        """
+        Remove the saved LaTeX conversions of strings that are not the value
+        of a field of an entry, e.g. the title of a deleted entry
+        """
+        self.conn.execute(
+            "DELETE FROM latex WHERE source NOT IN ("
+            "  SELECT json_extract(field.value, '$[1]')"
+            "  FROM entries, json_each(entries.fields) AS field"
+            ")"
+        )
+
+    def search(
+        self, query: str, limit: int = 20
+    ) -> list[tuple[Path, BibEntry, float]]:
+        """
+        Full-text search over the title, author, abstract, keywords and note
+        of the entries. Results are ranked with BM25.
+
+        The query supports phrases ("density functional"), prefixes (dens*),
+        boolean operators (AND, OR, NOT) and column filters (author:jones).
+        If the query is not valid in that syntax, every word is searched as is.
+
+        :param query: Search query
+        :type query: str
+        :param limit: Maximum number of results
+        :type limit: int
+        :return: List of (path, entry, score) tuples, best match first
+        :rtype: list[tuple[Path, BibEntry, float]]
+        """
+        weights = ", ".join(str(w) for w in SEARCH_FIELDS.values())
+        sql = (
+            "SELECT e.path, e.key, e.entry_type, e.fields, e.raw, s.score "
+            "FROM ("
+            f"  SELECT rowid, bm25(search, {weights}, {NOTE_WEIGHT}) AS score "
+            "   FROM search WHERE search MATCH ? ORDER BY score LIMIT ?"
+            ") AS s JOIN entries AS e ON e.rowid = s.rowid "
+            "ORDER BY s.score"
+        )
+        try:
+            rows = self.conn.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # quote every word, so they are not interpreted as operators
+            words = query.replace('"', " ").split()
+            if len(words) == 0:
+                return []
+            escaped = " ".join(f'"{word}"' for word in words)
+            rows = self.conn.execute(sql, (escaped, limit)).fetchall()
+
+        return [
+            (
+                self._absolute(path),
+                self._row_to_entry(key, entry_type, fields, raw),
+                -score,
+            )
+            for path, key, entry_type, fields, raw, score in rows
+        ]
+
+    def fuzzy(
+        self,
+        query: str,
+        limit: int = 5,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> list[tuple[Path, float]]:
+        """
+        Typo-tolerant lookup of entries by key, title or author last name.
+        Only the entries sharing the most trigrams with the query, ignoring
+        the trigrams common to many entries, are compared with it.
+
+        :param query: Text to search
+        :type query: str
+        :param limit: Maximum number of results
+        :type limit: int
+        :param threshold: Minimum similarity of the results, between 0 and 1
+        :type threshold: float
+        :return: List of (path, similarity) pairs, best match first
+        :rtype: list[tuple[Path, float]]
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        # number of entries of each trigram, counted up to COMMON_TRIGRAM + 1
+        # so that a common trigram is not read in full
+        frequencies = {
+            gram: self.conn.execute(
+                "SELECT COUNT(*) FROM ("
+                "  SELECT 1 FROM trigrams WHERE gram = ? LIMIT ?"
+                ")",
+                (gram, COMMON_TRIGRAM + 1),
+            ).fetchone()[0]
+            for gram in query_grams
+        }
+        grams = [
+            gram for gram in query_grams if frequencies[gram] <= COMMON_TRIGRAM
+        ]
+        if not grams:
+            grams = list(query_grams)
+
+        placeholders = ", ".join("?" * len(grams))
+        rows = self.conn.execute(
+            "SELECT e.path, e.key, e.entry_type, e.fields, e.raw FROM ("
+            "  SELECT entry, COUNT(*) AS shared FROM trigrams"
+            f"  WHERE gram IN ({placeholders})"
+            "   GROUP BY entry ORDER BY shared DESC LIMIT ?"
+            ") AS t JOIN entries AS e ON e.rowid = t.entry",
+            (*grams, FUZZY_CANDIDATES),
+        )
+
+        results = []
+        with latex_converter.use_store(self):
+            for path, *row in rows:
+                entry = self._row_to_entry(*row)
+                score = best_similarity(query_grams, entry_texts(entry))
+                if score >= threshold:
+                    results.append((self._absolute(path), score))
+
+        results.sort(key=lambda item: -item[1])
+        return results[:limit]
+
+    def close(self) -> None:
+        """
+        Save the pending changes and close the connection to the database
+        """
+        self._flush_latex()
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self) -> "LibraryIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,132 @@
+"""
+Module to convert LaTeX strings to plain text.
+
+A single LatexNodes2Text converter is shared by the whole process, and the
+converted strings are kept in a bounded LRU cache. The cache can be backed by
+a persistent store (the library index), so strings converted in previous runs
+are not converted again.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from collections.abc import Iterator
+from typing import Protocol
+
+
+CACHE_SIZE = 65536
+
+
+class LatexStore(Protocol):
+    """
+    Persistent store of converted strings, see bibmancli.index.LibraryIndex
+    """
+
+    def lookup_latex(self, source: str) -> str | None: ...
+
+    def save_latex(self, source: str, text: str) -> None: ...
+
+
+class LatexConverter:
+    """
+    Class to convert LaTeX strings to plain text, caching the results
+
+    :param maxsize: Maximum number of converted strings kept in memory
+    :type maxsize: int
+    """
+
+    maxsize: int
+    store: LatexStore | None
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        """
+        Initialize the converter
+
+        :param maxsize: Maximum number of converted strings kept in memory
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.store = None
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        # strings known to be in the current store
+        self._stored: set[str] = set()
+        self._nodes2text = None
+
+    def _convert(self, source: str) -> str:
+        if self._nodes2text is None:
+            from pylatexenc.latex2text import LatexNodes2Text
+
+            self._nodes2text = LatexNodes2Text()
+
+        return self._nodes2text.latex_to_text(source)
+
+    def convert(self, source: str) -> str:
+        """
+        Convert a LaTeX string to plain text
+
+        :param source: LaTeX string
+        :type source: str
+        :return: Plain text
+        :rtype: str
+        """
+        text = self._cache.get(source)
+        if text is not None:
+            self._cache.move_to_end(source)
+            if self.store is not None and source not in self._stored:
+                # converted while another store (or none) was in use
+                self.store.save_latex(source, text)
+                self._stored.add(source)
+            return text
+
+        if self.store is not None:
+            text = self.store.lookup_latex(source)
+
+        if text is None:
+            text = self._convert(source)
+            if self.store is not None:
+                self.store.save_latex(source, text)
+
+        if self.store is not None:
+            self._stored.add(source)
+
+        self._cache[source] = text
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+        return text
+
+    @contextmanager
+    def use_store(self, store: LatexStore) -> Iterator[None]:
+        """
+        Use a persistent store while the context is active
+
+        :param store: Store to read and save converted strings
+        :type store: LatexStore
+        """
+        previous = (self.store, self._stored)
+        if store is not self.store:
+            self.store, self._stored = store, set()
+        try:
+            yield
+        finally:
+            self.store, self._stored = previous
+
+    def clear(self) -> None:
+        """
+        Empty the in-memory cache
+        """
+        self._cache.clear()
+
+
+converter = LatexConverter()
+
+
+def latex_to_text(source: str) -> str:
+    """
+    Convert a LaTeX string to plain text using the shared converter
+
+    :param source: LaTeX string
+    :type source: str
+    :return: Plain text
+    :rtype: str
+    """
+    return converter.convert(source)
@@ -1,34 +1,313 @@
+import os
+import re
+import time
+import queue
+import threading
 import requests
 from urllib.parse import quote_plus
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Protocol
+from requests.adapters import HTTPAdapter
 from bibmancli.bibtex import string_to_bib
+from bibmancli.response_cache import ResponseCache
 from bibtexparser.library import Library
 from habanero import cn
+from collections.abc import Callable
 
 
-def send_request(identifier: str, timeout: float) -> requests.Response:
+DEFAULT_BASE_URL = "https://en.wikipedia.org/api/rest_v1/data/citation/bibtex/"
+# environment variable to use another citation server, e.g. a local mirror
+BASE_URL_VARIABLE = "BIBMAN_CITATION_URL"
+HEADERS = {"Accept-Language": "en"}
+CROSSREF_SOURCE = "crossref"
+# responses stored in the cache, other errors are always retried
+CACHED_STATUSES = (200, 404)
+# seconds to wait for a backend before asking the next one at the same time
+HEDGE_DELAY = 1.0
+# weight of the last request in the latency estimate of a backend
+LATENCY_WEIGHT = 0.3
+# latency recorded when a backend can not be reached or returns an error
+FAILURE_LATENCY = 10.0
+# seconds to wait for the requests still running when a chain is closed
+WAIT_TIMEOUT = 2.0
+# DOI, alone or as a doi.org URL or with a "doi:" prefix
+DOI_PATTERN = re.compile(
+    r"(?:(?:https?://)?(?:dx\.)?doi\.org/|doi:)?\s*(10\.\d{4,9}/\S+)",
+    re.IGNORECASE,
+)
+
+
+class LatencyStats:
     """
-    Send a request to the Wikipedia REST API to resolve an identifier.
+    Moving average of the latency of each API, loaded from and saved to the
+    response cache if given. It can be shared by several threads.
+
+    :param cache: Cache where the latencies are stored
+    :type cache: ResponseCache | None
+    """
+
+    def __init__(self, cache: ResponseCache | None = None):
+        """
+        Load the stored latencies
+
+        :param cache: Cache where the latencies are stored
+        :type cache: ResponseCache | None
+        """
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._latencies = {} if cache is None else cache.latencies()
+
+    def estimate(self, source: str) -> float | None:
+        """
+        Get the estimated latency of an API
+
+        :param source: Name of the API
+        :type source: str
+        :return: Latency in seconds, None if the API was never used
+        :rtype: float | None
+        """
+        return self._latencies.get(source)
+
+    def record(self, source: str, seconds: float) -> None:
+        """
+        Add the latency of a request to the estimate of an API
+
+        :param source: Name of the API
+        :type source: str
+        :param seconds: Latency of the request in seconds
+        :type seconds: float
+        """
+        with self._lock:
+            previous = self._latencies.get(source)
+            if previous is not None:
+                seconds = (
+                    LATENCY_WEIGHT * seconds + (1 - LATENCY_WEIGHT) * previous
+                )
+            self._latencies[source] = seconds
+
+        if self.cache is not None:
+            self.cache.save_latency(source, seconds)
+
+
+class ResolveError(RuntimeError):
+    """
+    Error status returned by a citation API
+
+    :param status: HTTP status of the response
+    :type status: int
+    """
+
+    def __init__(self, status: int):
+        super().__init__(f"Error resolving identifier: {status}")
+        self.status = status
+
+
+def get_base_url() -> str:
+    """
+    Get the URL of the citation API, from the BIBMAN_CITATION_URL environment
+    variable or the Wikipedia REST API by default.
+
+    :return: URL to which the quoted identifier is appended
+    :rtype: str
+    """
+    return os.environ.get(BASE_URL_VARIABLE) or DEFAULT_BASE_URL
+
+
+def create_session(
+    connections: int = 10, block: bool = False
+) -> requests.Session:
+    """
+    Create a session that keeps the connections to the API open, so they are
+    reused between requests.
+
+    :param connections: Number of connections kept open to each host
+    :type connections: int
+    :param block: Wait for a free connection instead of opening more than connections to a host
+    :type block: bool
+    :return: Session
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=connections, pool_block=block
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+
+    return session
+
+
+def send_get(
+    identifier: str,
+    timeout: float,
+    session: requests.Session | None = None,
+    base_url: str | None = None,
+) -> requests.Response:
+    """
+    Send the request to resolve an identifier, whatever the response status
 
     :param identifier: Identifier of the entry
     :type identifier: str
     :param timeout: Request timeout in seconds
     :type timeout: float
+    :param session: Session used to send the request, to reuse its connections
+    :type session: requests.Session | None
+    :param base_url: URL of the API, see get_base_url
+    :type base_url: str | None
     :return: Response object
     :rtype: requests.Response
     """
     # format identifier
     identifier = quote_plus(identifier)
 
-    req = f"https://en.wikipedia.org/api/rest_v1/data/citation/bibtex/{identifier}"
-    r = requests.get(req, timeout=timeout, headers={"Accept-Language": "en"})
+    if base_url is None:
+        base_url = get_base_url()
+
+    req = base_url + identifier
+    if session is None:
+        return requests.get(req, timeout=timeout, headers=HEADERS)
+
+    return session.get(req, timeout=timeout)
+
+
+def send_request(
+    identifier: str,
+    timeout: float,
+    session: requests.Session | None = None,
+    base_url: str | None = None,
+) -> requests.Response:
+    """
+    Send a request to the Wikipedia REST API to resolve an identifier.
+
+    :param identifier: Identifier of the entry
+    :type identifier: str
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param session: Session used to send the request, to reuse its connections
+    :type session: requests.Session | None
+    :param base_url: URL of the API, see get_base_url
+    :type base_url: str | None
+    :return: Response object
+    :rtype: requests.Response
+    """
+    r = send_get(identifier, timeout, session, base_url)
 
-    if (error := r.status_code) != 200:
-        raise RuntimeError(f"Error resolving identifier: {error}")
+    if r.status_code != 200:
+        raise ResolveError(r.status_code)
 
     return r
 
 
-def send_request_habanero(identifier: str, timeout: float) -> str:
+def cached_fetch(
+    cache: ResponseCache | None,
+    source: str,
+    identifier: str,
+    refresh: bool,
+    fetch: Callable[[], tuple[int, str]],
+    stats: LatencyStats | None = None,
+) -> str:
+    """
+    Get the response of an API from the cache, or fetch and store it.
+
+    Fresh responses are returned without calling fetch. If fetch raises an
+    exception (the API can not be reached), an expired successful response is
+    used instead, so identifiers already seen can be resolved offline.
+
+    :param cache: Cache of the responses, None to always fetch
+    :type cache: ResponseCache | None
+    :param source: Name of the API
+    :type source: str
+    :param identifier: Identifier of the entry
+    :type identifier: str
+    :param refresh: Fetch the response even if it is cached
+    :type refresh: bool
+    :param fetch: Function sending the request, returning the status and body
+    :type fetch: Callable[[], tuple[int, str]]
+    :param stats: Latencies of the APIs, updated when a request is sent
+    :type stats: LatencyStats | None
+    :return: Body of the successful response
+    :rtype: str
+    """
+    cached = None
+    if cache is not None and not refresh:
+        cached = cache.get(source, identifier)
+
+    if cached is not None and cache.is_fresh(cached):
+        status, body = cached.status, cached.body
+    else:
+        start = time.perf_counter()
+        try:
+            status, body = fetch()
+        except Exception:
+            if stats is not None:
+                stats.record(source, FAILURE_LATENCY)
+            if cached is None or cached.status != 200:
+                raise
+            status, body = cached.status, cached.body
+        else:
+            if stats is not None:
+                elapsed = time.perf_counter() - start
+                if status not in CACHED_STATUSES:
+                    elapsed = FAILURE_LATENCY
+                stats.record(source, elapsed)
+            if cache is not None and status in CACHED_STATUSES:
+                cache.put(source, identifier, status, body)
+
+    if status != 200:
+        raise ResolveError(status)
+
+    return body
+
+
+def fetch_bibtex(
+    identifier: str,
+    timeout: float,
+    session: requests.Session | None = None,
+    base_url: str | None = None,
+    cache: ResponseCache | None = None,
+    refresh: bool = False,
+    stats: LatencyStats | None = None,
+) -> str:
+    """
+    Get the BibTeX of an identifier from the Wikipedia REST API, using the
+    cache of responses if given.
+
+    :param identifier: Identifier of the entry
+    :type identifier: str
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param session: Session used to send the request, to reuse its connections
+    :type session: requests.Session | None
+    :param base_url: URL of the API, see get_base_url
+    :type base_url: str | None
+    :param cache: Cache of the responses, None to always send the request
+    :type cache: ResponseCache | None
+    :param refresh: Send the request even if the response is cached
+    :type refresh: bool
+    :param stats: Latencies of the APIs, updated when a request is sent
+    :type stats: LatencyStats | None
+    :return: BibTeX string
+    :rtype: str
+    """
+    if base_url is None:
+        base_url = get_base_url()
+
+    def fetch() -> tuple[int, str]:
+        r = send_get(identifier, timeout, session, base_url)
+        return r.status_code, r.text
+
+    return cached_fetch(cache, base_url, identifier, refresh, fetch, stats)
+
+
+def send_request_habanero(
+    identifier: str,
+    timeout: float,
+    cache: ResponseCache | None = None,
+    refresh: bool = False,
+    stats: LatencyStats | None = None,
+) -> str:
     """
     Send a request to the CrossRef API to resolve an identifier.
 
@@ -38,20 +317,43 @@ def send_request_habanero(identifier: str, timeout: float) -> str:
     :type identifier: str
     :param timeout: Request timeout in seconds
     :type timeout: float
+    :param cache: Cache of the responses, None to always send the request
+    :type cache: ResponseCache | None
+    :param refresh: Send the request even if the response is cached
+    :type refresh: bool
+    :param stats: Latencies of the APIs, updated when a request is sent
+    :type stats: LatencyStats | None
     :return: BibTeX string
     :rtype: str
     """
-    try:
-        bib_str = cn.content_negotiation(
-            ids=identifier, format="bibtex", timeout=timeout
-        )
-    except Exception as e:
-        raise RuntimeError(f"Error resolving identifier: {e}")
 
-    return bib_str
+    def fetch() -> tuple[int, str]:
+        try:
+            bib_str = cn.content_negotiation(
+                ids=identifier, format="bibtex", timeout=timeout
+            )
+        except Exception as e:
+            # HTTP errors of the client used by habanero have the response
+            response = getattr(e, "response", None)
+            if response is not None:
+                return response.status_code, ""
+            raise RuntimeError(f"Error resolving identifier: {e}")
 
+        return 200, bib_str
 
-def resolve_identifier(identifier: str, timeout: float) -> Library:
+    return cached_fetch(
+        cache, CROSSREF_SOURCE, identifier, refresh, fetch, stats
+    )
+
+
+def resolve_identifier(
+    identifier: str,
+    timeout: float,
+    session: requests.Session | None = None,
+    base_url: str | None = None,
+    cache: ResponseCache | None = None,
+    refresh: bool = False,
+) -> Library:
     """
     Resolve an identifier to a BibTeX entry.
 
@@ -59,19 +361,351 @@ def resolve_identifier(identifier: str, timeout: float) -> Library:
     :type identifier: str
     :param timeout: Request timeout in seconds
     :type timeout: float
+    :param session: Session used to send the request, to reuse its connections
+    :type session: requests.Session | None
+    :param base_url: URL of the API, see get_base_url
+    :type base_url: str | None
+    :param cache: Cache of the responses, None to always send the request
+    :type cache: ResponseCache | None
+    :param refresh: Send the request even if the response is cached
+    :type refresh: bool
     :return: BibTeX entry
     :rtype: bibtexparser.library.Library
     """
     # send the request
     try:
-        r = send_request(identifier, timeout)
+        text = fetch_bibtex(
+            identifier, timeout, session, base_url, cache, refresh
+        )
     except Exception as e:
         raise e
 
     # parse response into dict
     try:
-        bibtex = string_to_bib(r.text)
+        bibtex = string_to_bib(text)
     except Exception as e:
         raise e
 
     return bibtex
+
+
+def doi_of(identifier: str) -> str | None:
+    """
+    Get the DOI of an identifier
+
+    :param identifier: Identifier of the entry
+    :type identifier: str
+    :return: The DOI without any prefix, or None if the identifier is not a DOI
+    :rtype: str | None
+    """
+    match = DOI_PATTERN.fullmatch(identifier.strip())
+
+    return None if match is None else match.group(1)
+
+
+class Backend(Protocol):
+    """
+    API that can resolve an identifier, see WikipediaBackend and
+    CrossRefBackend
+    """
+
+    source: str  # name of the API in the cache and latency stats
+
+    def accepts(self, identifier: str) -> bool: ...
+
+    def fetch(
+        self,
+        identifier: str,
+        timeout: float,
+        session: requests.Session | None,
+        cache: ResponseCache | None,
+        refresh: bool,
+        stats: LatencyStats | None,
+    ) -> str: ...
+
+
+class WikipediaBackend:
+    """
+    Wikipedia REST API, or the server set in BIBMAN_CITATION_URL
+
+    :param base_url: URL of the API, see get_base_url
+    :type base_url: str | None
+    """
+
+    def __init__(self, base_url: str | None = None):
+        self.source = get_base_url() if base_url is None else base_url
+
+    def accepts(self, identifier: str) -> bool:
+        # DOIs, URLs, PMIDs, PMCIDs, ISBNs...
+        return True
+
+    def fetch(self, identifier, timeout, session, cache, refresh, stats) -> str:
+        return fetch_bibtex(
+            identifier, timeout, session, self.source, cache, refresh, stats
+        )
+
+
+class CrossRefBackend:
+    """
+    CrossRef content negotiation API, only for DOIs
+    """
+
+    source = CROSSREF_SOURCE
+
+    def accepts(self, identifier: str) -> bool:
+        return doi_of(identifier) is not None
+
+    def fetch(self, identifier, timeout, session, cache, refresh, stats) -> str:
+        return send_request_habanero(
+            doi_of(identifier), timeout, cache, refresh, stats
+        )
+
+
+def default_backends() -> list[Backend]:
+    """
+    Backends used to resolve identifiers by default
+
+    :return: List of backends
+    :rtype: list[Backend]
+    """
+    return [WikipediaBackend(), CrossRefBackend()]
+
+
+class ResolverChain:
+    """
+    Resolve identifiers with several backends. The backend with the lowest
+    latency is asked first, and if it has not answered after hedge_delay
+    seconds (or it fails) the next one is asked at the same time. The first
+    valid BibTeX entry is returned.
+
+    The requests that lost keep running in the background and still store
+    their responses in the cache, so the chain should be used as a context
+    manager inside the one of the cache: it waits for them when it is closed.
+
+    :param backends: Backends to use, default_backends() by default
+    :type backends: list[Backend] | None
+    :param hedge_delay: Seconds to wait before asking the next backend
+    :type hedge_delay: float
+    :param cache: Cache of the responses and latencies
+    :type cache: ResponseCache | None
+    :param refresh: Send the requests even if the responses are cached
+    :type refresh: bool
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend] | None = None,
+        hedge_delay: float = HEDGE_DELAY,
+        cache: ResponseCache | None = None,
+        refresh: bool = False,
+    ):
+        """
+        Create the chain
+
+        :param backends: Backends to use, default_backends() by default
+        :type backends: list[Backend] | None
+        :param hedge_delay: Seconds to wait before asking the next backend
+        :type hedge_delay: float
+        :param cache: Cache of the responses and latencies
+        :type cache: ResponseCache | None
+        :param refresh: Send the requests even if the responses are cached
+        :type refresh: bool
+        """
+        self.backends = default_backends() if backends is None else backends
+        self.hedge_delay = hedge_delay
+        self.cache = cache
+        self.refresh = refresh
+        self.stats = LatencyStats(cache)
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def ordered(self, identifier: str | None = None) -> list[Backend]:
+        """
+        Backends sorted by estimated latency, the ones never used last
+
+        :param identifier: Only keep the backends that accept this identifier
+        :type identifier: str | None
+        :return: List of backends
+        :rtype: list[Backend]
+        """
+
+        def key(backend: Backend) -> float:
+            estimate = self.stats.estimate(backend.source)
+            return float("inf") if estimate is None else estimate
+
+        backends = self.backends
+        if identifier is not None:
+            backends = [b for b in backends if b.accepts(identifier)]
+
+        return sorted(backends, key=key)
+
+    def _attempt(
+        self,
+        backend: Backend,
+        identifier: str,
+        timeout: float,
+        session: requests.Session | None,
+    ) -> Library:
+        text = backend.fetch(
+            identifier, timeout, session, self.cache, self.refresh, self.stats
+        )
+        library = string_to_bib(text)
+        if len(library.entries) == 0:
+            raise RuntimeError("No BibTeX entry in the response")
+
+        return library
+
+    def resolve(
+        self,
+        identifier: str,
+        timeout: float,
+        session: requests.Session | None = None,
+    ) -> Library:
+        """
+        Resolve an identifier with the first backend that returns an entry
+
+        :param identifier: Identifier of the entry
+        :type identifier: str
+        :param timeout: Request timeout in seconds, for each backend
+        :type timeout: float
+        :param session: Session used to send the requests
+        :type session: requests.Session | None
+        :return: BibTeX entry
+        :rtype: bibtexparser.library.Library
+        """
+        ordered = self.ordered(identifier)
+        if len(ordered) == 0:
+            raise RuntimeError(f"No backend can resolve '{identifier}'")
+
+        backends = iter(ordered)
+        results = queue.Queue()
+        errors = []
+        running = 0
+
+        def attempt(backend: Backend) -> None:
+            try:
+                library = self._attempt(backend, identifier, timeout, session)
+            except Exception as e:
+                results.put((None, e))
+            else:
+                results.put((library, None))
+            finally:
+                with self._lock:
+                    self._threads.discard(threading.current_thread())
+
+        def start_next() -> bool:
+            nonlocal running
+            backend = next(backends, None)
+            if backend is None:
+                return False
+            # daemon threads, so that a slow backend does not delay the exit
+            # for more than WAIT_TIMEOUT (see wait)
+            thread = threading.Thread(
+                target=attempt, args=(backend,), daemon=True
+            )
+            with self._lock:
+                self._threads.add(thread)
+            thread.start()
+            running += 1
+            return True
+
+        start_next()
+        hedge = True
+        while running > 0:
+            try:
+                library, error = results.get(
+                    timeout=self.hedge_delay if hedge else None
+                )
+            except queue.Empty:
+                hedge = start_next()
+                continue
+
+            running -= 1
+            if error is None:
+                return library
+
+            errors.append(error)
+            if running == 0 or hedge:
+                hedge = start_next()
+
+        # all failed, report the first error
+        raise errors[0]
+
+    def wait(self, timeout: float = WAIT_TIMEOUT) -> None:
+        """
+        Wait for the requests still running, e.g. the ones of the backends
+        that lost a race, so that they do not use the cache after it is closed
+
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def __enter__(self) -> "ResolverChain":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.wait()
+
+
+class Resolved(NamedTuple):
+    """
+    Result of resolving one identifier of a batch
+    """
+
+    identifier: str
+    library: Library | None  # None if the identifier could not be resolved
+    error: str | None
+
+
+def resolve_identifiers(
+    identifiers: Iterable[str],
+    timeout: float,
+    workers: int = 8,
+    chain: ResolverChain | None = None,
+) -> Iterator[Resolved]:
+    """
+    Resolve many identifiers concurrently, with a bounded number of threads
+    sharing one session. Results are yielded as soon as they arrive, not in
+    the order of the identifiers.
+
+    :param identifiers: Identifiers of the entries
+    :type identifiers: Iterable[str]
+    :param timeout: Request timeout in seconds
+    :type timeout: float
+    :param workers: Maximum number of requests at the same time
+    :type workers: int
+    :param chain: Backends used to resolve the identifiers
+    :type chain: ResolverChain | None
+    :return: Generator yielding the result of each identifier
+    :rtype: Iterator[Resolved]
+    """
+    if chain is None:
+        chain = ResolverChain()
+
+    def resolve(identifier: str) -> Resolved:
+        try:
+            library = chain.resolve(identifier, timeout, session)
+        except requests.Timeout:
+            return Resolved(identifier, None, "Request timed out")
+        except Exception as e:
+            return Resolved(identifier, None, str(e) or type(e).__name__)
+
+        return Resolved(identifier, library, None)
+
+    with create_session(workers) as session:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(resolve, identifier) for identifier in identifiers
+            ]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                # stop the requests not sent yet if the consumer stops
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,378 @@
+"""
+Persistent cache of the responses of the citation APIs.
+
+Resolving an identifier is a network round trip, so the BibTeX returned for
+each identifier is kept in a SQLite database in the user cache directory
+($XDG_CACHE_HOME/bibman, ~/.cache/bibman by default). Successful responses
+are fresh for CACHE_TTL seconds and "not found" responses for NEGATIVE_TTL
+seconds. Expired successful responses are still used when the API can not be
+reached, so identifiers already seen can be resolved offline. When the
+database grows over MAX_SIZE bytes, the least recently used responses are
+removed. Once the cache is closed, reading it finds nothing and writing to it
+does nothing, so that a request still running in another thread can finish.
+
+The database also keeps the typical latency of each API, so that the
+fastest one is tried first (see bibmancli.resolve.ResolverChain).
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import NamedTuple
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+
+CACHE_NAME = "responses.sqlite"
+SCHEMA_VERSION = 2
+CACHE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+MAX_SIZE = 32 * 1024 * 1024
+# fraction of MAX_SIZE kept after an eviction, so that it does not run on
+# every new response
+EVICT_TO = 0.8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    source TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (source, identifier)
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS latencies (
+    source TEXT PRIMARY KEY,
+    seconds REAL NOT NULL
+);
+"""
+
+
+def user_cache_dir() -> Path:
+    """
+    Get the directory of the user cache of bibman, following the XDG base
+    directory specification.
+
+    :return: Path to the cache directory
+    :rtype: Path
+    """
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = Path.home() / ".cache"
+
+    return Path(base) / "bibman"
+
+
+class CachedResponse(NamedTuple):
+    """
+    Response of a citation API stored in the cache
+    """
+
+    status: int
+    body: str
+    fetched: float  # time.time() when the response was received
+
+
+class ResponseCache:
+    """
+    Cache of the responses of the citation APIs, keyed by the API (source) and
+    the identifier. It can be shared by several threads.
+
+    :param db_path: Path to the SQLite database file
+    :type db_path: Path
+    :param ttl: Seconds during which a successful response is fresh
+    :type ttl: float
+    :param negative_ttl: Seconds during which a "not found" response is fresh
+    :type negative_ttl: float
+    :param max_size: Maximum size in bytes of the stored responses
+    :type max_size: int
+    """
+
+    db_path: Path
+    ttl: float
+    negative_ttl: float
+    max_size: int
+    closed: bool
+
+    def __init__(
+        self,
+        db_path: Path,
+        ttl: float = CACHE_TTL,
+        negative_ttl: float = NEGATIVE_TTL,
+        max_size: int = MAX_SIZE,
+    ):
+        """
+        Open (and create if needed) the cache database
+
+        :param db_path: Path to the SQLite database file
+        :type db_path: Path
+        :param ttl: Seconds during which a successful response is fresh
+        :type ttl: float
+        :param negative_ttl: Seconds during which a "not found" response is fresh
+        :type negative_ttl: float
+        :param max_size: Maximum size in bytes of the stored responses
+        :type max_size: int
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.closed = False
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._check_schema()
+        self._size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @classmethod
+    def open(cls, db_path: Path | None = None) -> "ResponseCache | None":
+        """
+        Open the cache, or return None if it can not be used (e.g. the cache
+        directory is read-only), so that the callers work without it.
+
+        :param db_path: Path to the SQLite database file, in user_cache_dir by default
+        :type db_path: Path | None
+        :return: The cache, or None if it can not be opened
+        :rtype: ResponseCache | None
+        """
+        if db_path is None:
+            db_path = user_cache_dir() / CACHE_NAME
+
+        try:
+            return cls(db_path)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def _check_schema(self) -> None:
+        """
+        Create the tables, dropping them first if they were created by another
+        version of bibman.
+        """
+        version = None
+        try:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE name = 'schema_version'"
+            ).fetchone()
+            version = None if row is None else int(row[0])
+        except sqlite3.OperationalError:
+            pass
+
+        if version != SCHEMA_VERSION:
+            tables = self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+            for (table,) in tables:
+                if table != "meta" and not table.startswith("sqlite_"):
+                    self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),),
+        )
+        self.conn.commit()
+
+    def get(self, source: str, identifier: str) -> CachedResponse | None:
+        """
+        Get the stored response of an identifier, even if it is expired
+
+        :param source: API that resolved the identifier
+        :type source: str
+        :param identifier: Identifier of the entry
+        :type identifier: str
+        :return: The response, or None if the identifier was never resolved
+        :rtype: CachedResponse | None
+        """
+        with self._lock:
+            if self.closed:
+                return None
+
+            row = self.conn.execute(
+                "SELECT status, body, fetched FROM responses WHERE source = ? AND identifier = ?",
+                (source, identifier),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute(
+                "UPDATE responses SET accessed = ? WHERE source = ? AND identifier = ?",
+                (time.time(), source, identifier),
+            )
+            self.conn.commit()
+
+        return CachedResponse(*row)
+
+    def is_fresh(self, response: CachedResponse) -> bool:
+        """
+        Check if a stored response can be used without asking the API again
+
+        :param response: Stored response
+        :type response: CachedResponse
+        :return: True if the response has not expired
+        :rtype: bool
+        """
+        ttl = self.ttl if response.status == 200 else self.negative_ttl
+        return time.time() - response.fetched < ttl
+
+    def put(self, source: str, identifier: str, status: int, body: str) -> None:
+        """
+        Store the response of an identifier
+
+        :param source: API that resolved the identifier
+        :type source: str
+        :param identifier: Identifier of the entry
+        :type identifier: str
+        :param status: HTTP status of the response
+        :type status: int
+        :param body: Body of the response
+        :type body: str
+        """
+        now = time.time()
+        size = len(source) + len(identifier) + len(body.encode())
+        with self._lock:
+            if self.closed:
+                return
+
+            row = self.conn.execute(
+                "SELECT size FROM responses WHERE source = ? AND identifier = ?",
+                (source, identifier),
+            ).fetchone()
+            if row is not None:
+                self._size -= row[0]
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, identifier, status, body, now, now, size),
+            )
+            self._size += size
+            if self._size > self.max_size:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """
+        Remove the expired "not found" responses, then the least recently used
+        responses until the cache is below EVICT_TO of its maximum size.
+        """
+        self.conn.execute(
+            "DELETE FROM responses WHERE status != 200 AND fetched < ?",
+            (time.time() - self.negative_ttl,),
+        )
+        target = self.max_size * EVICT_TO
+        size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if size > target:
+            rows = self.conn.execute(
+                "SELECT source, identifier, size FROM responses ORDER BY accessed"
+            )
+            remove = []
+            for source, identifier, row_size in rows:
+                if size <= target:
+                    break
+                remove.append((source, identifier))
+                size -= row_size
+            self.conn.executemany(
+                "DELETE FROM responses WHERE source = ? AND identifier = ?",
+                remove,
+            )
+
+        self._size = size
+
+    def latencies(self) -> dict[str, float]:
+        """
+        Get the stored latency of each API
+
+        :return: Dictionary of API names and latencies in seconds
+        :rtype: dict[str, float]
+        """
+        with self._lock:
+            if self.closed:
+                return {}
+
+            rows = self.conn.execute(
+                "SELECT source, seconds FROM latencies"
+            ).fetchall()
+
+        return dict(rows)
+
+    def save_latency(self, source: str, seconds: float) -> None:
+        """
+        Store the latency of an API
+
+        :param source: Name of the API
+        :type source: str
+        :param seconds: Latency in seconds
+        :type seconds: float
+        """
+        with self._lock:
+            if self.closed:
+                return
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO latencies VALUES (?, ?)",
+                (source, seconds),
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        """
+        Remove all the stored responses
+        """
+        with self._lock:
+            if self.closed:
+                return
+
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self._size = 0
+
+    def close(self) -> None:
+        """
+        Close the connection to the database, after the running query
+        """
+        with self._lock:
+            if self.closed:
+                return
+
+            self.closed = True
+            self.conn.close()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+@contextmanager
+def open_cache(enabled: bool = True) -> Iterator[ResponseCache | None]:
+    """
+    Open the user cache for the duration of a command
+
+    :param enabled: False to disable the cache (--no-cache)
+    :type enabled: bool
+    :return: The cache, or None if it is disabled or can not be opened
+    :rtype: Iterator[ResponseCache | None]
+    """
+    cache = ResponseCache.open() if enabled else None
+    try:
+        yield cache
+    finally:
+        if cache is not None:
+            cache.close()
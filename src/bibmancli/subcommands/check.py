@@ -1,14 +1,21 @@
+import os
+import sys
+import json
 import typer
+from enum import StrEnum
+from hashlib import sha1
 from typing_extensions import Annotated
 from pathlib import Path
-from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.console import Console
-from typing import Optional
-from bibmancli.resolve import send_request
-from bibmancli.bibtex import file_to_bib
-from bibtexparser.library import Library
-from bibmancli.config_file import find_library, get_library
-from bibmancli.utils import get_walker
+from typing import Optional, NamedTuple
+from collections.abc import Iterator
+from bibmancli.config_file import (
+    find_library,
+    get_library,
+    find_cache_dir,
+    CACHE_DIR_NAME,
+)
+from bibmancli.companions import entry_name, resolve_names
 
 
 app = typer.Typer(
@@ -28,39 +35,514 @@ def identifier(
     timeout: Annotated[
         float, typer.Option(min=1.0, help="Request timeout in seconds")
     ] = 5.0,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache/--no-cache", help="Use the cache of resolved identifiers"
+        ),
+    ] = True,
+    refresh: Annotated[
+        bool,
+        typer.Option(help="Resolve the identifier again, even if cached"),
+    ] = False,
 ):
     """
     Check if an identifier is valid.
 
     IDENTIFIER can be URL of an article, DOI, PMCID or PMID.
     --timeout is the time in seconds to wait for a response. Default is 5.0.
+    --cache uses the response cached in the user cache directory if the identifier was resolved before, also when offline. --no-cache disables it. Default is --cache.
+    --refresh resolves the identifier again and updates the cache.
     """
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from bibmancli.resolve import fetch_bibtex
+    from bibmancli.response_cache import open_cache
+
     # check if identifier is valid
-    with Progress(
-        SpinnerColumn(),
-        TextColumn(text_format="[progress.description]{task.description}"),
-        transient=True,
-        console=console,
-    ) as progress:
+    with (
+        open_cache(cache) as response_cache,
+        Progress(
+            SpinnerColumn(),
+            TextColumn(text_format="[progress.description]{task.description}"),
+            transient=True,
+            console=console,
+        ) as progress,
+    ):
         progress.add_task(description="Checking identifier...")
         try:
-            r = send_request(identifier, timeout)
-
-            if r.status_code == 200:
-                console.print("[green]Identifier is valid![/]")
-            else:
-                err_console.print("[bold red]ERROR[/] Identifier is NOT valid")
+            fetch_bibtex(
+                identifier, timeout, cache=response_cache, refresh=refresh
+            )
+            console.print("[green]Identifier is valid![/]")
         except Exception:
             print("Identifier is NOT valid")
 
 
+def parse_error(filepath: Path) -> str | None:
+    """
+    Try to parse a .bib file and return the error message if it fails.
+
+    :param filepath: Path to the .bib file
+    :type filepath: Path
+    :return: Error message, or None if the file is valid
+    :rtype: str | None
+    """
+    from bibmancli.bibtex import file_to_bib
+
+    try:
+        file_to_bib(filepath)
+    except Exception as e:
+        return str(e)
+
+    return None
+
+
+NOT_MANAGED = "Found file that is not managed by bibman"
+NO_ENTRY = "Found file without associated entry"
+PARSE_ERROR = "Error parsing BibTeX file"
+NO_NOTE = "No note found"
+NO_PDF = "No PDF found"
+
+CHECK_CACHE_NAME = "check.json"
+TEXT_BATCH = 200
+
+# folders that are never checked, folders starting with '_' are also skipped
+SKIP_FOLDERS = {".git", ".github", CACHE_DIR_NAME}
+
+
+class ReportFormat(StrEnum):
+    """
+    Output formats of check library
+    """
+
+    TEXT = "text"
+    JSONL = "jsonl"
+    JUNIT = "junit"
+
+
+class CheckResult(NamedTuple):
+    """
+    Result of checking a file of the library. Paths are relative to the
+    library, in POSIX format.
+    """
+
+    path: str
+    kind: str  # "entry" for .bib files, "file" for any other file
+    errors: list[str]
+    message: str | None = None  # parser error message
+    note: str | None = None
+    pdf: str | None = None
+    removed: bool = False
+
+
+class CheckCache:
+    """
+    Parse results of the .bib files from previous checks, keyed by the hash
+    of the file contents. The hash of a file is only computed again when its
+    modification time or size change.
+
+    :param cache_dir: Cache directory of the library, None to disable the cache
+    :type cache_dir: Path | None
+    """
+
+    path: Path | None
+
+    def __init__(self, cache_dir: Path | None):
+        """
+        Load the cache
+
+        :param cache_dir: Cache directory of the library, None to disable the cache
+        :type cache_dir: Path | None
+        """
+        from bibmancli.version import __version__
+
+        self.path = None if cache_dir is None else cache_dir / CHECK_CACHE_NAME
+        self._version = __version__
+        self._files: dict[str, list] = {}
+        self._errors: dict[str, str | None] = {}
+        self._new: dict[str, list] = {}
+
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # results of other bibman versions may not be valid
+        if isinstance(data, dict) and data.get("version") == self._version:
+            self._files = data.get("files", {})
+            self._errors = {
+                digest: error for _, _, digest, error in self._files.values()
+            }
+
+    def lookup(
+        self, relative: str, filepath: str | Path, stat: os.stat_result
+    ) -> tuple[str | None, bool, str | None]:
+        """
+        Find the result of a file in the cache
+
+        :param relative: Path of the file relative to the library
+        :type relative: str
+        :param filepath: Path to the file
+        :type filepath: str | Path
+        :param stat: Stat result of the file
+        :type stat: os.stat_result
+        :return: Hash of the file, if the result was found and the error message
+        :rtype: tuple[str | None, bool, str | None]
+        """
+        if self.path is None:
+            return None, False, None
+
+        record = self._files.get(relative)
+        if record is not None and record[:2] == [
+            stat.st_mtime_ns,
+            stat.st_size,
+        ]:
+            digest = record[2]
+        else:
+            with open(filepath, "rb") as f:
+                digest = sha1(f.read()).hexdigest()
+
+        if digest in self._errors:
+            return digest, True, self._errors[digest]
+
+        return digest, False, None
+
+    def store(
+        self,
+        relative: str,
+        stat: os.stat_result,
+        digest: str | None,
+        error: str | None,
+    ) -> None:
+        """
+        Save the result of a file
+
+        :param relative: Path of the file relative to the library
+        :type relative: str
+        :param stat: Stat result of the file
+        :type stat: os.stat_result
+        :param digest: Hash of the file
+        :type digest: str | None
+        :param error: Error message, or None if the file is valid
+        :type error: str | None
+        """
+        if self.path is not None:
+            self._new[relative] = [
+                stat.st_mtime_ns,
+                stat.st_size,
+                digest,
+                error,
+            ]
+
+    def save(self) -> None:
+        """
+        Write the results of the files stored in this check, forgetting the
+        files that were not found
+        """
+        from bibmancli.config_file import create_cache_dir
+
+        if self.path is None or self._new == self._files:
+            return
+
+        create_cache_dir(self.path.parent)
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": self._version, "files": self._new},
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(temporary, self.path)
+
+
+def walk_library(location: Path) -> Iterator[tuple[str, list[os.DirEntry]]]:
+    """
+    List the files of each folder of the library, skipping the folders that
+    are not managed by bibman (.git, .github, the cache and the folders
+    starting with '_', like the HTML site)
+
+    :param location: Path to the library
+    :type location: Path
+    :return: Generator yielding the folder relative to the library (empty or ending with '/') and its files, sorted by name
+    :rtype: Iterator[tuple[str, list[os.DirEntry]]]
+    """
+    pending = [(os.fspath(location), "")]
+    while pending:
+        directory, prefix = pending.pop()
+        files = []
+        folders = []
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    if not (
+                        item.name.startswith("_") or item.name in SKIP_FOLDERS
+                    ):
+                        folders.append((item.path, prefix + item.name + "/"))
+                else:
+                    files.append(item)
+
+        files.sort(key=lambda item: item.name)
+        yield prefix, files
+
+        pending.extend(sorted(folders, reverse=True))
+
+
+def check_library(
+    location: Path,
+    jobs: int = 1,
+    fix: bool = False,
+    cache_dir: Path | None = None,
+) -> Iterator[CheckResult]:
+    """
+    Check the files of the library. Files that are not managed by bibman are
+    reported first, then every .bib file with its note and PDF.
+
+    :param location: Path to the library
+    :type location: Path
+    :param jobs: Number of worker processes used to parse the .bib files
+    :type jobs: int
+    :param fix: Remove the files that are not managed by bibman
+    :type fix: bool
+    :param cache_dir: Directory where the results are cached, None to parse every file
+    :type cache_dir: Path | None
+    :return: Generator yielding the result of each file
+    :rtype: Iterator[CheckResult]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from bibmancli.bibtex import resolve_jobs, chunk_size
+
+    def problem(item: os.DirEntry, relative: str, error: str) -> CheckResult:
+        if fix:
+            os.unlink(item.path)
+        return CheckResult(relative, "file", [error], removed=fix)
+
+    bib_files = []
+    for prefix, files in walk_library(location):
+        # existence of notes and PDFs is checked against the listing
+        names = {item.name for item in files}
+        for item in files:
+            name = item.name
+            relative = prefix + name
+
+            if name == ".gitignore":
+                continue
+
+            if name.endswith(".bib"):
+                bib_files.append((item, relative, prefix, names))
+                continue
+
+            # if file id .txt or .pdf, check if there is a corresponding .bib file
+            entryname = entry_name(name)
+            if entryname is None:
+                yield problem(item, relative, NOT_MANAGED)
+                continue
+
+            if entryname not in names:
+                yield problem(item, relative, NO_ENTRY)
+
+    cache = CheckCache(cache_dir)
+    states = []
+    for item, relative, _, _ in bib_files:
+        stat = item.stat()
+        states.append((stat, *cache.lookup(relative, item.path, stat)))
+
+    # parse the files not found in the cache, in parallel if jobs is given
+    jobs = resolve_jobs(jobs)
+    to_parse = [
+        Path(item.path)
+        for (item, _, _, _), (_, _, found, _) in zip(bib_files, states)
+        if not found
+    ]
+    pool = None
+    if jobs == 1 or len(to_parse) <= 1:
+        parsed = map(parse_error, to_parse)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        parsed = pool.map(
+            parse_error, to_parse, chunksize=chunk_size(len(to_parse), jobs)
+        )
+
+    try:
+        for (item, relative, prefix, names), (
+            stat,
+            digest,
+            found,
+            error,
+        ) in zip(bib_files, states):
+            if not found:
+                error = next(parsed)
+            cache.store(relative, stat, digest, error)
+
+            if error is not None:
+                yield CheckResult(relative, "entry", [PARSE_ERROR], error)
+                continue
+
+            errors = []
+            note, pdf = resolve_names(item.name, names)
+            if note is not None:
+                note = prefix + note
+            else:
+                errors.append(NO_NOTE)
+
+            if pdf is not None:
+                pdf = prefix + pdf
+            else:
+                errors.append(NO_PDF)
+
+            yield CheckResult(relative, "entry", errors, note=note, pdf=pdf)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    cache.save()
+
+
+def result_text(result: CheckResult, location: Path) -> str:
+    """
+    Text shown in the terminal for the result of a file, with rich markup
+
+    :param result: Result to show
+    :type result: CheckResult
+    :param location: Path to the library
+    :type location: Path
+    :return: Text with rich markup
+    :rtype: str
+    """
+    path = os.path.join(location, result.path)
+    if result.kind == "file":
+        lines = [f":red_circle: [red]{result.errors[0]}[/]: {path}"]
+        if result.removed:
+            lines.append("  :arrow_forward: Removing file... [green]Done[/]")
+    elif result.message is not None:
+        lines = [
+            f":red_circle: [red]{PARSE_ERROR}[/]: {path}",
+            f"  :down-right_arrow: {result.message}",
+        ]
+    else:
+        lines = [f"{path}: [green]No warnings raised[/]"]
+        if result.note is not None:
+            note = os.path.join(location, result.note)
+            lines.append(f"  :arrow_forward: [yellow]Note found[/]: {note}")
+        else:
+            lines.append(f"  :red_circle: [red]{NO_NOTE}[/]")
+        if result.pdf is not None:
+            pdf = os.path.join(location, result.pdf)
+            lines.append(f"  :arrow_forward: [yellow]PDF found[/]: {pdf}")
+        else:
+            lines.append(f"  :red_circle: [red]{NO_PDF}[/]")
+
+    return "\n".join(lines)
+
+
+def junit_report(results: list[CheckResult]) -> str:
+    """
+    Create a JUnit XML report with a test case for each file
+
+    :param results: Results of the files
+    :type results: list[CheckResult]
+    :return: XML string
+    :rtype: str
+    """
+    return junit_xml(
+        "bibman check library",
+        [
+            (
+                result.path,
+                result.errors,
+                result.errors + ([result.message] if result.message else []),
+            )
+            for result in results
+        ],
+    )
+
+
+def junit_xml(name: str, cases: list[tuple[str, list[str], list[str]]]) -> str:
+    """
+    Create a JUnit XML report, the test cases are grouped by folder
+
+    :param name: Name of the test suite
+    :type name: str
+    :param cases: (relative path, errors, details) of each test case
+    :type cases: list[tuple[str, list[str], list[str]]]
+    :return: XML string
+    :rtype: str
+    """
+    from xml.sax.saxutils import escape, quoteattr
+
+    failures = sum(1 for _, errors, _ in cases if errors)
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<testsuites tests="{len(cases)}" failures="{failures}">',
+        f'<testsuite name={quoteattr(name)} tests="{len(cases)}" failures="{failures}">',
+    ]
+    for path, errors, details in cases:
+        folder, _, name = path.rpartition("/")
+        classname = folder.replace("/", ".") or "."
+        attributes = f"classname={quoteattr(classname)} name={quoteattr(name)}"
+        if not errors:
+            lines.append(f"<testcase {attributes}/>")
+            continue
+
+        lines.append(f"<testcase {attributes}>")
+        lines.append(
+            f"<failure message={quoteattr('; '.join(errors))}>{escape(chr(10).join(details))}</failure>"
+        )
+        lines.append("</testcase>")
+
+    lines.append("</testsuite>")
+    lines.append("</testsuites>")
+
+    return "\n".join(lines) + "\n"
+
+
+DOI_ERRORS = {
+    "dead": "Dead DOI",
+    "mismatch": "Mismatched DOI",
+    "error": "Could not verify DOI",
+}
+
+
 @app.command()
-def library(
-    fix: Annotated[
+def identifiers(
+    ctx: typer.Context,
+    workers: Annotated[
+        int,
+        typer.Option(min=1, help="Number of DOIs verified at the same time"),
+    ] = 8,
+    rate: Annotated[
+        float,
+        typer.Option(
+            min=0.0,
+            help="Maximum number of requests per second, 0 for no limit",
+        ),
+    ] = 10.0,
+    per_host: Annotated[
+        int,
+        typer.Option(min=1, help="Maximum number of connections to each host"),
+    ] = 4,
+    retries: Annotated[
+        int,
+        typer.Option(min=0, help="Number of retries of a failed request"),
+    ] = 3,
+    timeout: Annotated[
+        float, typer.Option(min=1.0, help="Request timeout in seconds")
+    ] = 5.0,
+    format: Annotated[
+        ReportFormat, typer.Option(help="Output format of the report")
+    ] = ReportFormat.TEXT,
+    cache: Annotated[
         bool,
         typer.Option(
-            "--fix/--ignore", help="Try to fix any problems identified"
+            "--cache/--no-cache", help="Use the cache of resolved identifiers"
         ),
+    ] = True,
+    refresh: Annotated[
+        bool,
+        typer.Option(help="Resolve the DOIs again, even if cached"),
     ] = False,
     location: Annotated[
         Optional[Path],
@@ -75,9 +557,17 @@ def library(
     ] = None,
 ):
     """
-    Check if all entries in the library are properly formatted.
+    Check the DOIs of all the entries in the library.
 
-    If --fix is provided, will attempt to fix any issues found. Mainly removing files that are not managed by bibman.
+    Reports the DOIs that can not be resolved (dead) and the DOIs that resolve to another entry (mismatched).
+    --workers is the number of DOIs verified at the same time. Default is 8.
+    --rate is the maximum number of requests per second. Default is 10.
+    --per-host is the maximum number of connections to each host. Default is 4.
+    --retries is the number of retries, with exponential backoff, when the server is overloaded or can not be reached. Default is 3.
+    --timeout is the time in seconds to wait for a response. Default is 5.0.
+    --format is the output format: text (only the problems), jsonl (one JSON object per entry) or junit (JUnit XML). Default is text.
+    --cache uses the responses cached in the user cache directory for the DOIs resolved before. --no-cache disables it. Default is --cache.
+    --refresh resolves the DOIs again and updates the cache.
     --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
     """
     if location is None:
@@ -95,121 +585,185 @@ def library(
             )
             raise typer.Exit(1)
 
-    # check if all entries in library are properly formatted
-    entry_count = 0
-    error_count = 0
-    for root, dirs, files in get_walker(location):
-        if type(root) is not Path:
-            root = Path(root)
-
-        if root.name.startswith("_"):
-            # skip _site folder
-            continue
-
-        relative_to_loc = root.relative_to(location)
-        parts = relative_to_loc.parts
-
-        if len(parts) > 0 and parts[0] == ".git":
-            # skip .git folder
-            continue
-
-        if len(parts) > 0 and parts[0] == ".github":
-            # skip .github folder
-            continue
-
-        for name in files:
-            if name == ".gitignore":
-                # skip .gitignore
-                continue
-
-            filepath = root / name
-
-            if not name.endswith(".bib"):
-                # check that file is either .txt or .pdf
-                if not name.endswith(".txt") and not name.endswith(".pdf"):
-                    console.print(
-                        f":red_circle: [red]Found file that is not managed by bibman[/]: {filepath}"
-                    )
-
-                    error_count += 1
-
-                    if fix:
+    from rich.progress import (
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        BarColumn,
+        MofNCompleteColumn,
+    )
+    from bibmancli.doi import collect_dois, verify_dois, OK
+    from bibmancli.response_cache import open_cache
+    from bibmancli.utils import get_jobs
+
+    dois, without = collect_dois(location, get_jobs(ctx))
+
+    counts = dict.fromkeys([OK, *DOI_ERRORS], 0)
+    junit_cases = []
+    with (
+        open_cache(cache) as response_cache,
+        Progress(
+            SpinnerColumn(),
+            TextColumn(text_format="[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            transient=True,
+            console=err_console,
+        ) as progress,
+    ):
+        task = progress.add_task(
+            description="Verifying DOIs...", total=len(dois)
+        )
+        results = verify_dois(
+            dois,
+            timeout,
+            workers,
+            rate,
+            per_host,
+            retries,
+            cache=response_cache,
+            refresh=refresh,
+        )
+        for result in results:
+            progress.advance(task)
+            counts[result.status] += 1
+
+            match format:
+                case ReportFormat.TEXT:
+                    if result.status != OK:
+                        path = os.path.join(location, result.path)
                         console.print(
-                            "  :arrow_forward: Removing file...",
-                            end="",
+                            f":red_circle: [red]{DOI_ERRORS[result.status]}[/] {result.doi}: {path}\n  :down-right_arrow: {result.message}"
                         )
-                        filepath.unlink()
-                        console.print(" [green]Done[/]")
-
-                # if file id .txt or .pdf, check if there is a corresponding .bib file
-                if name.endswith(".txt"):
-                    entryname = f"{name[1:-4]}.bib"
-                    entrypath = root / entryname
-                elif name.endswith(".pdf"):
-                    entryname = f"{name[:-4]}.bib"
-                    entrypath = root / entryname
-                else:
-                    continue
-
-                if not entrypath.is_file():
-                    console.print(
-                        f":red_circle: [red]Found file without associated entry[/]: {filepath}"
+                case ReportFormat.JSONL:
+                    sys.stdout.write(
+                        json.dumps(result._asdict(), ensure_ascii=False) + "\n"
+                    )
+                case ReportFormat.JUNIT:
+                    errors = (
+                        []
+                        if result.status == OK
+                        else [DOI_ERRORS[result.status]]
                     )
+                    details = [result.doi] + (
+                        [result.message] if result.message else []
+                    )
+                    junit_cases.append((result.path, errors, details))
 
-                    error_count += 1
+    summary = f"Checked [green]{len(dois)}[/] DOIs ({without} entries without DOI): [red]{counts['dead']}[/] dead, [red]{counts['mismatch']}[/] mismatched, [yellow]{counts['error']}[/] could not be verified"
+    match format:
+        case ReportFormat.TEXT:
+            console.print(f"\n{summary}")
+        case ReportFormat.JSONL:
+            err_console.print(summary)
+        case ReportFormat.JUNIT:
+            junit_cases.sort()
+            sys.stdout.write(junit_xml("bibman check identifiers", junit_cases))
+            err_console.print(summary)
 
-                    if fix:
-                        console.print(
-                            "  :arrow_forward: Removing file...",
-                            end="",
-                        )
-                        filepath.unlink()
-                        console.print(" [green]Done[/]")
 
-                continue
+@app.command()
+def library(
+    ctx: typer.Context,
+    fix: Annotated[
+        bool,
+        typer.Option(
+            "--fix/--ignore", help="Try to fix any problems identified"
+        ),
+    ] = False,
+    jobs: Annotated[
+        Optional[int],
+        typer.Option(
+            "--jobs",
+            "-j",
+            min=0,
+            help="Number of processes used to parse the files, 0 for one per CPU core",
+        ),
+    ] = None,
+    format: Annotated[
+        ReportFormat, typer.Option(help="Output format of the report")
+    ] = ReportFormat.TEXT,
+    cache: Annotated[
+        bool, typer.Option(help="Reuse the results of unchanged files")
+    ] = True,
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Check if all entries in the library are properly formatted.
 
-            entry_count += 1
+    If --fix is provided, will attempt to fix any issues found. Mainly removing files that are not managed by bibman.
+    --jobs is the number of processes used to parse the .bib files. Default is the global --jobs option.
+    --format is the output format: text, jsonl (one JSON object per file) or junit (JUnit XML). Default is text.
+    --cache/--no-cache reuses the results of the files that did not change since the last check. Default is --cache.
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    if location is None:
+        location = find_library()
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in current directory or parents!"
+            )
+            raise typer.Exit(1)
+    else:
+        location = get_library(location)
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in the provided directory!"
+            )
+            raise typer.Exit(1)
 
-            # check that bib file is valid
-            try:
-                bib_library: Library = file_to_bib(filepath)
-            except Exception as e:
-                console.print(
-                    f":red_circle: [red]Error parsing BibTeX file[/]: {filepath}"
-                )
-                console.print(f"  :down-right_arrow: {e}")
-                error_count += 1
-                continue
+    from bibmancli.utils import get_jobs
 
-            if len(bib_library.entries) > 1:
-                console.print(
-                    f":red_circle: [red]Found file that contains multiple BibTeX entries[/]: {filepath}"
-                )
-                error_count += 1
-                continue
+    if jobs is None:
+        jobs = get_jobs(ctx)
 
-            console.print(f"{filepath}: [green]No warnings raised[/]")
+    results = check_library(
+        location,
+        jobs=jobs,
+        fix=fix,
+        cache_dir=find_cache_dir(location) if cache else None,
+    )
 
-            # check if entry has a note
-            notepath = root / f".{name[:-4]}.txt"
-            if notepath.is_file():
-                console.print(
-                    f"  :arrow_forward: [yellow]Note found[/]: {notepath}"
-                )
-            else:
-                console.print("  :red_circle: [red]No note found[/]")
-                error_count += 1
-
-            # check if entry has a PDF
-            pdfpath = root / f"{name[:-4]}.pdf"
-            if pdfpath.is_file():
-                console.print(
-                    f"  :arrow_forward: [yellow]PDF found[/]: {pdfpath}"
+    entry_count = 0
+    error_count = 0
+    junit_results = []
+    # the text is printed in batches, printing each line with rich is slow
+    text = []
+    for result in results:
+        if result.kind == "entry":
+            entry_count += 1
+        error_count += len(result.errors)
+
+        match format:
+            case ReportFormat.TEXT:
+                text.append(result_text(result, location))
+                if len(text) >= TEXT_BATCH:
+                    console.print("\n".join(text))
+                    text = []
+            case ReportFormat.JSONL:
+                sys.stdout.write(
+                    json.dumps(result._asdict(), ensure_ascii=False) + "\n"
                 )
-            else:
-                console.print("  :red_circle: [red]No PDF found[/]")
-                error_count += 1
-
-    console.print(
-        f"\nChecked [green]{entry_count}[/] entries and a total of [red]{error_count}[/] errors were found"
-    )
+            case ReportFormat.JUNIT:
+                junit_results.append(result)
+
+    summary = f"Checked [green]{entry_count}[/] entries and a total of [red]{error_count}[/] errors were found"
+    match format:
+        case ReportFormat.TEXT:
+            text.append(f"\n{summary}")
+            console.print("\n".join(text))
+        case ReportFormat.JSONL:
+            err_console.print(summary)
+        case ReportFormat.JUNIT:
+            sys.stdout.write(junit_report(junit_results))
+            err_console.print(summary)
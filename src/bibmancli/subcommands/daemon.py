@@ -0,0 +1,235 @@
+import sys
+import time
+import typer
+from typing_extensions import Annotated
+from pathlib import Path
+from rich.console import Console
+from typing import Optional
+from bibmancli.config_file import find_library, get_library
+
+
+app = typer.Typer(
+    no_args_is_help=True,
+    help="""
+    Run a daemon that keeps the library in memory to answer show, search, export and note instantly.
+    """,
+)
+
+console = Console()
+err_console = Console(stderr=True)
+
+# seconds to wait for a daemon started with --background to accept requests
+START_TIMEOUT = 300.0
+
+
+def _resolve_location(location: Optional[Path]) -> Path:
+    """
+    Get the library location from the --location option or the current directory.
+    """
+    if location is None:
+        location = find_library()
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in current directory or parents!"
+            )
+            raise typer.Exit(1)
+    else:
+        location = get_library(location)
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in the provided directory!"
+            )
+            raise typer.Exit(1)
+
+    return location
+
+
+def _print_answer(messages) -> int:
+    """
+    Print the messages of the answer of the daemon and return its exit code
+    """
+    code = 0
+    for message in messages:
+        if "out" in message:
+            console.print("\n".join(message["out"]))
+        if "err" in message:
+            err_console.print("\n".join(message["err"]))
+        if "exit" in message:
+            code = message["exit"]
+
+    return code
+
+
+@app.command()
+def start(
+    ctx: typer.Context,
+    background: Annotated[
+        bool,
+        typer.Option(
+            "--background/--foreground",
+            help="Run the daemon in the background",
+        ),
+    ] = False,
+    interval: Annotated[
+        float,
+        typer.Option(
+            min=0.1,
+            help="Seconds between two scans of the library without inotify",
+        ),
+    ] = 2.0,
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Start the daemon of the library.
+
+    The daemon loads the library once and keeps it in memory. While it runs, the show, search, export and note commands of the library are answered by the daemon.
+    --background starts the daemon in the background and returns once it accepts requests. Default is --foreground, stop it with Ctrl+C or bibman daemon stop.
+    --interval is the time in seconds between two scans of the library for modified files, used only on systems without inotify. Default is 2 seconds.
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    from bibmancli.daemon import DaemonServer, connect
+    from bibmancli.utils import get_jobs
+
+    library = _resolve_location(location)
+
+    sock = connect(library)
+    if sock is not None:
+        sock.close()
+        err_console.print(
+            f"[yellow]A daemon is already running for '{library}'[/]"
+        )
+        raise typer.Exit(1)
+
+    if background:
+        import subprocess
+
+        # the new process runs in the same directory, with the same options
+        args = [
+            sys.executable,
+            "-m",
+            "bibmancli",
+            "--jobs",
+            str(get_jobs(ctx)),
+            "daemon",
+            "start",
+            "--interval",
+            str(interval),
+        ]
+        if location is not None:
+            args += ["--location", str(location.resolve())]
+
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        deadline = time.monotonic() + START_TIMEOUT
+        with console.status("Loading the library..."):
+            while time.monotonic() < deadline:
+                if process.poll() is not None:
+                    err_console.print(
+                        "[bold red]ERROR[/] The daemon could not be started"
+                    )
+                    raise typer.Exit(1)
+                sock = connect(library)
+                if sock is not None:
+                    sock.close()
+                    break
+                time.sleep(0.1)
+            else:
+                err_console.print(
+                    "[bold red]ERROR[/] The daemon did not start in time"
+                )
+                raise typer.Exit(1)
+
+        console.print(
+            f"[green]Daemon started[/] for '{library}' (pid {process.pid})"
+        )
+        return
+
+    import signal
+
+    server = DaemonServer(library, get_jobs(ctx), interval)
+    # stop cleanly (removing the socket) when killed
+    signal.signal(signal.SIGTERM, lambda *args: server.stop())
+    console.print(f"Loading '{library}'...")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        err_console.print(f"[bold red]ERROR[/] {e}")
+        raise typer.Exit(1)
+
+
+@app.command()
+def stop(
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Stop the daemon of the library.
+
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    from bibmancli.daemon import request
+
+    location = _resolve_location(location)
+    messages = request(location, "stop", {})
+    if messages is None:
+        err_console.print(f"[yellow]No daemon running for '{location}'[/]")
+        raise typer.Exit(1)
+
+    raise typer.Exit(_print_answer(messages))
+
+
+@app.command()
+def status(
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Show if the daemon of the library is running.
+
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    from bibmancli.daemon import request
+
+    location = _resolve_location(location)
+    messages = request(location, "status", {})
+    if messages is None:
+        console.print(f"No daemon running for '{location}'")
+        raise typer.Exit(1)
+
+    raise typer.Exit(_print_answer(messages))
@@ -0,0 +1,159 @@
+import typer
+from typing_extensions import Annotated
+from pathlib import Path
+from rich.console import Console
+from typing import Optional
+from bibmancli.config_file import find_library, get_library
+
+
+app = typer.Typer(
+    no_args_is_help=True,
+    help="""
+    Manage the persistent index of the library, used to avoid parsing unchanged entries.
+    """,
+)
+
+console = Console()
+err_console = Console(stderr=True)
+
+
+def _resolve_location(location: Optional[Path]) -> Path:
+    """
+    Get the library location from the --location option or the current directory.
+    """
+    if location is None:
+        location = find_library()
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in current directory or parents!"
+            )
+            raise typer.Exit(1)
+    else:
+        location = get_library(location)
+        if location is None:
+            err_console.print(
+                "[bold red]ERROR[/] .bibman.toml not found in the provided directory!"
+            )
+            raise typer.Exit(1)
+
+    return location
+
+
+@app.command()
+def build(
+    ctx: typer.Context,
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Create the library index, or bring it up to date if it already exists.
+
+    Once the index exists, commands that go through the whole library read the entries from it and only parse new or modified files. The files are parsed with the number of processes of the global --jobs option.
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    location = _resolve_location(location)
+
+    from bibmancli.index import LibraryIndex
+    from bibmancli.utils import get_jobs
+
+    index = LibraryIndex.open(location, create=True)
+    if index is None:
+        err_console.print(
+            "[bold red]ERROR[/] Could not find the cache directory of the library!"
+        )
+        raise typer.Exit(1)
+
+    with index:
+        result = index.refresh(get_jobs(ctx))
+        count = index.count()
+
+    console.print(
+        f"[bold green]Index updated[/]: [green]{result.parsed}[/] entries parsed, [green]{result.notes}[/] notes read, [red]{result.removed}[/] files removed, {count} entries in '{index.db_path}'"
+    )
+    if index.skipped:
+        err_console.print(
+            f"[yellow]{len(index.skipped)} files could not be parsed and are not in the index:[/]"
+        )
+        for relative in index.skipped:
+            err_console.print(f"  {relative}")
+
+
+@app.command()
+def status(
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Show if the library has an index and how many entries it contains.
+
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    location = _resolve_location(location)
+
+    from bibmancli.index import LibraryIndex
+
+    index = LibraryIndex.open(location)
+    if index is None:
+        console.print(
+            "[yellow]The library has no index.[/] Create it with [bold]bibman index build[/]"
+        )
+        return
+
+    with index:
+        console.print(
+            f"Index '{index.db_path}' contains [green]{index.count()}[/] entries"
+        )
+
+
+@app.command()
+def clear(
+    location: Annotated[
+        Optional[Path],
+        typer.Option(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            writable=True,
+            readable=True,
+            help="Directory containing the .bibman.toml file",
+        ),
+    ] = None,
+):
+    """
+    Delete the library index. Commands will parse every file again.
+
+    --location is the directory containing the .bibman.toml file of the library. If not provided, a .bibman.toml file is searched in the current directory and all parent directories.
+    """
+    location = _resolve_location(location)
+
+    from bibmancli.index import LibraryIndex
+
+    index = LibraryIndex.open(location)
+    if index is None:
+        console.print("[yellow]The library has no index[/]")
+        return
+
+    index.close()
+    for suffix in ("", "-wal", "-shm"):
+        file = index.db_path.with_name(index.db_path.name + suffix)
+        file.unlink(missing_ok=True)
+
+    console.print("[bold green]Index removed[/]")
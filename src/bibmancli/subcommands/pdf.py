@@ -3,16 +3,7 @@ from typing_extensions import Annotated
 from rich.console import Console
 from typing import Optional
 from pathlib import Path
-import requests
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.prompt import Confirm
-from bibmancli.pdf_utils import (
-    get_scihub_urls,
-    get_scihub_contents,
-    extract_pdf_link_from_html,
-)
 from bibmancli.config_file import find_library, get_library
-from bibmancli.utils import iterate_files
 
 
 HEADERS = {
@@ -64,6 +55,16 @@ def download(
             )
             raise typer.Exit(1)
 
+    import requests
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from bibmancli.pdf_utils import (
+        get_scihub_urls,
+        get_scihub_contents,
+        extract_pdf_link_from_html,
+    )
+    from bibmancli.utils import iterate_files
+    from bibmancli.companions import CompanionResolver
+
     with Progress(
         SpinnerColumn(),
         TextColumn(text_format="[progress.description]{task.description}"),
@@ -91,13 +92,13 @@ def download(
         transient=True,
         console=console,
     ) as progress:
+        companions = CompanionResolver()
         for file in iterate_files(location):
             entry_count += 1
 
-            filename = file.path.stem + ".pdf"
-            pdf_path = file.path.parent / filename
+            pdf_path = file.path.with_suffix(".pdf")
 
-            if pdf_path.exists():
+            if companions.resolve(file.path).pdf is not None:
                 console.print(
                     f"[bold yellow]WARNING[/] PDF already exists for entry '{file.path.relative_to(location)}'"
                 )
@@ -257,22 +258,31 @@ def add(
         # create necessary folders
         save_location.mkdir(parents=True, exist_ok=True)
 
-    # check if the entry exists
-    entry_path = save_location / (entry + ".bib")
-    if not entry_path.exists():
+    from bibmancli.companions import CompanionResolver
+
+    # check if the entry exists, listing its folder once
+    companions = CompanionResolver().resolve(save_location / (entry + ".bib"))
+    if companions.entry is None:
         err_console.print(
             f"[bold red]ERROR[/] Entry '{entry}' not found in library"
         )
+        from bibmancli.fuzzy import suggestion_names
+
+        suggestions = suggestion_names(location, entry)
+        if suggestions:
+            err_console.print("Did you mean: " + ", ".join(suggestions))
         raise typer.Exit(1)
 
     # check if the PDF file already exists
     pdf_path = save_location / (entry + ".pdf")
-    if pdf_path.exists():
+    if companions.pdf is not None:
         err_console.print(
             f"[bold yellow]WARNING[/] PDF file already exists for entry '{entry}'"
         )
 
         if not yes:
+            from rich.prompt import Confirm
+
             if not Confirm.ask(
                 "Do you want to overwrite the existing PDF file?"
             ):
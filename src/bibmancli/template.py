@@ -0,0 +1,119 @@
+"""
+Module to compile the output format strings used to show the entries.
+
+A format string such as "{path}: {title}" is compiled once into a template
+that only computes the placeholders it references. Placeholders can be any
+BibTeX field name, plus the special fields:
+
+    path        Path to the .bib file
+    entry_name  Key of the entry
+    entry_type  Type of the entry (article, book, ...)
+
+A default value for missing fields can be given after a '|', for example
+"{doi|no DOI}". Without it, missing fields are shown as "ENTRY HAS NO <FIELD>".
+"""
+
+import re
+from functools import lru_cache
+from collections.abc import Callable
+from bibmancli.latex import latex_to_text
+
+
+PLACEHOLDER = re.compile(r"\{([A-Za-z_][\w-]*)(?:\|([^{}]*))?\}")
+
+
+def _special_getter(name: str) -> Callable | None:
+    match name:
+        case "path":
+            return lambda entry, fields: str(entry.path)
+        case "entry_name":
+            return lambda entry, fields: entry.contents.key
+        case "entry_type":
+            return lambda entry, fields: entry.contents.entry_type
+        case _:
+            return None
+
+
+def _field_getter(name: str, default: str | None) -> Callable:
+    if default is None:
+        default = f"ENTRY HAS NO {name.upper()}"
+
+    def getter(entry, fields: dict) -> str:
+        field = fields.get(name)
+        if field is None:
+            return default
+
+        return latex_to_text(str(field.value))
+
+    return getter
+
+
+class EntryTemplate:
+    """
+    Compiled output format string
+
+    :param format: Format string
+    :type format: str
+    """
+
+    format: str
+    fields: list[str]
+
+    def __init__(self, format: str):
+        """
+        Compile the format string
+
+        :param format: Format string
+        :type format: str
+        """
+        self.format = format
+        self.fields = []
+        self._parts: list[str | Callable] = []
+        self._needs_fields = False
+
+        position = 0
+        for match in PLACEHOLDER.finditer(format):
+            if match.start() > position:
+                self._parts.append(format[position : match.start()])
+
+            name, default = match.group(1), match.group(2)
+            self.fields.append(name)
+            getter = _special_getter(name)
+            if getter is None:
+                getter = _field_getter(name, default)
+                self._needs_fields = True
+            self._parts.append(getter)
+
+            position = match.end()
+
+        if position < len(format):
+            self._parts.append(format[position:])
+
+    def render(self, entry) -> str:
+        """
+        Format an entry
+
+        :param entry: Entry to format
+        :type entry: bibmancli.utils.Entry
+        :return: Formatted string
+        :rtype: str
+        """
+        fields = entry.contents.fields_dict if self._needs_fields else None
+
+        return "".join(
+            part if type(part) is str else part(entry, fields)
+            for part in self._parts
+        )
+
+
+@lru_cache(maxsize=32)
+def compile_format(format: str) -> EntryTemplate:
+    """
+    Compile a format string, reusing previously compiled templates
+
+    :param format: Format string
+    :type format: str
+    :return: Compiled template
+    :rtype: EntryTemplate
+    """
+    return EntryTemplate(format)
@@ -1,25 +1,182 @@
+from textual import work
 from textual.app import App, ComposeResult
-from textual.widgets import Header, Footer, TextArea, DirectoryTree
+from textual.widgets import (
+    Header,
+    Footer,
+    TextArea,
+    Tree,
+    DataTable,
+    Input,
+    Static,
+    TabbedContent,
+    TabPane,
+)
+from textual.widgets.tree import TreeNode, UnknownNodeID
 from textual.containers import Horizontal, Vertical
+from textual.message import Message
+from textual.worker import get_current_worker
+from rich.text import Text
 from pathlib import Path
-from typing import Iterable
+from collections import OrderedDict
+import os
 from os import system, environ
+from bibmancli.companions import CompanionResolver, note_name, entry_name
+from bibmancli.watcher import LibraryWatcher, MODIFIED
+from bibmancli.fuzzy import author_last_names
 
 
-class FilenameTree(DirectoryTree):
+# children added at once to a folder of the tree, the next ones are added
+# when the end of the folder is scrolled into view
+PAGE_SIZE = 200
+# entries and notes kept in memory after being shown
+PREVIEW_CACHE_SIZE = 64
+# columns of the table of entries
+TABLE_COLUMNS = ("Title", "First author", "Year", "Type", "Folder")
+
+
+class FilenameTree(Tree[Path]):
+    """
+    Tree of the folders and entries of the library.
+
+    Folders are listed in a worker thread with os.scandir when they are
+    expanded, which tells the folders from the files without a stat call per
+    file. Large folders are added to the tree page by page, so the tree stays
+    responsive.
+    """
+
+    class FileSelected(Message):
+        """Posted when an entry of the tree is selected."""
+
+        def __init__(self, path: Path) -> None:
+            self.path = path
+            super().__init__()
+
+    def __init__(self, path: Path, **kwargs):
+        super().__init__(path.name, data=path, **kwargs)
+        # ids of the folder nodes listed or being listed
+        self._loaded: set[int] = set()
+        # nodes showing the number of children not added yet
+        self._more: dict[int, tuple[TreeNode[Path], list[tuple[Path, bool]]]]
+        self._more = {}
+
     def on_mount(self):
         self.styles.max_width = "25%"
         self.styles.min_width = 20
 
         self.guide_depth = 3
+        self.watch(self, "scroll_y", self._show_more, init=False)
+        self.root.expand()
 
-    def filter_paths(self, paths: Iterable[Path]) -> Iterable[Path]:
-        return [
-            path
-            for path in paths
-            if path.suffix == ".bib"
-            or (path.is_dir() and (path.name[0] != "_" and path.name[0] != "."))
-        ]
+    def _attached(self, node: TreeNode[Path]) -> bool:
+        try:
+            return self.get_node_by_id(node.id) is node
+        except UnknownNodeID:
+            return False
+
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+        node = event.node
+        if node.data is not None and node.id not in self._loaded:
+            self._loaded.add(node.id)
+            self.list_folder(node)
+
+    def on_tree_node_highlighted(self, event: Tree.NodeHighlighted) -> None:
+        if event.node.id in self._more:
+            self._show_more()
+
+    def on_tree_node_selected(self, event: Tree.NodeSelected) -> None:
+        node = event.node
+        if node.data is not None and not node.allow_expand:
+            self.post_message(self.FileSelected(node.data))
+
+    def on_resize(self) -> None:
+        self._show_more()
+
+    @work(thread=True)
+    def list_folder(self, node: TreeNode[Path]) -> None:
+        """
+        List the entries and the folders of a folder of the library
+        """
+        location = node.data
+        paths = []
+        try:
+            with os.scandir(location) as it:
+                for item in it:
+                    try:
+                        is_dir = item.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if is_dir and item.name[0] not in "_.":
+                        paths.append((location / item.name, True))
+                    elif not is_dir and item.name.endswith(".bib"):
+                        paths.append((location / item.name, False))
+        except OSError:
+            pass
+
+        # folders first, like the file managers
+        paths.sort(key=lambda item: (not item[1], item[0].name.lower()))
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self._populate, node, paths)
+
+    def _populate(
+        self, node: TreeNode[Path], paths: list[tuple[Path, bool]]
+    ) -> None:
+        # the node was removed while its folder was listed
+        if not self._attached(node):
+            return
+
+        expanded = {child.data for child in node.children if child.is_expanded}
+        node.remove_children()
+        self._add_page(node, paths, expanded)
+        self.call_after_refresh(self._show_more)
+
+    def _add_page(
+        self,
+        node: TreeNode[Path],
+        paths: list[tuple[Path, bool]],
+        expanded: set[Path],
+    ) -> None:
+        for path, is_dir in paths[:PAGE_SIZE]:
+            if is_dir:
+                child = node.add(path.name, data=path)
+                if path in expanded:
+                    child.expand()
+            else:
+                node.add_leaf(path.name, data=path)
+
+        remaining = paths[PAGE_SIZE:]
+        if remaining:
+            more = node.add_leaf(f"... {len(remaining)} more")
+            self._more[more.id] = (more, remaining)
+
+    def _show_more(self) -> None:
+        """
+        Add the next children of the folders whose end is visible
+        """
+        bottom = self.scroll_offset.y + self.size.height
+        for key, (more, remaining) in list(self._more.items()):
+            if not self._attached(more):
+                del self._more[key]
+                continue
+            if more.line < 0 or more.line > bottom:
+                continue
+
+            del self._more[key]
+            parent = more.parent
+            more.remove()
+            self._add_page(parent, remaining, set())
+
+    def reload_node(self, node: TreeNode[Path]) -> None:
+        """
+        List again a folder, now if it is expanded or else when it is
+        """
+        self._loaded.discard(node.id)
+        if node.is_expanded:
+            self._loaded.add(node.id)
+            self.list_folder(node)
+
+    def reload(self) -> None:
+        self.reload_node(self.root)
 
 
 class MainPane(Horizontal):
@@ -37,6 +194,13 @@ class MainPane(Horizontal):
         ("r", "reload_tree", "[R]eload Tree"),
     }
 
+    class LibraryChanged(Message):
+        """Posted by the watcher when files of the library change."""
+
+        def __init__(self, events: list) -> None:
+            self.events = events
+            super().__init__()
+
     def __init__(self, location: Path):
         self.path = location
         self.save_path = location
@@ -44,6 +208,11 @@ class MainPane(Horizontal):
         self.text_area.border_title = "File contents"
         self.note = TextArea(read_only=True)
         self.note.border_title = "Note contents"
+        # listings of the folders, to find the notes without a stat per file
+        self.companions = CompanionResolver()
+        # contents of the last shown entries and their notes
+        self.previews: OrderedDict[Path, tuple[str, str]] = OrderedDict()
+        self.watcher = LibraryWatcher(location)
         super().__init__()
 
     def compose(self) -> ComposeResult:
@@ -52,31 +221,307 @@ class MainPane(Horizontal):
             yield self.text_area
             yield self.note
 
+    def on_mount(self) -> None:
+        # the watcher calls the subscribers from its thread
+        self.watcher.subscribe(
+            lambda events: self.post_message(self.LibraryChanged(events))
+        )
+        self.watcher.start()
+
+    def on_unmount(self) -> None:
+        self.watcher.stop()
+
+    def on_main_pane_library_changed(self, message: LibraryChanged) -> None:
+        """Update the tree and the open entry with the changed files."""
+        changed = set()
+        reload = set()
+        for event in message.events:
+            for relative in (event.path, event.old_path):
+                if relative is None:
+                    continue
+                path = self.path.joinpath(*relative.split("/"))
+                changed.add(path)
+                self.companions.forget(path.parent)
+                entry = (
+                    entry_name(path.name)
+                    if path.suffix != ".bib"
+                    else path.name
+                )
+                if entry is not None:
+                    self.previews.pop(path.parent / entry, None)
+                if event.kind != MODIFIED and path.suffix == ".bib":
+                    reload.add(path.parent)
+
+        # only the folders where entries were added or removed are reloaded
+        tree = self.query_one(FilenameTree)
+        nodes = [tree.root]
+        while nodes:
+            node = nodes.pop()
+            if node.data in reload:
+                tree.reload_node(node)
+            else:
+                nodes.extend(node.children)
+
+        entry = self.save_path
+        if entry.suffix == ".bib" and (
+            entry in changed or entry.parent / note_name(entry.name) in changed
+        ):
+            self.update_text(entry)
+
     def action_reload_tree(self) -> None:
         tree = self.query_one(FilenameTree)
+        self.companions.forget()
         tree.reload()
 
-    def update_text(self, path: Path) -> None:
-        filename = path.name
-        notename = "." + filename.replace(".bib", ".txt")
-
-        self.text_area.text = path.read_text()
-        self.note.text = (path.parent / notename).read_text()
+    def update_text(self, path: Path, refresh: bool = False) -> None:
+        """
+        Show an entry and its note. The files are read in a worker thread,
+        unless the entry was shown recently.
+        """
         self.save_path = path
+        if refresh:
+            self.previews.pop(path, None)
+
+        preview = self.previews.get(path)
+        if preview is None:
+            self.load_preview(path)
+        else:
+            self.previews.move_to_end(path)
+            self.text_area.text, self.note.text = preview
+
+    @work(thread=True, exclusive=True, group="preview")
+    def load_preview(self, path: Path) -> None:
+        note = self.companions.resolve(path).note
+        try:
+            text = path.read_text()
+            note_text = "" if note is None else note.read_text()
+        except OSError:
+            # removed since it was selected
+            text, note_text = "", ""
+
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self.show_preview, path, text, note_text)
+
+    def show_preview(self, path: Path, text: str, note: str) -> None:
+        self.previews[path] = (text, note)
+        while len(self.previews) > PREVIEW_CACHE_SIZE:
+            self.previews.popitem(last=False)
 
-    def on_directory_tree_file_selected(
-        self, event: DirectoryTree.FileSelected
+        # another entry may have been selected while the files were read
+        if path == self.save_path:
+            self.text_area.text = text
+            self.note.text = note
+
+    def on_filename_tree_file_selected(
+        self, event: FilenameTree.FileSelected
     ) -> None:
         """Called when the user click a file in the directory tree."""
         path = event.path
         self.update_text(path)
 
 
+class EntryTable(Vertical):
+    """
+    Table of the entries of the library, read from the library index if the
+    library has one, otherwise from the files.
+
+    The entries are filtered and sorted in memory, without reading any file,
+    and they are added to the table page by page as it is scrolled, so the
+    table stays responsive however big the library is.
+    """
+
+    DEFAULT_CSS = """
+    EntryTable DataTable {
+        height: 1fr;
+    }
+    EntryTable Static {
+        height: 1;
+    }
+    """
+
+    class EntrySelected(Message):
+        """Posted when an entry of the table is selected."""
+
+        def __init__(self, path: Path) -> None:
+            self.path = path
+            super().__init__()
+
+    def __init__(self, location: Path):
+        self.location = location
+        # cells, text searched by the filter and path of every entry
+        self.rows: list[tuple[tuple[str, ...], str, Path]] = []
+        # rows matching the filter, in the order of the table
+        self.matches: list[tuple[tuple[str, ...], str, Path]] = []
+        self.filter_query = ""
+        self.sort_column: int | None = None
+        self.sort_reverse = False
+        # number of matches added to the table
+        self.shown = 0
+        self.loaded = False
+        self.filter_box = Input(placeholder="Filter the entries")
+        self.table = DataTable(cursor_type="row", zebra_stripes=True)
+        self.status = Static()
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield self.filter_box
+        yield self.table
+        yield self.status
+
+    def on_mount(self) -> None:
+        self.table.add_columns(*TABLE_COLUMNS)
+        self.watch(self.table, "scroll_y", self._show_more, init=False)
+
+    def on_show(self) -> None:
+        # the index is only read when the table is shown for the first time
+        if not self.loaded:
+            self.reload()
+
+    def reload(self) -> None:
+        """
+        Read the entries again, refreshing the library index first
+        """
+        self.loaded = True
+        if not self.rows:
+            self.status.update("Reading the library...")
+        self.load_entries()
+
+    @work(thread=True, exclusive=True, group="table")
+    def load_entries(self) -> None:
+        from bibmancli.index import LibraryIndex, summarize
+        from bibmancli.latex import converter as latex_converter
+        from bibmancli.utils import iterate_files
+
+        rows = []
+
+        def add_row(summary) -> None:
+            folder = summary.path.parent.relative_to(self.location)
+            authors = author_last_names(summary.authors)
+            cells = (
+                summary.title,
+                authors[0] if authors else "",
+                summary.year,
+                summary.entry_type,
+                "" if folder == Path() else folder.as_posix(),
+            )
+            text = " ".join((summary.key, summary.authors, *cells))
+            rows.append((cells, text.lower(), summary.path))
+
+        # the index is only used if the library has one
+        index = LibraryIndex.open(self.location)
+        if index is None:
+            for entry in iterate_files(self.location, use_index=False):
+                add_row(summarize(entry.path, entry.contents))
+            rows.sort(key=lambda row: row[2])
+        else:
+            with index, latex_converter.use_store(index):
+                index.refresh()
+                for summary in index.summaries():
+                    add_row(summary)
+
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self.set_rows, rows)
+
+    def set_rows(self, rows: list[tuple[tuple[str, ...], str, Path]]) -> None:
+        self.rows = rows
+        if self.sort_column is not None:
+            self._sort(self.rows)
+
+        self.filter_query = ""
+        self.filter(self.filter_box.value)
+
+    def filter(self, query: str) -> None:
+        """
+        Show the entries containing all the words of the query in their key,
+        title, authors, year, type or folder
+        """
+        query = query.lower()
+        # the entries matching a longer query are among the current matches
+        if self.filter_query and query.startswith(self.filter_query):
+            candidates = self.matches
+        else:
+            candidates = self.rows
+        self.filter_query = query
+
+        words = query.split()
+        self.matches = [
+            row for row in candidates if all(word in row[1] for word in words)
+        ]
+        self._fill()
+
+    def sort_by(self, column: int) -> None:
+        """
+        Sort the entries by a column, in reverse order if they are already
+        sorted by it
+        """
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+
+        self._sort(self.rows)
+        self._sort(self.matches)
+        self._fill()
+
+    def _sort(self, rows: list[tuple[tuple[str, ...], str, Path]]) -> None:
+        column = self.sort_column
+        rows.sort(
+            key=lambda row: row[0][column].lower(), reverse=self.sort_reverse
+        )
+
+    def _fill(self) -> None:
+        self.table.clear()
+        self.shown = 0
+        self._add_page()
+
+    def _add_page(self) -> None:
+        for cells, _, path in self.matches[self.shown : self.shown + PAGE_SIZE]:
+            # the cells are shown as they are, not as markup
+            self.table.add_row(*(Text(cell) for cell in cells), key=str(path))
+        self.shown = min(self.shown + PAGE_SIZE, len(self.matches))
+
+        status = f"{self.shown} of {len(self.matches)} entries"
+        if len(self.matches) != len(self.rows):
+            status += f" ({len(self.rows)} in the library)"
+        self.status.update(status)
+
+    def _show_more(self) -> None:
+        """
+        Add the next page of entries when the end of the table is visible
+        """
+        if self.shown < len(self.matches) and (
+            self.table.scroll_y >= self.table.max_scroll_y
+            or self.table.cursor_row >= self.shown - 1
+        ):
+            self._add_page()
+
+    def on_resize(self) -> None:
+        self._show_more()
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        self.filter(event.value)
+
+    def on_data_table_header_selected(
+        self, event: DataTable.HeaderSelected
+    ) -> None:
+        self.sort_by(event.column_index)
+
+    def on_data_table_row_highlighted(
+        self, event: DataTable.RowHighlighted
+    ) -> None:
+        self._show_more()
+
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        self.post_message(self.EntrySelected(Path(event.row_key.value)))
+
+
 class BibApp(App[None]):
     BINDINGS = {
         ("q", "quit", "[Q]uit"),
         ("e", "edit_file", "[E]dit Open File"),
         ("n", "edit_note", "Edit Open [N]ote"),
+        ("t", "toggle_table", "[T]able"),
     }
 
     def __init__(self, *, location: Path):
@@ -89,7 +534,15 @@ class BibApp(App[None]):
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
         yield Footer()
-        yield MainPane(self.location)
+        with TabbedContent(initial="files"):
+            with TabPane("Files", id="files"):
+                yield MainPane(self.location)
+            with TabPane("Table", id="table"):
+                yield EntryTable(self.location)
+
+    def action_toggle_table(self) -> None:
+        tabs = self.query_one(TabbedContent)
+        tabs.active = "files" if tabs.active == "table" else "table"
 
     def action_edit_file(self) -> None:
         main_pane = self.query_one(MainPane)
@@ -109,7 +562,8 @@ class BibApp(App[None]):
             system(f"{editor} {main_pane.save_path}")
             # system(f"vim {main_pane.save_path}")
 
-        main_pane.update_text(main_pane.save_path)
+        main_pane.companions.forget(main_pane.save_path.parent)
+        main_pane.update_text(main_pane.save_path, refresh=True)
 
     def action_edit_note(self) -> None:
         main_pane = self.query_one(MainPane)
@@ -125,18 +579,37 @@ class BibApp(App[None]):
             )
             return
 
-        filename = main_pane.save_path.name
-        notename = "." + filename.replace(".bib", ".txt")
-        notepath = main_pane.save_path.parent / notename
+        notepath = main_pane.save_path.parent / note_name(
+            main_pane.save_path.name
+        )
 
         with self.suspend():
             system(f"{editor} {notepath}")
             # system(f"vim {notepath}")
 
-        main_pane.update_text(main_pane.save_path)
+        # the editor may have created the note
+        main_pane.companions.forget(notepath.parent)
+        main_pane.update_text(main_pane.save_path, refresh=True)
 
-    def on_directory_tree_file_selected(
-        self, event: DirectoryTree.FileSelected
+    def on_filename_tree_file_selected(
+        self, event: FilenameTree.FileSelected
     ) -> None:
         """Called when the user click a file in the directory tree."""
         self.sub_title = event.path.relative_to(self.location).as_posix()
+
+    def on_entry_table_entry_selected(
+        self, event: EntryTable.EntrySelected
+    ) -> None:
+        """Called when the user selects an entry in the table."""
+        self.query_one(TabbedContent).active = "files"
+        # the tab of the focused widget is shown
+        self.query_one(FilenameTree).focus()
+        self.query_one(MainPane).update_text(event.path)
+        self.sub_title = event.path.relative_to(self.location).as_posix()
+
+    def on_main_pane_library_changed(
+        self, message: MainPane.LibraryChanged
+    ) -> None:
+        table = self.query_one(EntryTable)
+        if table.loaded:
+            table.reload()
@@ -4,12 +4,21 @@ Module containing utility functions for the bibmancli app.
 
 from shutil import which
 from pathlib import Path
-import json
 from bibtexparser.model import Entry as BibEntry
+from bibtexparser.library import Library
 from enum import StrEnum
 from collections.abc import Iterable, Iterator
-from pylatexenc.latex2text import LatexNodes2Text
-from bibmancli.bibtex import file_to_bib
+from bibmancli.latex import latex_to_text, converter as latex_converter
+from bibmancli.bibtex import (
+    file_to_bib,
+    files_to_bib,
+    try_file_to_bib,
+    string_to_bib,
+    bib_to_string,
+    raw_entry_key,
+)
+from typing import NamedTuple
+from bibmancli.template import compile_format
 import sys
 
 
@@ -71,6 +80,27 @@ class Entry:
 
         self.contents = contents
 
+    @classmethod
+    def from_path(cls, path: Path, index=None) -> "Entry":
+        """
+        Create an Entry object from a .bib file. If a library index is given
+        and the file has not changed since it was indexed, the entry is read
+        from the index instead of parsing the file.
+
+        :param path: Path to the file
+        :type path: Path
+        :param index: Library index to read the entry from
+        :type index: bibmancli.index.LibraryIndex | None
+        :return: Entry object
+        :rtype: Entry
+        """
+        if index is not None:
+            contents = index.get(path)
+            if contents is not None:
+                return cls(path, contents)
+
+        return cls(path, file_to_bib(path).entries[0])
+
     def check_field_exists(self, field: str) -> bool:
         """
         Check if a field exists in the entry
@@ -152,396 +182,243 @@ class Entry:
 
         For example, the format string "{title} by {author}" will be formatted as "Title by Author"
 
-        Available fields are: path, title, author, year, month, entry_name, entry_type
+        Available fields are: path, entry_name, entry_type and any field of the entry (title, author, year, month, doi, ...).
+        A default for missing fields can be given after a '|', for example "{doi|no DOI}".
+        See bibmancli.template for details.
 
         :param format: Format string
         :type format: str
         :return: Formatted string
         :rtype: str
         """
-        contents = self.contents.fields_dict
+        return compile_format(format).render(self)
 
-        formatted_string = format.replace("{path}", str(self.path))  # path
-        if self.check_field_exists("title"):  # title
-            formatted_string = formatted_string.replace(
-                "{title}",
-                LatexNodes2Text().latex_to_text(contents["title"].value),
-            )
-        else:
-            formatted_string = formatted_string.replace(
-                "{title}", "ENTRY HAS NO TITLE"
-            )
-        if self.check_field_exists("author"):  # author
-            formatted_string = formatted_string.replace(
-                "{author}",
-                LatexNodes2Text().latex_to_text(contents["author"].value),
-            )
-        else:
-            formatted_string = formatted_string.replace(
-                "{author}", "ENTRY HAS NO AUTHOR"
-            )
-        if self.check_field_exists("year"):  # year
-            formatted_string = formatted_string.replace(
-                "{year}",
-                LatexNodes2Text().latex_to_text(contents["year"].value),
-            )
-        else:
-            formatted_string = formatted_string.replace(
-                "{year}", "ENTRY HAS NO YEAR"
-            )
-        if self.check_field_exists("month"):
-            formatted_string = formatted_string.replace(
-                "{month}",
-                LatexNodes2Text().latex_to_text(contents["month"].value),
-            )
-        else:
-            formatted_string = formatted_string.replace(
-                "{month}", "ENTRY HAS NO MONTH"
-            )
 
-        formatted_string = formatted_string.replace(
-            "{entry_type}", self.contents.entry_type
-        )
+def get_jobs(ctx) -> int:
+    """
+    Get the value of the global --jobs option from a typer context
+
+    :param ctx: Context of the running command
+    :type ctx: typer.Context
+    :return: Number of worker processes, 1 if the option is not available
+    :rtype: int
+    """
+    obj = ctx.find_root().obj
+    if isinstance(obj, dict):
+        return obj.get("jobs", 1)
+
+    return 1
+
+
+def skipped_warning(path: Path) -> str:
+    """
+    Warning printed for a file of the library that can not be parsed
+
+    :param path: Path to the file
+    :type path: Path
+    :return: Rich markup of the warning
+    :rtype: str
+    """
+    return f"[bold yellow]WARNING[/] Could not parse '{path}', skipped"
+
+
+def report_skipped(path: Path) -> None:
+    """
+    Print on stderr that a file of the library can not be parsed and is
+    skipped
+
+    :param path: Path to the file
+    :type path: Path
+    """
+    from rich.console import Console
 
-        return formatted_string
+    Console(stderr=True).print(skipped_warning(path))
 
 
-def iterate_files(path: Path, filetype: str = ".bib") -> Iterable[Entry]:
+def iterate_files(
+    path: Path, filetype: str = ".bib", use_index: bool = True, jobs: int = 1
+) -> Iterable[Entry]:
     """
     Iterate over all files in a directory and its subdirectories,
     yielding the entries in each file as Entry objects
 
+    If the library has an index (see bibmancli.index), it is refreshed and the
+    entries are read from it, so only new or modified files are parsed.
+    Either way, the files that can not be parsed are skipped and reported on
+    stderr.
+
     :param path: Path to the directory
     :type path: Path
     :param filetype: Filetype to search for
     :type filetype: str
+    :param use_index: Read the entries from the library index if it exists
+    :type use_index: bool
+    :param jobs: Number of worker processes used to parse the files, 0 means one per CPU core
+    :type jobs: int
     :return: Generator yielding Entry objects
     :rtype: Iterable[Entry]
     """
+    if use_index and filetype == ".bib":
+        from bibmancli.index import LibraryIndex
+
+        index = LibraryIndex.open(path)
+        if index is not None:
+            with index, latex_converter.use_store(index):
+                index.refresh(jobs)
+                for relative in index.skipped:
+                    report_skipped(path.joinpath(*relative.split("/")))
+                for file, contents in index.entries():
+                    yield Entry(file, contents)
+            return
+
+    def walk_files() -> Iterator[Path]:
+        for root, _, files in get_walker(path):
+            for name in files:
+                if name.endswith(filetype):  # only count bib files
+                    if type(root) is Path:
+                        yield root / name
+                    else:
+                        yield Path(root) / name
+
+    def parse_files() -> Iterator[tuple[Path, Library | None]]:
+        if jobs == 1:
+            for file in walk_files():
+                yield file, try_file_to_bib(file)
+        else:
+            files = list(walk_files())
+            yield from zip(files, files_to_bib(files, jobs, skip_errors=True))
 
-    for root, _, files in get_walker(path):
-        for name in files:
-            if name.endswith(filetype):  # only count bib files
-                if type(root) is Path:
-                    file = root / name
-                else:
-                    file = Path(root) / name
+    for file, bib in parse_files():
+        if bib is None:
+            report_skipped(file)
+        else:
+            yield Entry(file, bib.entries[0])
 
-                # read the file contents
-                bib = file_to_bib(file)
 
-                yield Entry(file, bib.entries[0])
+class ExportedEntry(NamedTuple):
+    """
+    Entry written by export_entries
+    """
+
+    path: Path
+    """Path to the .bib file"""
+    original_key: str
+    """Key of the entry in the library"""
+    key: str
+    """Key of the entry in the export, differs from original_key if renamed"""
+    text: bytes | None
+    """BibTeX text of the entry, None if the entry is skipped"""
 
 
-def entries_as_json_string(
-    entries: Iterable[Entry], library_location: Path
-) -> str:
+def export_entries(path: Path, rename: bool = True) -> Iterator[ExportedEntry]:
     """
-    Convert entries to a JSON string. The library location is used to generate relative paths.
+    Stream the entries of the library for exporting them to a single file.
 
-    :param entries: Entries to convert
-    :type entries: Iterable[Entry]
-    :param library_location: Location of the library
-    :type library_location: Path
-    :return: JSON string
-    :rtype: str
+    Entry keys are deduplicated: when a key was already exported the entry is
+    renamed (key_1, key_2, ...) or skipped. Entries that keep their key are
+    exported with the exact bytes of their .bib file, only renamed entries are
+    parsed and written again. Entries are exported in the order of their
+    paths, so that the same library is always exported the same way.
+
+    :param path: Path to the library
+    :type path: Path
+    :param rename: Rename entries with a repeated key, otherwise skip them
+    :type rename: bool
+    :return: Generator yielding the exported entries
+    :rtype: Iterator[ExportedEntry]
     """
-    json_entries = []
-    for entry in entries:
-        entry_dict = {field.key: field.value for field in entry.contents.fields}
-        for key in entry_dict:
-            entry_dict[key] = LatexNodes2Text().latex_to_text(entry_dict[key])
-
-        note_path = entry.path.parent / ("." + entry.path.stem + ".txt")
-        if note_path.exists():
-            entry_dict["note"] = note_path.read_text().strip()
-        else:
-            entry_dict["note"] = "No note available"
 
-        entry_dict = {
-            "path": entry.path.relative_to(library_location).as_posix(),
-            "contents": entry_dict,
-        }
-        json_entries.append(entry_dict)
+    def files() -> Iterator[tuple[Path, bytes]]:
+        paths = [
+            Path(root) / name
+            for root, _, names in get_walker(path)
+            for name in names
+            if name.endswith(".bib")
+        ]
+        paths.sort(key=lambda file: file.relative_to(path).as_posix())
+        for file in paths:
+            yield file, file.read_bytes()
 
-    return json.dumps(json_entries, indent=4, ensure_ascii=False)
+    return export_contents(files(), rename)
 
 
-def folder_list_html(entries: Iterable[Entry], library_location: Path) -> str:
+def export_contents(
+    files: Iterable[tuple[Path, bytes]], rename: bool = True
+) -> Iterator[ExportedEntry]:
+    """
+    Deduplicate the keys of entries for exporting them, see export_entries
+
+    :param files: Path and contents of each .bib file
+    :type files: Iterable[tuple[Path, bytes]]
+    :param rename: Rename entries with a repeated key, otherwise skip them
+    :type rename: bool
+    :return: Generator yielding the exported entries
+    :rtype: Iterator[ExportedEntry]
     """
-    Create an HTML list of folders containing the entries
+    exported_keys = set()
+    for file, contents in files:
+        original_key = raw_entry_key(contents)
+        if original_key is None:
+            # not a plain entry, parse it to find the key
+            entries = string_to_bib(contents.decode("utf-8", "replace")).entries
+            if len(entries) != 1:
+                report_skipped(file)
+                continue
+            original_key = entries[0].key
+
+        key = original_key
+        if key in exported_keys:
+            if not rename:
+                yield ExportedEntry(file, original_key, key, None)
+                continue
+
+            idx = 1
+            while key in exported_keys:
+                key = original_key + "_" + str(idx)
+                idx += 1
+
+            entry = string_to_bib(contents.decode()).entries[0]
+            entry.key = key
+            contents = bib_to_string(entry).encode()
+        elif not contents.endswith(b"\n"):
+            contents += b"\n"
+
+        exported_keys.add(key)
+        yield ExportedEntry(file, original_key, key, contents)
+
+
+def entry_to_dict(
+    entry: Entry, library_location: Path, companions=None
+) -> dict:
+    """
+    Convert an entry to a dictionary with its relative path and its fields as
+    plain text, including the note of the entry.
 
-    :param entries: Entries to list
-    :type entries: Iterable[Entry]
+    :param entry: Entry to convert
+    :type entry: Entry
     :param library_location: Location of the library
     :type library_location: Path
-    :return: HTML string
-    :rtype: str
+    :param companions: Resolver used to find the note, shared between entries to list each folder once
+    :type companions: bibmancli.companions.CompanionResolver | None
+    :return: Dictionary with "path" and "contents" keys
+    :rtype: dict
     """
-    folders = {}
-    total_count = 0
-    for entry in entries:
-        folder = entry.path.parent
-        total_count += 1
-        if folder not in folders:
-            folders[folder] = 1
-        else:
-            folders[folder] += 1
-
-    html = ""
-    html += f'<option selected value="all">All entries ({total_count} entries)</option>'
-    for folder, count in folders.items():
-        html += f'<option value="{folder.relative_to(library_location).as_posix()}">{folder.relative_to(library_location).as_posix()} ({count} entries)</option>'
-
-    return html
+    if companions is None:
+        from bibmancli.companions import CompanionResolver
 
+        companions = CompanionResolver()
 
-def create_html(location: Path) -> str:
-    """
-    Create an HTML page to display the library entries
-
-    :param location: Location of the library
-    :type location: Path
-    :return: HTML string
-    :rtype: str
-    """
-    json_string = entries_as_json_string(iterate_files(location), location)
-    folder_list = folder_list_html(iterate_files(location), location)
+    entry_dict = {
+        field.key: latex_to_text(field.value) for field in entry.contents.fields
+    }
 
-    html = (
-        """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>BIBMAN</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH" crossorigin="anonymous">
-    </head>
-    <body>
-        <div class="container-md align-items-center justify-content-center px-1 px-lg-5" id="main-container">
-            <div class="input-group my-3">
-                <input type="text" class="form-control" placeholder="Search" aria-label="Search" aria-describedby="button-clear" id="input-search">
-                <!-- 
-                <button class="btn btn-outline-primary" type="button" id="button-search" onclick="SearchClick()">Search</button>
-                -->
-                <button class="btn btn-outline-secondary" type="button" id="button-settings" data-bs-toggle="modal" data-bs-target="#settingsModal">Config</button>
-                <button class="btn btn-outline-secondary" type="button" id="button-clear" onclick="ClearClick()">Clear</button>
-            </div>
-            <select class="form-select my-3" id="selector" aria-label="Folder selection">
-                """
-        + folder_list
-        + """
-            </select>
-            <div class="modal fade" id="entryModal" tabindex="-1" data-bs-backdrop="static" data-bs-keyboard="false" aria-hidden="true">
-                <div class="modal-dialog modal-lg modal-dialog-centered">
-                    <div class="modal-content">
-                    <div class="modal-header">
-                        <h1 class="modal-title fs-5" id="exampleModalLabel">Entry contents</h1>
-                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
-                    </div>
-                    <div class="modal-body" id="modal-body"></div>
-                    </div>
-                </div>
-            </div>
-            <div class="modal fade" id="settingsModal" tabindex="-1" data-bs-backdrop="static" data-bs-keyboard="false" aria-hidden="true">
-                <div class="modal-dialog modal-lg modal-dialog-centered">
-                    <div class="modal-content">
-                    <div class="modal-header">
-                        <h1 class="modal-title fs-5" id="exampleModalLabel">Settings</h1>
-                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
-                    </div>
-                    <div class="modal-body">
-                        <div class="input-group mb-3">
-                            <span class="input-group-text" id="basic-addon1">Sci-Hub Link</span>
-                            <input type="text" class="form-control" value="https://sci-hub.se/" aria-label="sci-hub" id="sci-hub-link">
-                        </div>
-                    </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js" integrity="sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz" crossorigin="anonymous"></script>
-        <script src="https://cdn.jsdelivr.net/npm/fuzzysort@3.0.2/fuzzysort.min.js"></script>
-        <script>
-            // Load entries from JSON string
-            let entries = JSON.parse(`"""
-        + json_string.replace("\\", "\\\\")
-        + """`);
-
-            function clickedEntry(i) {
-                var modal = new bootstrap.Modal(document.getElementById('entryModal'));
-
-                // show modal with entry contents
-                let entry = entries[i];
-                let modalBody = document.getElementById("modal-body");
-                modalBody.innerText = "";
-                for (let key in entry.contents) {
-                    if (key === "note") {
-                        continue;
-                    }
-                    // write the key in an h6 tag and the value in a p tag, show them side by side not in separate lines
-                    let keyElement = document.createElement("p");
-                    keyElement.className = "my-2 fw-bold";
-                    keyElement.innerText = key + ": ";
-                    let valueElement = document.createElement("p");
-                    valueElement.className = "m-2";
-                    valueElement.innerText = entry.contents[key];
-                    let div = document.createElement("div");
-                    div.className = "d-flex justify-content-start";
-                    div.appendChild(keyElement);
-                    div.appendChild(valueElement);
-                    modalBody.appendChild(div);
-                }
-                // add button to sci-hub the entry if it has a DOI
-                if (entry.contents.doi) {
-                    let div = document.createElement("div");
-                    div.className = "d-grid col-6 mx-auto";
-                    let button = document.createElement("button");
-                    button.className = "btn btn-secondary";
-                    button.innerText = "Open in Sci-Hub";
-
-                    // get sci-hub link from settings
-                    let sciHubLink = document.getElementById("sci-hub-link").value;
-                    button.onclick = function() {
-                        window.open(sciHubLink + entry.contents.doi, "_blank");
-                    };
-                    div.appendChild(button);
-                    modalBody.appendChild(div);
-                }
-                
-                modal.show();
-            };
-
-            // function to create HTML elements for each entry
-            function createEntryHTML(entry, i) {
-                let card = document.createElement("div");
-                card.className = "card my-4 bib-entry ACTIVE";
-                card.id = entry.html_id;
-                let cardHeader = document.createElement("div");
-                cardHeader.className = "card-header text-body-secondary fs-6";
-                cardHeader.innerText = "Location: " + entry.path;
-                let cardBody = document.createElement("div");
-                cardBody.className = "card-body";
-                let title = document.createElement("h5");
-                title.className = "card-title";
-                title.innerText = entry.contents.title;
-                let author = document.createElement("h6");
-                author.className = "card-subtitle mb-2 text-body-secondary";
-                author.innerText = entry.contents.author;
-                let listGroup = document.createElement("ul");
-                listGroup.className = "list-group list-group-flush";
-                let listItem = document.createElement("li");
-                listItem.className = "list-group-item";
-                listItem.innerText = entry.contents.note;
-                let link = document.createElement("a");
-                link.className = "stretched-link";
-                link.setAttribute("href", "#");
-                link.setAttribute("onclick", "clickedEntry(" + i + ")");
-
-                cardBody.appendChild(title);
-                cardBody.appendChild(author);
-                card.appendChild(cardHeader);
-                card.appendChild(cardBody);
-                listGroup.appendChild(listItem);
-                card.appendChild(listGroup);
-                card.appendChild(link);
-
-                return card;
-            }
-
-            // Create HTML elements for each entry
-            let mainContainer = document.getElementById("main-container");
-            for (let i = 0; i < entries.length; i++) {
-                let entry = entries[i];
-                entry["html_id"] = "PATH-" + entry.path;
-                // console.log(entry);
-                let entryHTML = createEntryHTML(entry, i);
-                mainContainer.appendChild(entryHTML);
-            }
-
-            // Enable fuzzy search as you type in the search bar
-            let bibEntries = document.getElementsByClassName("bib-entry");
-            let searchInput = document.getElementById("input-search");
-            function fuzzy() {
-                // If the search bar is empty, show all entries
-                let search_string = searchInput.value;
-
-                // Use only entries that are currently displayed ACTIVE
-                let shownEntries = [];
-                for (let i = 0; i < bibEntries.length; i++) {
-                    entry = bibEntries[i];
-                    if (entry.classList.contains("ACTIVE")) {
-                        shownEntries.push(entries[i]);
-                    }
-                }
-
-                // Fuzzy search on multiple keys
-                let results = fuzzysort.go(search_string, shownEntries, {keys: ["contents.title", "contents.author", "contents.note"], limit: 15, all: true});
-                for (let i = 0; i < bibEntries.length; i++) {
-                    bibEntries[i].style.display = "none";
-                }
-                for (let i = 0; i < results.length; i++) {
-                    let result = results[i];
-                    let entry = document.getElementById(result.obj.html_id);
-
-                    entry.style.display = "block";
-                }
-            };
-
-            // Show entries from a specific folder when selected
-            let folderSelect = document.getElementById("selector");
-            folderSelect.addEventListener("change", function() {
-                // clear search bar
-                document.getElementById("input-search").value = "";
-                let selectedFolder = folderSelect.value;
-                for (let i = 0; i < bibEntries.length; i++) {
-                    let entry = bibEntries[i];
-                    if (selectedFolder === "all") {
-                        entry.style.display = "block";
-                        entry.classList.add("ACTIVE");
-                    } else if (selectedFolder === ".") {
-                        // show entries in the root folder, so entries with no "/" in their card-header
-                        if (entry.getElementsByClassName("card-header")[0].innerText.indexOf("/") === -1) {
-                            entry.style.display = "block";
-                            entry.classList.add("ACTIVE");
-                        } else {
-                            entry.style.display = "none";
-                            entry.classList.remove("ACTIVE");
-                        }
-                    } else {
-                        if (entry.getElementsByClassName("card-header")[0].innerText.startsWith("Location: " + selectedFolder)) {
-                            entry.style.display = "block";
-                            entry.classList.add("ACTIVE");
-                        } else {
-                            entry.style.display = "none";
-                            entry.classList.remove("ACTIVE");
-                        }
-                    }
-                }
-            });
-
-            searchInput.addEventListener("input", function () {
-                fuzzy();
-            });
-
-            function ClearClick() {
-                document.getElementById("input-search").value = "";
-                // show entries with ACTIVE class
-                for (let i = 0; i < bibEntries.length; i++) {
-                    let entry = bibEntries[i];
-                    if (entry.classList.contains("ACTIVE")) {
-                        entry.style.display = "block";
-                    } else {
-                        entry.style.display = "none";
-                    }
-                }
-            };
-        </script>
-    </body>
-    </html>
-    """
-    )
+    note_path = companions.resolve(entry.path).note
+    if note_path is not None:
+        entry_dict["note"] = note_path.read_text().strip()
+    else:
+        entry_dict["note"] = "No note available"
 
-    return html
+    return {
+        "path": entry.path.relative_to(library_location).as_posix(),
+        "contents": entry_dict,
+    }
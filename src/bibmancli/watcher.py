@@ -0,0 +1,572 @@
+"""
+Module to watch the files of a library.
+
+Long running commands (bibman daemon, the TUI, html --watch) keep the
+library, or a view of it, in memory. Instead of scanning the whole library to
+find what changed, they subscribe to a LibraryWatcher, which reports the
+.bib, note and PDF files that were created, modified, moved or deleted.
+
+On Linux the watcher is notified by the kernel with inotify (through ctypes,
+without any dependency). On other systems, or when inotify can not be used
+(e.g. the limit of watches of the user is reached), the library is scanned
+every few seconds and compared with the previous scan.
+"""
+
+import os
+import stat
+import sys
+import time
+import threading
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Callable, Iterable
+from bibmancli.index import SKIP_FOLDERS
+
+
+CREATED = "created"
+MODIFIED = "modified"
+MOVED = "moved"
+DELETED = "deleted"
+
+POLL_INTERVAL = 2.0
+# seconds without new events before the changes are reported, so that a file
+# being written is reported once
+DEBOUNCE = 0.1
+# maximum number of seconds the changes are delayed while events keep coming
+MAX_DELAY = 1.0
+
+# inotify constants, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+
+
+class ChangeEvent(NamedTuple):
+    """
+    Change of a file of the library. Paths are relative to the library, in
+    POSIX format.
+    """
+
+    kind: str  # CREATED, MODIFIED, MOVED or DELETED
+    path: str
+    old_path: str | None = None  # previous path of a MOVED file
+
+
+Subscriber = Callable[[list[ChangeEvent]], None]
+
+
+def is_watched(name: str) -> bool:
+    """
+    Check if a file is an entry, a note or a PDF
+
+    :param name: Name of the file
+    :type name: str
+    :return: True if the changes of the file are reported
+    :rtype: bool
+    """
+    return (
+        name.endswith(".bib")
+        or name.endswith(".pdf")
+        or (name.startswith(".") and name.endswith(".txt"))
+    )
+
+
+def _signature(result: os.stat_result) -> tuple[int, int, int]:
+    return (result.st_ino, result.st_mtime_ns, result.st_size)
+
+
+class Inotify:
+    """
+    Minimal inotify binding, through ctypes
+
+    :raises OSError: If inotify is not available
+    """
+
+    def __init__(self):
+        """
+        Create an inotify instance
+
+        :raises OSError: If inotify is not available
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        try:
+            self._init = libc.inotify_init1
+            self._add = libc.inotify_add_watch
+            self._remove = libc.inotify_rm_watch
+        except AttributeError:
+            raise OSError("inotify is not available")
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._remove.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._get_errno = ctypes.get_errno
+
+        self.fd = self._init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = self._get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add(self, path: Path) -> int:
+        """
+        Watch a folder
+
+        :param path: Path to the folder
+        :type path: Path
+        :return: Watch descriptor
+        :rtype: int
+        :raises OSError: If the folder can not be watched (e.g. ENOSPC when the limit of watches is reached)
+        """
+        wd = self._add(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = self._get_errno()
+            raise OSError(errno, os.strerror(errno), os.fspath(path))
+
+        return wd
+
+    def remove(self, wd: int) -> None:
+        """
+        Stop watching a folder
+
+        :param wd: Watch descriptor
+        :type wd: int
+        """
+        self._remove(self.fd, wd)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for events
+
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float
+        :return: True if events can be read
+        :rtype: bool
+        """
+        import select
+
+        try:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+        except (OSError, ValueError):
+            # closed while waiting
+            return False
+
+        return bool(readable)
+
+    def read(self) -> list[tuple[int, int, int, str]]:
+        """
+        Read the pending events, without waiting
+
+        :return: List of (watch descriptor, mask, cookie, name)
+        :rtype: list[tuple[int, int, int, str]]
+        """
+        import struct
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError:
+                # no more events (EAGAIN) or closed
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = struct.unpack_from(
+                    "iIII", data, offset
+                )
+                offset += 16
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, cookie, os.fsdecode(name)))
+
+        return events
+
+    def close(self) -> None:
+        """
+        Close the inotify instance
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class LibraryWatcher:
+    """
+    Watch the .bib, note and PDF files of a library and report their changes
+    to the subscribers. Subscribers are called from the thread of the
+    watcher, with the list of changes of a batch of events.
+
+    :param location: Path to the library
+    :type location: Path
+    :param interval: Seconds between two scans of the library when inotify is not used
+    :type interval: float
+    :param inotify: Use inotify if it is available
+    :type inotify: bool
+    """
+
+    location: Path
+    interval: float
+
+    def __init__(
+        self,
+        location: Path,
+        interval: float = POLL_INTERVAL,
+        inotify: bool = True,
+    ):
+        """
+        Create the watcher, see start
+
+        :param location: Path to the library
+        :type location: Path
+        :param interval: Seconds between two scans of the library when inotify is not used
+        :type interval: float
+        :param inotify: Use inotify if it is available
+        :type inotify: bool
+        """
+        self.location = location
+        self.interval = interval
+        self._use_inotify = inotify
+        self._inotify: Inotify | None = None
+        self._watches: dict[int, str] = {}  # watch descriptor -> folder prefix
+        self._prefixes: dict[str, int] = {}
+        self._pending: list[tuple[int, int, int, str]] = []
+        self._files: dict[str, tuple[int, int, int]] = {}
+        self._folders: dict[str, int] = {}
+        self._subscribers: list[Subscriber] = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def backend(self) -> str:
+        """
+        "inotify" or "polling"
+        """
+        return "polling" if self._inotify is None else "inotify"
+
+    def subscribe(self, callback: Subscriber) -> Callable[[], None]:
+        """
+        Call a function with the changes of the library
+
+        :param callback: Function called with the list of changes
+        :type callback: Callable[[list[ChangeEvent]], None]
+        :return: Function removing the subscription
+        :rtype: Callable[[], None]
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def start(self) -> "LibraryWatcher":
+        """
+        Scan the library and start watching it. Only the changes made after
+        the scan are reported.
+
+        :return: The watcher
+        :rtype: LibraryWatcher
+        """
+        with self._lock:
+            if self._use_inotify:
+                try:
+                    self._inotify = Inotify()
+                except OSError:
+                    self._inotify = None
+
+            self._files, self._folders = self._scan("")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop watching the library
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            self._close_inotify()
+
+    def __enter__(self) -> "LibraryWatcher":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def sync(self) -> None:
+        """
+        Report the changes that already happened before returning, instead of
+        waiting for the thread of the watcher. Without inotify the library
+        is scanned again if the modification time of a folder changed (new,
+        removed and renamed files), otherwise the known files are stat'ed to
+        find the ones modified in place.
+        """
+        with self._lock:
+            if self._inotify is not None:
+                self._pending.extend(self._inotify.read())
+                events = self._process()
+            elif self._folders_changed():
+                events = self._rescan()
+            else:
+                # editing a file does not change the folder
+                events = self._diff(list(self._files))
+
+            self._dispatch(events)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            inotify = self._inotify
+            if inotify is None:
+                if self._stop.wait(self.interval):
+                    break
+                with self._lock:
+                    self._dispatch(self._rescan())
+                continue
+
+            if not inotify.wait(0.5):
+                continue
+
+            # wait until the events stop, e.g. while a file is written
+            deadline = time.monotonic() + MAX_DELAY
+            while True:
+                with self._lock:
+                    if self._inotify is not inotify:
+                        break
+                    self._pending.extend(inotify.read())
+                if time.monotonic() >= deadline or not inotify.wait(DEBOUNCE):
+                    break
+
+            with self._lock:
+                self._dispatch(self._process())
+
+    def _dispatch(self, events: list[ChangeEvent]) -> None:
+        if not events:
+            return
+
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception:
+                # a broken subscriber must not stop the others
+                pass
+
+    def _close_inotify(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+        self._prefixes.clear()
+        self._pending.clear()
+
+    def _watch(self, prefix: str, folder: Path) -> None:
+        if self._inotify is None:
+            return
+
+        try:
+            wd = self._inotify.add(folder)
+        except FileNotFoundError:
+            return
+        except OSError:
+            # e.g. too many watches, scan the library instead
+            self._close_inotify()
+            return
+
+        self._watches[wd] = prefix
+        self._prefixes[prefix] = wd
+
+    def _unwatch(self, prefix: str) -> None:
+        for watched in [p for p in self._prefixes if p.startswith(prefix)]:
+            wd = self._prefixes.pop(watched)
+            self._watches.pop(wd, None)
+            if self._inotify is not None:
+                self._inotify.remove(wd)
+
+    def _scan(self, prefix: str) -> tuple[dict, dict[str, int]]:
+        """
+        Find the watched files of a folder and its subfolders, watching the
+        folders with inotify before listing them.
+        """
+        files = {}
+        folders = {}
+        pending = [prefix]
+        while pending:
+            current = pending.pop()
+            folder = self.location.joinpath(*current.split("/"))
+            self._watch(current, folder)
+            try:
+                folders[current] = os.stat(folder).st_mtime_ns
+                with os.scandir(folder) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            if item.name not in SKIP_FOLDERS:
+                                pending.append(current + item.name + "/")
+                        elif is_watched(item.name):
+                            try:
+                                files[current + item.name] = _signature(
+                                    item.stat()
+                                )
+                            except OSError:
+                                pass
+            except (FileNotFoundError, NotADirectoryError):
+                # folder removed while scanning
+                continue
+
+        return files, folders
+
+    def _rescan(self) -> list[ChangeEvent]:
+        files, self._folders = self._scan("")
+        return self._diff(files.keys() | self._files.keys(), files)
+
+    def _folders_changed(self) -> bool:
+        for prefix, mtime in self._folders.items():
+            folder = self.location.joinpath(*prefix.split("/"))
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+
+        return False
+
+    def _process(self) -> list[ChangeEvent]:
+        """
+        Turn the pending inotify events into changes
+        """
+        pending = self._pending
+        self._pending = []
+
+        dirty = set()
+        rescan = False
+        for wd, mask, _, name in pending:
+            if mask & IN_Q_OVERFLOW:
+                # events were lost
+                rescan = True
+                continue
+
+            prefix = self._watches.get(wd)
+            if prefix is None:
+                continue
+            if mask & IN_IGNORED:
+                # the folder was removed
+                del self._watches[wd]
+                if self._prefixes.get(prefix) == wd:
+                    del self._prefixes[prefix]
+                continue
+
+            if mask & IN_ISDIR:
+                if name in SKIP_FOLDERS:
+                    continue
+                folder = prefix + name + "/"
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._unwatch(folder)
+                    dirty.update(f for f in self._files if f.startswith(folder))
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    files, _ = self._scan(folder)
+                    dirty.update(files)
+            elif is_watched(name):
+                dirty.add(prefix + name)
+
+        if rescan or self._inotify is None:
+            return self._rescan()
+
+        return self._diff(dirty)
+
+    def _diff(
+        self, relatives: Iterable[str], stats: dict | None = None
+    ) -> list[ChangeEvent]:
+        """
+        Compare files with their last known state. A file deleted and a file
+        created with the same inode are reported as moved.
+
+        :param relatives: Relative paths of the files that may have changed
+        :type relatives: Iterable[str]
+        :param stats: Signatures of the existing files, the files are stat'ed if not given
+        :type stats: dict | None
+        :return: Changes of the files
+        :rtype: list[ChangeEvent]
+        """
+        events = []
+        created = []
+        deleted: dict[int, list[str]] = {}
+        for relative in relatives:
+            old = self._files.get(relative)
+            if stats is not None:
+                new = stats.get(relative)
+            else:
+                try:
+                    result = os.stat(
+                        self.location.joinpath(*relative.split("/"))
+                    )
+                    new = (
+                        _signature(result)
+                        if stat.S_ISREG(result.st_mode)
+                        else None
+                    )
+                except OSError:
+                    new = None
+
+            if new == old:
+                continue
+            if new is None:
+                del self._files[relative]
+                deleted.setdefault(old[0], []).append(relative)
+                continue
+
+            self._files[relative] = new
+            if old is None:
+                created.append((relative, new))
+            else:
+                events.append(ChangeEvent(MODIFIED, relative))
+
+        for relative, new in created:
+            sources = deleted.get(new[0])
+            if sources:
+                events.append(ChangeEvent(MOVED, relative, sources.pop()))
+            else:
+                events.append(ChangeEvent(CREATED, relative))
+        for sources in deleted.values():
+            events.extend(
+                ChangeEvent(DELETED, relative) for relative in sources
+            )
+
+        events.sort(key=lambda event: event.path)
+        return events
@@ -0,0 +1,748 @@
+"""
+Module to create the HTML site of the library.
+
+The entries are written to disk as they are read, in compact shards of at
+most SHARD_SIZE entries of the same folder. Shards are JavaScript files
+(JSONP) so that the page can load them lazily also when it is opened from the
+file system:
+
+    data/<folder id>-<n>.js     bibmanShard("<file>", [entry, ...]);
+
+Each shard has a search file with a trigram postings table of its entries
+(see bibmancli.fuzzy), built with the same trigrams used by bibman:
+
+    data/<folder id>-<n>.search.js
+        bibmanShard("<file>", {"sizes": [...], "grams": {"gram": [i, ...]}});
+
+index.html only contains the list of shards and the folder selector. The
+page only renders the cards that are visible in the window, and loads the
+shards of those cards when they are needed. Searching only loads the search
+files of the selected folder.
+
+The site folder also contains a manifest with the hash of every .bib and note
+file used to create it. When the site is updated, only the folders whose
+files changed are parsed and their shards written again, and index.html is
+only written when its contents change.
+"""
+
+import os
+import json
+from html import escape
+from hashlib import sha1
+from pathlib import Path
+from typing import NamedTuple
+from collections.abc import Iterator
+from bibmancli.version import __version__
+from bibmancli.utils import Entry, entry_to_dict, report_skipped
+from bibmancli.fuzzy import trigrams
+from bibmancli.companions import CompanionResolver
+
+
+SHARD_SIZE = 500
+DATA_FOLDER = "data"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# fields of the entries used to build the search index
+SEARCH_FIELDS = ("title", "author", "note")
+
+
+class SiteResult(NamedTuple):
+    """
+    Summary of the created or updated site
+    """
+
+    entries: int  # entries in the site
+    shards: int  # shards in the site
+    folders: int  # library folders whose shards were written
+    page: bool  # index.html was written
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Write a file through a temporary file, so the site never serves a half
+    written file
+
+    :param path: Path to the file
+    :type path: Path
+    :param text: Contents of the file
+    :type text: str
+    """
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def folder_id(folder: str) -> str:
+    """
+    Short identifier of a library folder, used in the shard file names
+
+    :param folder: Folder relative to the library, "." for the root
+    :type folder: str
+    :return: Identifier
+    :rtype: str
+    """
+    return sha1(folder.encode()).hexdigest()[:12]
+
+
+class ShardWriter:
+    """
+    Group entries by folder and write them in shards of at most SHARD_SIZE
+    entries, each with its search file
+
+    :param folder: Folder of the site
+    :type folder: Path
+    :param shard_size: Maximum number of entries in a shard
+    :type shard_size: int
+    """
+
+    folder: Path
+    shard_size: int
+    shards: list[dict]
+
+    def __init__(self, folder: Path, shard_size: int = SHARD_SIZE):
+        """
+        Initialize the writer
+
+        :param folder: Folder of the site
+        :type folder: Path
+        :param shard_size: Maximum number of entries in a shard
+        :type shard_size: int
+        """
+        self.folder = folder
+        self.shard_size = shard_size
+        self.shards = []
+        self._buffers: dict[str, list[tuple[str, set[str]]]] = {}
+        self._written: dict[str, int] = {}
+
+        (folder / DATA_FOLDER).mkdir(parents=True, exist_ok=True)
+
+    def add(self, library_folder: str, record: dict) -> None:
+        """
+        Add an entry, writing the shard of its folder when it is full
+
+        :param library_folder: Folder of the entry relative to the library
+        :type library_folder: str
+        :param record: Entry as a dictionary, see bibmancli.utils.entry_to_dict
+        :type record: dict
+        """
+        contents = record["contents"]
+        text = " ".join(contents.get(field, "") for field in SEARCH_FIELDS)
+
+        buffer = self._buffers.setdefault(library_folder, [])
+        buffer.append(
+            (
+                json.dumps(record, ensure_ascii=False, separators=(",", ":")),
+                trigrams(text),
+            )
+        )
+        if len(buffer) >= self.shard_size:
+            self._flush(library_folder)
+
+    def _flush(self, library_folder: str) -> None:
+        records = self._buffers.pop(library_folder, None)
+        if not records:
+            return
+
+        number = self._written.get(library_folder, 0)
+        self._written[library_folder] = number + 1
+        name = f"{DATA_FOLDER}/{folder_id(library_folder)}-{number}"
+
+        write_atomic(
+            self.folder / (name + ".js"),
+            f"bibmanShard({json.dumps(name + '.js')},[\n"
+            + ",\n".join(record for record, _ in records)
+            + "\n]);\n",
+        )
+
+        postings: dict[str, list[int]] = {}
+        for i, (_, grams) in enumerate(records):
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        search = {
+            "sizes": [len(grams) for _, grams in records],
+            "grams": postings,
+        }
+        write_atomic(
+            self.folder / (name + ".search.js"),
+            f"bibmanShard({json.dumps(name + '.search.js')},"
+            + json.dumps(search, ensure_ascii=False, separators=(",", ":"))
+            + ");\n",
+        )
+
+        self.shards.append(
+            {
+                "file": name + ".js",
+                "search": name + ".search.js",
+                "folder": library_folder,
+                "count": len(records),
+            }
+        )
+
+    def close(self) -> list[dict]:
+        """
+        Write the remaining entries
+
+        :return: List of shards, sorted by folder
+        :rtype: list[dict]
+        """
+        for library_folder in list(self._buffers):
+            self._flush(library_folder)
+
+        # shards of the same folder keep the order in which they were written
+        self.shards.sort(key=lambda shard: shard["folder"])
+        return self.shards
+
+
+def folder_options(shards: list[dict]) -> str:
+    """
+    Create the HTML options of the folder selector
+
+    :param shards: List of shards
+    :type shards: list[dict]
+    :return: HTML string
+    :rtype: str
+    """
+    counts: dict[str, int] = {}
+    for shard in shards:
+        counts[shard["folder"]] = (
+            counts.get(shard["folder"], 0) + shard["count"]
+        )
+
+    total_count = sum(counts.values())
+    options = [
+        f'<option selected value="all">All entries ({total_count} entries)</option>'
+    ]
+    for folder, count in counts.items():
+        options.append(
+            f'<option value="{escape(folder)}">{escape(folder)} ({count} entries)</option>'
+        )
+
+    return "\n".join(options)
+
+
+def load_manifest(folder: Path) -> dict | None:
+    """
+    Read the manifest of a site folder
+
+    :param folder: Folder of the site
+    :type folder: Path
+    :return: Manifest, or None if the folder has no valid manifest
+    :rtype: dict | None
+    """
+    try:
+        with open(folder / MANIFEST_NAME, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or "folders" not in manifest:
+        return None
+
+    return manifest
+
+
+def _generator() -> str:
+    # sites created by another version or page template are created again
+    return sha1(f"{__version__}:{SHARD_SIZE}:{PAGE}".encode()).hexdigest()
+
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return sha1(f.read()).hexdigest()
+
+
+def _read_entries(
+    location: Path, paths: list[Path], jobs: int
+) -> Iterator[Entry]:
+    from bibmancli.index import LibraryIndex
+
+    index = LibraryIndex.open(location)
+    if index is not None:
+        from bibmancli.latex import converter as latex_converter
+
+        with index, latex_converter.use_store(index):
+            index.refresh(jobs)
+            for path in paths:
+                contents = index.get(path)
+                if contents is None:
+                    report_skipped(path)
+                else:
+                    yield Entry(path, contents)
+        return
+
+    from bibmancli.bibtex import files_to_bib
+
+    for path, bib in zip(paths, files_to_bib(paths, jobs, skip_errors=True)):
+        if bib is None:
+            report_skipped(path)
+        else:
+            yield Entry(path, bib.entries[0])
+
+
+def write_site(
+    location: Path, folder: Path, jobs: int = 1, full: bool = False
+) -> SiteResult:
+    """
+    Create the HTML site of the library, or update it if the folder already
+    contains a site. Only the library folders whose .bib or note files
+    changed since the last update are read again.
+
+    :param location: Location of the library
+    :type location: Path
+    :param folder: Folder where the site is written
+    :type folder: Path
+    :param jobs: Number of worker processes used to parse the library
+    :type jobs: int
+    :param full: Read every folder again, even if its files did not change
+    :type full: bool
+    :return: Summary of the site
+    :rtype: SiteResult
+    """
+    from bibmancli.index import scan_library
+
+    generator = _generator()
+    previous = load_manifest(folder) or {"folders": {}}
+    reuse = not full and previous.get("version") == MANIFEST_VERSION
+    reuse = reuse and previous.get("generator") == generator
+
+    # hashes of the files used in the previous update
+    known = {}
+    for record in previous["folders"].values():
+        known.update(record["inputs"])
+
+    folders: dict[str, dict] = {}
+    changed: list[Path] = []
+    for batch in scan_library(location):
+        if not any(relative.endswith(".bib") for relative, _ in batch):
+            continue
+
+        library_folder = batch[0][0].rpartition("/")[0] or "."
+        inputs = {}
+        for relative, stat in sorted(batch):
+            signature = [stat.st_mtime_ns, stat.st_size]
+            record = known.get(relative)
+            if record is not None and record[:2] == signature:
+                inputs[relative] = record
+            else:
+                file_hash = _file_hash(location / relative)
+                inputs[relative] = signature + [file_hash]
+
+        digest = sha1(
+            json.dumps(
+                [[name, record[2]] for name, record in inputs.items()]
+            ).encode()
+        ).hexdigest()
+
+        record = previous["folders"].get(library_folder)
+        if (
+            reuse
+            and record is not None
+            and record["digest"] == digest
+            and all(
+                (folder / shard["file"]).is_file()
+                and (folder / shard["search"]).is_file()
+                for shard in record["shards"]
+            )
+        ):
+            shards = record["shards"]
+        else:
+            shards = None
+            changed.extend(
+                location / relative
+                for relative in inputs
+                if relative.endswith(".bib")
+            )
+
+        folders[library_folder] = {
+            "digest": digest,
+            "inputs": inputs,
+            "shards": shards,
+        }
+
+    writer = ShardWriter(folder)
+    companions = CompanionResolver()
+    for entry in _read_entries(location, changed, jobs):
+        library_folder = entry.path.parent.relative_to(location).as_posix()
+        writer.add(library_folder, entry_to_dict(entry, location, companions))
+
+    rebuilt = 0
+    written = writer.close()
+    for library_folder, record in folders.items():
+        if record["shards"] is None:
+            record["shards"] = [
+                shard for shard in written if shard["folder"] == library_folder
+            ]
+            rebuilt += 1
+
+    # remove the shards of deleted folders and the extra shards of folders
+    # that now have fewer entries
+    current = {
+        shard[kind]
+        for record in folders.values()
+        for shard in record["shards"]
+        for kind in ("file", "search")
+    }
+    for record in previous["folders"].values():
+        for shard in record["shards"]:
+            for kind in ("file", "search"):
+                if kind in shard and shard[kind] not in current:
+                    (folder / shard[kind]).unlink(missing_ok=True)
+
+    shards = [
+        shard
+        for library_folder in sorted(folders)
+        for shard in folders[library_folder]["shards"]
+    ]
+    page = PAGE.replace("{{FOLDER_OPTIONS}}", folder_options(shards)).replace(
+        "{{SHARDS}}",
+        json.dumps(shards, ensure_ascii=False).replace("</", "<\\/"),
+    )
+    page_hash = sha1(page.encode()).hexdigest()
+    write_page = (
+        page_hash != previous.get("page")
+        or not (folder / "index.html").is_file()
+    )
+    if write_page:
+        write_atomic(folder / "index.html", page)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "generator": generator,
+        "page": page_hash,
+        "folders": folders,
+    }
+    if manifest != previous:
+        write_atomic(
+            folder / MANIFEST_NAME,
+            json.dumps(manifest, ensure_ascii=False, separators=(",", ":")),
+        )
+
+    return SiteResult(
+        sum(shard["count"] for shard in shards),
+        len(shards),
+        rebuilt,
+        write_page,
+    )
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>BIBMAN</title>
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH" crossorigin="anonymous">
+    <style>
+        #entries-container {
+            position: relative;
+        }
+        .bib-entry {
+            position: absolute;
+            left: 0;
+            right: 0;
+            height: 170px;
+            overflow: hidden;
+        }
+        .bib-entry .card-title, .bib-entry .card-subtitle, .bib-entry .list-group-item {
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
+        }
+    </style>
+</head>
+<body>
+    <div class="container-md align-items-center justify-content-center px-1 px-lg-5" id="main-container">
+        <div class="input-group my-3">
+            <input type="text" class="form-control" placeholder="Search" aria-label="Search" aria-describedby="button-clear" id="input-search">
+            <button class="btn btn-outline-secondary" type="button" id="button-settings" data-bs-toggle="modal" data-bs-target="#settingsModal">Config</button>
+            <button class="btn btn-outline-secondary" type="button" id="button-clear" onclick="ClearClick()">Clear</button>
+        </div>
+        <select class="form-select my-3" id="selector" aria-label="Folder selection">
+            {{FOLDER_OPTIONS}}
+        </select>
+        <div class="text-body-secondary small mb-3" id="loading-status"></div>
+        <div class="modal fade" id="entryModal" tabindex="-1" data-bs-backdrop="static" data-bs-keyboard="false" aria-hidden="true">
+            <div class="modal-dialog modal-lg modal-dialog-centered">
+                <div class="modal-content">
+                <div class="modal-header">
+                    <h1 class="modal-title fs-5" id="exampleModalLabel">Entry contents</h1>
+                    <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
+                </div>
+                <div class="modal-body" id="modal-body"></div>
+                </div>
+            </div>
+        </div>
+        <div class="modal fade" id="settingsModal" tabindex="-1" data-bs-backdrop="static" data-bs-keyboard="false" aria-hidden="true">
+            <div class="modal-dialog modal-lg modal-dialog-centered">
+                <div class="modal-content">
+                <div class="modal-header">
+                    <h1 class="modal-title fs-5" id="exampleModalLabel">Settings</h1>
+                    <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
+                </div>
+                <div class="modal-body">
+                    <div class="input-group mb-3">
+                        <span class="input-group-text" id="basic-addon1">Sci-Hub Link</span>
+                        <input type="text" class="form-control" value="https://sci-hub.se/" aria-label="sci-hub" id="sci-hub-link">
+                    </div>
+                </div>
+                </div>
+            </div>
+        </div>
+        <div id="entries-container"></div>
+    </div>
+
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js" integrity="sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz" crossorigin="anonymous"></script>
+    <script>
+        // Shards with the entries of each folder and their search files,
+        // loaded when needed
+        const SHARDS = {{SHARDS}};
+        const ROW_HEIGHT = 186;     // height of a card and its margin, in px
+        const OVERSCAN = 5;         // cards rendered above and below the window
+        const MIN_CONTAINMENT = 0.5;    // fraction of the query trigrams found
+
+        let files = {};         // file -> loaded data
+        let loads = {};         // file -> Promise
+        let callbacks = {};
+
+        let results = [];       // [shard, position in shard] of the shown entries
+        let searchVersion = 0;
+        let renderScheduled = false;
+
+        let entriesContainer = document.getElementById("entries-container");
+        let folderSelect = document.getElementById("selector");
+        let searchInput = document.getElementById("input-search");
+        let loadingStatus = document.getElementById("loading-status");
+
+        // called by the shard files
+        function bibmanShard(file, data) {
+            callbacks[file](data);
+            delete callbacks[file];
+        }
+
+        function load(file) {
+            if (!(file in loads)) {
+                loads[file] = new Promise(function(resolve, reject) {
+                    callbacks[file] = resolve;
+                    let script = document.createElement("script");
+                    script.src = file;
+                    script.onerror = reject;
+                    document.body.appendChild(script);
+                }).then(function(data) {
+                    files[file] = data;
+                    return data;
+                });
+            }
+            return loads[file];
+        }
+
+        function inFolder(folder, selectedFolder) {
+            return selectedFolder === "all" || folder === selectedFolder || folder.startsWith(selectedFolder + "/");
+        }
+
+        // same trigrams as bibmancli.fuzzy.trigrams
+        function trigrams(text) {
+            let grams = new Set();
+            let words = text.toLowerCase().replace(/[^\\p{L}\\p{N}]+/gu, " ").split(" ");
+            for (let word of words) {
+                if (word === "") {
+                    continue;
+                }
+                let padded = "  " + word + " ";
+                for (let i = 0; i < padded.length - 2; i++) {
+                    grams.add(padded.slice(i, i + 3));
+                }
+            }
+            return grams;
+        }
+
+        // find the entries of the selected folder matching the search, using
+        // the search files
+        async function update() {
+            let version = ++searchVersion;
+            let query = searchInput.value.trim();
+            let shards = SHARDS.filter(shard => inFolder(shard.folder, folderSelect.value));
+
+            let found = [];
+            if (query === "") {
+                for (let shard of shards) {
+                    for (let i = 0; i < shard.count; i++) {
+                        found.push([shard, i]);
+                    }
+                }
+            } else {
+                let grams = trigrams(query);
+                let scored = [];
+                for (let shard of shards) {
+                    if (!(shard.search in files)) {
+                        loadingStatus.innerText = "Loading search index...";
+                        await load(shard.search);
+                        if (version !== searchVersion) {
+                            return;
+                        }
+                    }
+                    let index = files[shard.search];
+                    let common = new Map();
+                    for (let gram of grams) {
+                        for (let i of index.grams[gram] || []) {
+                            common.set(i, (common.get(i) || 0) + 1);
+                        }
+                    }
+                    for (let [i, count] of common) {
+                        let containment = count / grams.size;
+                        if (containment >= MIN_CONTAINMENT) {
+                            let jaccard = count / (grams.size + index.sizes[i] - count);
+                            scored.push([containment, jaccard, shard, i]);
+                        }
+                    }
+                }
+                scored.sort((a, b) => b[0] - a[0] || b[1] - a[1]);
+                found = scored.map(item => [item[2], item[3]]);
+            }
+
+            results = found;
+            loadingStatus.innerText = query === "" ? "" : found.length + " entries found";
+            entriesContainer.style.height = (results.length * ROW_HEIGHT) + "px";
+            window.scrollTo(0, 0);
+            render();
+        }
+
+        // render the cards visible in the window
+        function render() {
+            renderScheduled = false;
+            let top = -entriesContainer.getBoundingClientRect().top;
+            let first = Math.max(0, Math.floor(top / ROW_HEIGHT) - OVERSCAN);
+            let last = Math.min(results.length, Math.ceil((top + window.innerHeight) / ROW_HEIGHT) + OVERSCAN);
+
+            let cards = [];
+            let missing = new Set();
+            for (let row = first; row < last; row++) {
+                let [shard, i] = results[row];
+                let data = files[shard.file];
+                if (data === undefined) {
+                    missing.add(shard.file);
+                    continue;
+                }
+                let card = createEntryHTML(data[i]);
+                card.style.top = (row * ROW_HEIGHT) + "px";
+                cards.push(card);
+            }
+            entriesContainer.replaceChildren(...cards);
+
+            for (let file of missing) {
+                load(file).then(scheduleRender);
+            }
+        }
+
+        function scheduleRender() {
+            if (!renderScheduled) {
+                renderScheduled = true;
+                window.requestAnimationFrame(render);
+            }
+        }
+
+        function clickedEntry(entry) {
+            var modal = new bootstrap.Modal(document.getElementById('entryModal'));
+
+            // show modal with entry contents
+            let modalBody = document.getElementById("modal-body");
+            modalBody.innerText = "";
+            for (let key in entry.contents) {
+                if (key === "note") {
+                    continue;
+                }
+                // write the key and the value side by side
+                let keyElement = document.createElement("p");
+                keyElement.className = "my-2 fw-bold";
+                keyElement.innerText = key + ": ";
+                let valueElement = document.createElement("p");
+                valueElement.className = "m-2";
+                valueElement.innerText = entry.contents[key];
+                let div = document.createElement("div");
+                div.className = "d-flex justify-content-start";
+                div.appendChild(keyElement);
+                div.appendChild(valueElement);
+                modalBody.appendChild(div);
+            }
+            // add button to sci-hub the entry if it has a DOI
+            if (entry.contents.doi) {
+                let div = document.createElement("div");
+                div.className = "d-grid col-6 mx-auto";
+                let button = document.createElement("button");
+                button.className = "btn btn-secondary";
+                button.innerText = "Open in Sci-Hub";
+
+                // get sci-hub link from settings
+                let sciHubLink = document.getElementById("sci-hub-link").value;
+                button.onclick = function() {
+                    window.open(sciHubLink + entry.contents.doi, "_blank");
+                };
+                div.appendChild(button);
+                modalBody.appendChild(div);
+            }
+
+            modal.show();
+        };
+
+        // function to create HTML elements for each entry
+        function createEntryHTML(entry) {
+            let card = document.createElement("div");
+            card.className = "card bib-entry";
+            let cardHeader = document.createElement("div");
+            cardHeader.className = "card-header text-body-secondary fs-6";
+            cardHeader.innerText = "Location: " + entry.path;
+            let cardBody = document.createElement("div");
+            cardBody.className = "card-body";
+            let title = document.createElement("h5");
+            title.className = "card-title";
+            title.innerText = entry.contents.title;
+            let author = document.createElement("h6");
+            author.className = "card-subtitle mb-2 text-body-secondary";
+            author.innerText = entry.contents.author;
+            let listGroup = document.createElement("ul");
+            listGroup.className = "list-group list-group-flush";
+            let listItem = document.createElement("li");
+            listItem.className = "list-group-item";
+            listItem.innerText = entry.contents.note;
+            let link = document.createElement("a");
+            link.className = "stretched-link";
+            link.setAttribute("href", "#");
+            link.addEventListener("click", function(event) {
+                event.preventDefault();
+                clickedEntry(entry);
+            });
+
+            cardBody.appendChild(title);
+            cardBody.appendChild(author);
+            card.appendChild(cardHeader);
+            card.appendChild(cardBody);
+            listGroup.appendChild(listItem);
+            card.appendChild(listGroup);
+            card.appendChild(link);
+
+            return card;
+        }
+
+        // Show entries from a specific folder when selected
+        folderSelect.addEventListener("change", function() {
+            searchInput.value = "";
+            update();
+        });
+
+        searchInput.addEventListener("input", function () {
+            update();
+        });
+
+        window.addEventListener("scroll", scheduleRender);
+        window.addEventListener("resize", scheduleRender);
+
+        function ClearClick() {
+            searchInput.value = "";
+            update();
+        };
+
+        update();
+    </script>
+</body>
+</html>
+"""
@@ -0,0 +1,19 @@
+import pathlib
+import shutil
+import pytest
+from bibmancli.config_file import create_toml_contents
+
+
+@pytest.fixture
+def library(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Copy of the library in tests/files/library, with a .bibman.toml file in
+    its parent directory
+    """
+    (tmp_path / ".bibman.toml").write_text(create_toml_contents("library"))
+    library = tmp_path / "library"
+    shutil.copytree(
+        pathlib.Path(__file__).parent / "files" / "library", library
+    )
+
+    return library
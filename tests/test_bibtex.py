@@ -53,3 +53,60 @@ def test_file_to_library():
 
 def test_bib_to_string():
     pass
+
+
+def test_iter_entry_chunks():
+    text = (
+        '@string{jcp = "J. Chem. Phys."}\n'
+        "@comment{ignored}\n"
+        "@article{first, title={First}, journal=jcp}\n"
+        "@article{second, title={Second}, journal=jcp}\n"
+        "@article{third, title={Third}, journal=jcp}\n"
+    )
+    with tempfile.TemporaryDirectory() as dir:
+        bib_file = pathlib.Path(dir + "/library.bib")
+        bib_file.write_text(text)
+
+        chunks = list(bibtex.iter_entry_chunks(bib_file, chunk_size=2))
+        results = list(bibtex.parse_chunks(chunk for chunk, _ in chunks))
+
+    assert len(chunks) == 2
+    assert chunks[-1][1] == len(text.encode())
+    assert "ignored" not in "".join(chunk for chunk, _ in chunks)
+
+    keys = [key for entries, _ in results for key, _ in entries]
+    assert keys == ["first", "second", "third"]
+    assert all(failed == 0 for _, failed in results)
+    # the @string definition is resolved in every chunk
+    assert "J. Chem. Phys." in results[1][0][0][1]
+
+
+def test_iter_entry_chunks_inside_values():
+    # lines starting with '@' inside a braced or quoted value do not start
+    # a new entry
+    text = (
+        "@article{first,\n"
+        "    title = {First},\n"
+        "    note = {Contact:\n"
+        "  @ bibman (on the forum)},\n"
+        "}\n"
+        "@misc(second,\n"
+        '    title = "Second",\n'
+        '    note = "see\n'
+        '@ home (page)",\n'
+        ")\n"
+        "@article{third, title={Third}}\n"
+    )
+    with tempfile.TemporaryDirectory() as dir:
+        bib_file = pathlib.Path(dir + "/library.bib")
+        bib_file.write_text(text)
+
+        chunks = list(bibtex.iter_entry_chunks(bib_file, chunk_size=1))
+        results = list(bibtex.parse_chunks(chunk for chunk, _ in chunks))
+
+    assert len(chunks) == 3
+    assert "".join(chunk for chunk, _ in chunks) == text
+    keys = [key for entries, _ in results for key, _ in entries]
+    assert keys == ["first", "second", "third"]
+    assert all(failed == 0 for _, failed in results)
+    assert "@ bibman (on the forum)" in results[0][0][0][1]
@@ -0,0 +1,67 @@
+from bibmancli.subcommands import check
+import pathlib
+from entries import BIB_STR, ERROR_BIB_STR
+
+
+def add_problems(library: pathlib.Path) -> None:
+    """
+    Add the files that check library reports to the library of the tests
+    """
+    (library / "folder").mkdir()
+    (library / "_site").mkdir()
+    (library / "_site" / "index.html").write_text("")
+    (library / "good.bib").write_text(BIB_STR)
+    (library / ".good.txt").write_text("A note")
+    (library / "good.pdf").write_text("")
+    (library / "folder" / "bad.bib").write_text(ERROR_BIB_STR)
+    (library / "folder" / ".orphan.txt").write_text("A note")
+    (library / "stray.dat").write_text("")
+
+
+def test_check_library(library):
+    add_problems(library)
+    results = {result.path: result for result in check.check_library(library)}
+
+    assert set(results) == {
+        "stray.dat",
+        "folder/.orphan.txt",
+        "good.bib",
+        "folder/bad.bib",
+        "geerlings_conceptual_2003.bib",
+        "jones_density_2015.bib",
+        "kryachko_density_2014.bib",
+        "orio_density_2009.bib",
+    }
+    assert results["stray.dat"].errors == [check.NOT_MANAGED]
+    assert results["folder/.orphan.txt"].errors == [check.NO_ENTRY]
+    assert results["good.bib"].errors == []
+    assert results["good.bib"].note == ".good.txt"
+    assert results["folder/bad.bib"].errors == [check.PARSE_ERROR]
+
+    results = list(check.check_library(library, fix=True))
+    assert not (library / "stray.dat").exists()
+    assert (library / "_site" / "index.html").exists()
+
+
+def test_check_library_cache(library, monkeypatch):
+    add_problems(library)
+    cache_dir = library.parent / "cache"
+
+    first = list(check.check_library(library, cache_dir=cache_dir))
+    assert (cache_dir / check.CHECK_CACHE_NAME).is_file()
+
+    # unchanged files are not parsed again
+    def fail(filepath):
+        raise AssertionError(f"{filepath} parsed again")
+
+    monkeypatch.setattr(check, "parse_error", fail)
+    assert list(check.check_library(library, cache_dir=cache_dir)) == first
+
+    # a modified file is parsed again
+    monkeypatch.setattr(check, "parse_error", lambda filepath: None)
+    (library / "folder" / "bad.bib").write_text(BIB_STR + "\n")
+    results = {
+        result.path: result
+        for result in check.check_library(library, cache_dir=cache_dir)
+    }
+    assert results["folder/bad.bib"].message is None
@@ -0,0 +1,37 @@
+from bibmancli import companions
+import tempfile
+import pathlib
+
+
+def test_names():
+    assert companions.note_name("entry.bib") == ".entry.txt"
+    assert companions.pdf_name("entry.bib") == "entry.pdf"
+    assert companions.entry_name(".entry.txt") == "entry.bib"
+    assert companions.entry_name("entry.pdf") == "entry.bib"
+    assert companions.entry_name("entry.dat") is None
+
+
+def test_companion_resolver():
+    with tempfile.TemporaryDirectory() as dir:
+        folder = pathlib.Path(dir)
+        (folder / "entry.bib").write_text("")
+        (folder / ".entry.txt").write_text("")
+        (folder / "other.bib").write_text("")
+
+        resolver = companions.CompanionResolver()
+        assert resolver.resolve(folder / "entry.bib") == (
+            folder / "entry.bib",
+            folder / ".entry.txt",
+            None,
+        )
+        assert resolver.resolve(folder / "missing.bib").entry is None
+
+        # the listing is reused until it is forgotten
+        (folder / "entry.pdf").write_text("")
+        assert resolver.resolve(folder / "entry.bib").pdf is None
+        resolver.forget(folder)
+        assert (
+            resolver.resolve(folder / "entry.bib").pdf == folder / "entry.pdf"
+        )
+
+        assert resolver.resolve(folder / "nowhere" / "entry.bib").entry is None
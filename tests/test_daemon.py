@@ -0,0 +1,119 @@
+from bibmancli.cli import app
+from bibmancli.daemon import DaemonServer, connect, request, socket_path
+from typer.testing import CliRunner
+import threading
+import socket
+import pytest
+import tempfile
+import pathlib
+from entries import BIB_STR
+
+
+def run(runner: CliRunner, library: pathlib.Path, *args: str):
+    return runner.invoke(app, [*args, "--location", str(library.parent)])
+
+
+def test_daemon(library, monkeypatch):
+    with tempfile.TemporaryDirectory() as dir:
+        # the path of a Unix socket must be short
+        monkeypatch.setenv("XDG_RUNTIME_DIR", dir)
+        runner = CliRunner()
+
+        local_show = run(
+            runner, library, "--no-daemon", "show", "--output-format", "{path}"
+        )
+        local_note = run(runner, library, "--no-daemon", "note", "missing")
+        local_export = library.parent / "local.bib"
+        run(
+            runner,
+            library,
+            "--no-daemon",
+            "export",
+            "--filename",
+            str(local_export),
+        )
+
+        server = DaemonServer(library, interval=0.1)
+        ready = threading.Event()
+        thread = threading.Thread(target=server.serve, args=(ready,))
+        thread.start()
+        try:
+            assert ready.wait(10)
+
+            assert socket_path(library).stat().st_mode & 0o777 == 0o600
+
+            # clients checking that the daemon runs do not stop it
+            connect(library).close()
+            status = list(request(library, "status", {}))
+            assert "4 entries" in status[0]["out"][0]
+
+            # the daemon sorts the entries by path
+            show = run(runner, library, "show", "--output-format", "{path}")
+            assert show.exit_code == 0
+            assert show.output.splitlines() == sorted(
+                local_show.output.splitlines()
+            )
+
+            note = run(runner, library, "note", "missing")
+            assert note.exit_code == 1
+            assert note.output == local_note.output
+
+            note = run(runner, library, "note", "jones_density_2015")
+            assert note.exit_code == 0
+            assert (
+                note.output.strip()
+                == (library / ".jones_density_2015.txt").read_text().strip()
+            )
+
+            daemon_export = library.parent / "daemon.bib"
+            run(runner, library, "export", "--filename", str(daemon_export))
+            assert daemon_export.read_bytes() == local_export.read_bytes()
+
+            # new files are seen by the next request
+            (library / "beran_frontiers_2023.bib").write_text(BIB_STR)
+            show = run(runner, library, "show", "--output-format", "{path}")
+            assert "beran_frontiers_2023.bib" in show.output
+
+            # files that can not be parsed are reported
+            (library / "broken.bib").write_text("not a BibTeX entry")
+            show = run(runner, library, "show", "--output-format", "{path}")
+            assert "Could not parse" in show.output
+            assert "broken.bib" in show.output.replace("\n", "")
+            (library / "broken.bib").unlink()
+
+            # and removed files are dropped
+            (library / "orio_density_2009.bib").unlink()
+            show = run(runner, library, "show", "--output-format", "{path}")
+            assert "orio_density_2009.bib" not in show.output
+
+            # a client of another version runs the command itself
+            assert list(server.answer({"version": "0", "command": "show"})) == [
+                {"fallback": "version"}
+            ]
+        finally:
+            stopped = list(request(library, "stop", {}))
+            thread.join(10)
+
+        assert stopped[-1] == {"exit": 0}
+        assert not thread.is_alive()
+        assert request(library, "status", {}) is None
+
+
+def test_daemon_private_directory(library, monkeypatch):
+    with tempfile.TemporaryDirectory() as dir:
+        monkeypatch.setenv("XDG_RUNTIME_DIR", dir)
+        # a directory other users can write to, where one of them bound
+        # the socket of the library
+        path = socket_path(library)
+        path.parent.mkdir(mode=0o700)
+        path.parent.chmod(0o777)
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        other.bind(str(path))
+        other.listen()
+        try:
+            assert connect(library) is None
+            assert request(library, "status", {}) is None
+            with pytest.raises(RuntimeError, match="current user"):
+                DaemonServer(library).serve()
+        finally:
+            other.close()
@@ -0,0 +1,110 @@
+from bibmancli import doi
+import pathlib
+import tempfile
+import threading
+from urllib.parse import unquote_plus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from entries import BIB_STR
+
+
+class DoiHandler(BaseHTTPRequestHandler):
+    """
+    Citation API that knows the DOI of BIB_STR, resolves "10.1/moved" to
+    another DOI and fails once with 503 for each DOI
+    """
+
+    protocol_version = "HTTP/1.1"
+    seen = set()
+    requests = 0
+
+    def do_GET(self):
+        DoiHandler.requests += 1
+        identifier = unquote_plus(self.path.rsplit("/", 1)[1])
+        if identifier not in DoiHandler.seen:
+            DoiHandler.seen.add(identifier)
+            self.reply(503, "", {"Retry-After": "0"})
+        elif identifier == "10.1039/d3sc03903j":
+            self.reply(200, BIB_STR)
+        elif identifier == "10.1/moved":
+            self.reply(200, BIB_STR.replace("D3SC03903J", "D3SC00000X"))
+        else:
+            self.reply(404, "")
+
+    def reply(self, status, text, headers={}):
+        body = text.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_normalize_doi():
+    assert doi.normalize_doi("https://doi.org/10.1039/D3SC03903J") == (
+        "10.1039/d3sc03903j"
+    )
+    assert doi.normalize_doi(" doi:10.1/X ") == "10.1/x"
+
+
+def test_collect_dois():
+    with tempfile.TemporaryDirectory() as dir:
+        library = pathlib.Path(dir)
+        (library / "folder").mkdir()
+        (library / "folder" / "good.bib").write_text(BIB_STR)
+        (library / "nodoi.bib").write_text(
+            BIB_STR.replace("doi        = {10.1039/D3SC03903J},", "")
+        )
+
+        dois, without = doi.collect_dois(library)
+
+        assert [(path, value) for path, value, _ in dois] == [
+            ("folder/good.bib", "10.1039/D3SC03903J")
+        ]
+        assert without == 1
+
+
+def test_verify_dois():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DoiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/bibtex/"
+
+    entries = [
+        ("good.bib", "https://doi.org/10.1039/D3SC03903J", None),
+        ("copy.bib", "10.1039/d3sc03903j", None),
+        ("moved.bib", "10.1/moved", None),
+        ("dead.bib", "10.1/dead", None),
+    ]
+    try:
+        results = list(
+            doi.verify_dois(
+                entries, timeout=5, workers=4, rate=0, base_url=base_url
+            )
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    status = {result.path: result.status for result in results}
+    assert status == {
+        "good.bib": doi.OK,
+        "copy.bib": doi.OK,
+        "moved.bib": doi.MISMATCH,
+        "dead.bib": doi.DEAD,
+    }
+    # every DOI was verified once, retrying after the 503
+    assert DoiHandler.seen == {"10.1039/d3sc03903j", "10.1/moved", "10.1/dead"}
+    assert DoiHandler.requests == 6
+
+
+def test_rate_limiter():
+    limiter = doi.RateLimiter(rate=100, burst=1)
+    start = doi.time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+
+    assert doi.time.monotonic() - start >= 0.09
@@ -0,0 +1,49 @@
+from bibmancli import fuzzy
+from bibmancli.index import LibraryIndex
+
+
+def test_trigram_index():
+    index = fuzzy.TrigramIndex()
+    index.add("jones_density_2015", "jones")
+    index.add("geerlings_conceptual_2003", "geerlings")
+    index.add("Conceptual Density Functional Theory", "geerlings")
+
+    assert index.search("jnes_density_2015")[0][0] == "jones"
+    assert index.search("conceptal")[0][0] == "geerlings"
+    assert index.search("xyz") == []
+
+
+def test_author_last_names():
+    assert fuzzy.author_last_names("Jones, R. O. and Pedro Juan Royo") == [
+        "Jones",
+        "Royo",
+    ]
+
+
+def test_suggest_entries(library):
+    # without index, only the file names are used
+    suggestions = fuzzy.suggest_entries(library, "jone_density_2015")
+    assert suggestions[0] == library / "jones_density_2015.bib"
+
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+
+    # with index, titles and authors are also used
+    entries = fuzzy.fuzzy_entries(library, "Geerlngs")
+    assert entries[0].contents.key == "geerlings_conceptual_2003"
+    suggestions = fuzzy.suggest_entries(library, "kryachk")
+    assert suggestions[0] == library / "kryachko_density_2014.bib"
+
+
+def test_fuzzy_common_trigrams(library, monkeypatch):
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+
+        # the candidates are found with the trigrams of one entry only
+        monkeypatch.setattr("bibmancli.index.COMMON_TRIGRAM", 1)
+        results = index.fuzzy("Geerlngs")
+        assert results[0][0] == library / "geerlings_conceptual_2003.bib"
+
+        # and with all of them if they are all common
+        results = index.fuzzy("density functional")
+        assert len(results) > 1
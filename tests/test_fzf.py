@@ -0,0 +1,112 @@
+from bibmancli.cli import app
+from bibmancli.index import LibraryIndex
+from bibmancli.fzf import split_line, OFFSET, LENGTH, PATH, KEY
+from typer.testing import CliRunner
+import os
+import subprocess
+from entries import BIB_STR
+
+# stands for fzf: keeps its input and arguments and selects the first line
+FAKE_FZF = """#!/bin/sh
+printf '%s\\n' "$@" > "$(dirname "$0")/args"
+cat > "$(dirname "$0")/input"
+head -n 1 "$(dirname "$0")/input"
+"""
+
+
+def test_show_interactive(library, monkeypatch):
+    bin = library.parent / "bin"
+    bin.mkdir()
+    (bin / "fzf").write_text(FAKE_FZF)
+    (bin / "fzf").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin}{os.pathsep}{os.environ['PATH']}")
+
+    def show(*args: str):
+        return CliRunner().invoke(
+            app,
+            [
+                "--no-daemon",
+                "show",
+                "--interactive",
+                "--output-format",
+                "{entry_name}: {title}",
+                "--location",
+                str(library.parent),
+                *args,
+            ],
+        )
+
+    # without index, the files are read and no index is created
+    result = show()
+    assert result.exit_code == 0
+    assert result.output == (
+        "geerlings_conceptual_2003: Conceptual Density Functional Theory\n"
+    )
+    assert LibraryIndex.open(library) is None
+    without_index = (bin / "input").read_text()
+
+    LibraryIndex.open(library, create=True).close()
+    result = show()
+    assert result.exit_code == 0
+    assert result.output == (
+        "geerlings_conceptual_2003: Conceptual Density Functional Theory\n"
+    )
+    assert (bin / "input").read_text() == without_index
+
+    lines = [
+        split_line(line) for line in (bin / "input").read_text().splitlines()
+    ]
+    assert [fields[KEY] for fields in lines] == [
+        "geerlings_conceptual_2003",
+        "jones_density_2015",
+        "kryachko_density_2014",
+        "orio_density_2009",
+    ]
+    assert lines[1][KEY:] == [
+        "jones_density_2015",
+        "Density functional theory: Its origins, rise to prominence, and future",
+        "Jones, R. O.",
+        "2015",
+    ]
+
+    # the preview of an entry is read from the cached previews
+    args = (bin / "args").read_text().splitlines()
+    preview = next(
+        arg.removeprefix("--preview=")
+        for arg in args
+        if arg.startswith("--preview=")
+    )
+    assert "{1}" in preview and "{2}" in preview
+    fields = lines[1]
+    preview = preview.replace("{1}", fields[OFFSET])
+    preview = preview.replace("{2}", fields[LENGTH])
+    text = subprocess.run(
+        preview, shell=True, capture_output=True, text=True
+    ).stdout
+    assert text.startswith(
+        "Density functional theory: Its origins, rise to prominence, "
+        "and future\nJones, R. O.\n2015 · article\n"
+    )
+    assert "@article{jones_density_2015," in text
+    assert text.endswith(
+        "Note:\n"
+        + (library / ".jones_density_2015.txt").read_text().strip()
+        + "\n"
+    )
+
+    # the previews are only written again when the library changes
+    cache = library.parent / ".bibman_cache" / "fzf"
+    written = {path: path.stat().st_mtime_ns for path in cache.iterdir()}
+    assert show().exit_code == 0
+    assert {
+        path: path.stat().st_mtime_ns for path in cache.iterdir()
+    } == written
+
+    (library / "beran_frontiers_2023.bib").write_text(BIB_STR)
+    result = show("--filter-title", "Frontiers")
+    assert result.output.startswith("beran_frontiers_2023: Frontiers")
+    assert len((bin / "input").read_text().splitlines()) == 1
+    assert set(cache.iterdir()).isdisjoint(written)
+
+    lines = (bin / "input").read_text().splitlines()
+    assert split_line(lines[0])[PATH] == "beran_frontiers_2023.bib"
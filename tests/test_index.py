@@ -0,0 +1,174 @@
+from bibmancli.index import LibraryIndex
+from bibmancli.utils import iterate_files, export_entries, Entry
+from bibmancli.cli import app
+from typer.testing import CliRunner
+from entries import BIB_STR
+
+
+def test_index_refresh(library):
+    assert LibraryIndex.open(library) is None
+
+    with LibraryIndex.open(library, create=True) as index:
+        assert index.refresh() == (4, 4, 0)
+        assert index.refresh() == (0, 0, 0)
+        assert index.count() == 4
+
+        (library / "beran_frontiers_2023.bib").write_text(BIB_STR)
+        (library / "orio_density_2009.bib").unlink()
+        (library / ".orio_density_2009.txt").unlink()
+        assert index.refresh() == (1, 0, 2)
+        assert index.count() == 4
+
+        note = library / ".jones_density_2015.txt"
+        note.write_text("Updated note")
+        assert index.refresh() == (0, 1, 0)
+        assert (
+            index.get_note(library / "jones_density_2015.bib") == "Updated note"
+        )
+
+        # only the modified files are parsed again
+        sub = library / "sub"
+        sub.mkdir()
+        (sub / "beran_frontiers_2023.bib").write_text(BIB_STR)
+        (library / "geerlings_conceptual_2003.bib").write_text(
+            (library / "geerlings_conceptual_2003.bib").read_text() + "\n"
+        )
+        assert index.refresh().parsed == 2
+
+
+def test_index_skips_bad_files(library, capsys):
+    (library / "broken.bib").write_text("not a BibTeX entry")
+    (library / "two.bib").write_text(
+        BIB_STR + BIB_STR.replace("beran_frontiers_2023", "other")
+    )
+
+    with LibraryIndex.open(library, create=True) as index:
+        assert index.refresh() == (4, 4, 0)
+        assert sorted(index.skipped) == ["broken.bib", "two.bib"]
+        assert index.count() == 4
+
+        # an entry that can not be parsed anymore is dropped
+        (library / "jones_density_2015.bib").write_text("@article{")
+        assert index.refresh() == (0, 0, 1)
+        assert index.count() == 3
+        assert "jones_density_2015.bib" in index.skipped
+
+    # the files that can not be parsed are skipped and reported, with or
+    # without the index
+    capsys.readouterr()
+    for kwargs in ({}, {"use_index": False}, {"use_index": False, "jobs": 2}):
+        assert len(list(iterate_files(library, **kwargs))) == 3
+        err = capsys.readouterr().err
+        for name in ("broken.bib", "two.bib", "jones_density_2015.bib"):
+            assert str(library / name) in err.replace("\n", "")
+
+    # export copies the files without parsing them, except the ones
+    # without a key
+    exported = [entry.path.name for entry in export_entries(library)]
+    assert "broken.bib" not in exported
+    assert "broken.bib" in capsys.readouterr().err
+
+
+def test_index_build_jobs(library, monkeypatch):
+    jobs = []
+    refresh = LibraryIndex.refresh
+
+    def recording_refresh(self, *args, **kwargs):
+        jobs.append(kwargs.get("jobs", args[0] if args else 1))
+        return refresh(self, *args, **kwargs)
+
+    monkeypatch.setattr(LibraryIndex, "refresh", recording_refresh)
+
+    (library / "broken.bib").write_text("not a BibTeX entry")
+
+    result = CliRunner().invoke(
+        app,
+        [
+            "--jobs",
+            "2",
+            "index",
+            "build",
+            "--location",
+            str(library.parent),
+        ],
+    )
+    assert result.exit_code == 0
+    assert "4 entries parsed" in result.output
+    assert "broken.bib" in result.output
+    assert jobs == [2]
+
+
+def test_index_summaries(library):
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+        summaries = list(index.summaries())
+
+    assert [summary.key for summary in summaries] == [
+        "geerlings_conceptual_2003",
+        "jones_density_2015",
+        "kryachko_density_2014",
+        "orio_density_2009",
+    ]
+    # the fields are converted from LaTeX
+    assert summaries[0].title == "Conceptual Density Functional Theory"
+    assert summaries[0].path == library / "geerlings_conceptual_2003.bib"
+    assert summaries[0].year == "2003"
+    assert summaries[0].entry_type == "article"
+
+
+def test_iterate_files_from_index(library):
+    walked = {e.path: e.contents.fields_dict for e in iterate_files(library)}
+
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+
+    indexed = {e.path: e.contents.fields_dict for e in iterate_files(library)}
+
+    assert walked.keys() == indexed.keys()
+    for path in walked:
+        assert {k: f.value for k, f in walked[path].items()} == {
+            k: f.value for k, f in indexed[path].items()
+        }
+
+    with LibraryIndex.open(library) as index:
+        path = library / "jones_density_2015.bib"
+        entry = Entry.from_path(path, index)
+        assert entry.contents.key == "jones_density_2015"
+        assert index.get(path) is not None
+
+        path.write_text(path.read_text() + "\n")
+        assert index.get(path) is None
+
+
+def test_index_search(library):
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+
+        keys = [e.key for _, e, _ in index.search("conceptual")]
+        assert keys == ["geerlings_conceptual_2003"]
+
+        # phrase, prefix and author queries
+        assert len(index.search('"density functional"')) == 4
+        assert len(index.search("foundat*")) == 1
+        assert [e.key for _, e, _ in index.search("author:jones")] == [
+            "jones_density_2015"
+        ]
+
+        # the title is ranked above the abstract
+        results = index.search("prominence")
+        assert results[0][1].key == "jones_density_2015"
+
+        # invalid query syntax falls back to plain words
+        assert index.search("density-functional:") is not None
+
+        # notes are searchable and kept up to date
+        note = library / ".orio_density_2009.txt"
+        note.write_text("Read for the reading group")
+        index.refresh()
+        assert [e.key for _, e, _ in index.search("reading")] == [
+            "orio_density_2009"
+        ]
+
+        note.unlink()
+        index.refresh()
+        assert index.search("reading") == []
@@ -0,0 +1,68 @@
+from bibmancli.latex import LatexConverter
+from bibmancli.index import LibraryIndex
+from bibmancli.utils import iterate_files
+from bibmancli import latex
+
+
+class CountingConverter(LatexConverter):
+    calls = 0
+
+    def _convert(self, source: str) -> str:
+        self.calls += 1
+        return super()._convert(source)
+
+
+def test_converter_cache():
+    converter = CountingConverter(maxsize=2)
+
+    assert converter.convert(r"Schr\"{o}dinger") == "Schrödinger"
+    assert converter.convert(r"Schr\"{o}dinger") == "Schrödinger"
+    assert converter.calls == 1
+
+    converter.convert("a")
+    converter.convert("b")  # evicts the first string
+    converter.convert(r"Schr\"{o}dinger")
+    assert converter.calls == 4
+
+
+def test_converter_store(library):
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+
+    for entry in iterate_files(library):
+        entry.format_string("{title} {author}")
+
+    latex.converter.clear()
+    converter = CountingConverter()
+    with LibraryIndex.open(library) as index:
+        with converter.use_store(index):
+            for _, contents in index.entries():
+                converter.convert(contents.fields_dict["title"].value)
+
+    assert converter.calls == 0
+
+
+def test_converter_store_pruned(library):
+    with LibraryIndex.open(library, create=True) as index:
+        index.refresh()
+        titles = [
+            contents.fields_dict["title"].value
+            for _, contents in index.entries()
+        ]
+        assert all(index.lookup_latex(title) is not None for title in titles)
+
+    removed = next(library.rglob("*.bib"))
+    with LibraryIndex.open(library) as index:
+        path, contents = next(
+            (path, contents)
+            for path, contents in index.entries()
+            if path == removed
+        )
+        title = contents.fields_dict["title"].value
+        removed.unlink()
+        index.refresh()
+
+        # the conversions of the removed entry are not kept
+        assert index.lookup_latex(title) is None
+        for _, contents in index.entries():
+            assert index.lookup_latex(contents.fields_dict["title"].value)
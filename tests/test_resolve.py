@@ -0,0 +1,220 @@
+from bibmancli import resolve
+from bibmancli.response_cache import ResponseCache
+import pytest
+import requests
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote_plus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from entries import BIB_STR
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Citation API answering the identifier "10.1/<n>" with an entry with key
+    "entry_<n>", after a short delay
+    """
+
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    requests = 0
+    delay = 0.1
+
+    def do_GET(self):
+        StubHandler.connections.add(self.client_address)
+        StubHandler.requests += 1
+        identifier = unquote_plus(self.path.rsplit("/", 1)[1])
+        time.sleep(self.delay)
+
+        if not identifier.startswith("10.1/"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        number = identifier.removeprefix("10.1/")
+        body = BIB_STR.replace("beran_frontiers_2023", f"entry_{number}")
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowHandler(StubHandler):
+    delay = 2.0
+
+
+def start_server(handler=StubHandler) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/bibtex/"
+
+    return server, base_url
+
+
+def test_resolve_identifiers():
+    server, base_url = start_server()
+
+    identifiers = [f"10.1/{n}" for n in range(20)] + ["unknown"]
+    try:
+        start = time.perf_counter()
+        results = list(
+            resolve.resolve_identifiers(
+                identifiers,
+                timeout=5,
+                workers=5,
+                chain=resolve.ResolverChain(
+                    [resolve.WikipediaBackend(base_url)]
+                ),
+            )
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    resolved = {result.identifier: result for result in results}
+    assert set(resolved) == set(identifiers)
+    assert resolved["10.1/7"].library.entries[0].key == "entry_7"
+    assert resolved["unknown"].library is None
+    assert "404" in resolved["unknown"].error
+
+    # requests are sent concurrently over at most 5 reused connections
+    assert elapsed < 21 * 0.1
+    assert len(StubHandler.connections) <= 5
+
+
+def test_resolve_cached():
+    server, base_url = start_server()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResponseCache(Path(tmpdir) / "responses.sqlite")
+        try:
+            StubHandler.requests = 0
+            for _ in range(2):
+                library = resolve.resolve_identifier(
+                    "10.1/1", 5, base_url=base_url, cache=cache
+                )
+                assert library.entries[0].key == "entry_1"
+                # not found responses are cached too
+                with pytest.raises(RuntimeError, match="404"):
+                    resolve.resolve_identifier(
+                        "unknown", 5, base_url=base_url, cache=cache
+                    )
+            assert StubHandler.requests == 2
+
+            resolve.resolve_identifier(
+                "10.1/1", 5, base_url=base_url, cache=cache, refresh=True
+            )
+            assert StubHandler.requests == 3
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # offline, expired responses are still used
+        cache.ttl = 0
+        library = resolve.resolve_identifier(
+            "10.1/1", 5, base_url=base_url, cache=cache
+        )
+        assert library.entries[0].key == "entry_1"
+        with pytest.raises(requests.ConnectionError):
+            resolve.resolve_identifier(
+                "10.1/2", 5, base_url=base_url, cache=cache
+            )
+        cache.close()
+
+
+def test_resolver_chain():
+    slow_server, slow_url = start_server(SlowHandler)
+    fast_server, fast_url = start_server()
+    slow = resolve.WikipediaBackend(slow_url)
+    fast = resolve.WikipediaBackend(fast_url)
+    try:
+        chain = resolve.ResolverChain([slow, fast], hedge_delay=0.2)
+        # the fast backend is asked after the hedge delay and answers first
+        start = time.perf_counter()
+        library = chain.resolve("10.1/1", 5)
+        assert time.perf_counter() - start < 1
+        assert library.entries[0].key == "entry_1"
+
+        # and it is preferred next time
+        assert chain.ordered() == [fast, slow]
+        start = time.perf_counter()
+        chain.resolve("10.1/2", 5)
+        assert time.perf_counter() - start < 0.2
+
+        # a failure starts the next backend without waiting
+        chain = resolve.ResolverChain([fast, slow], hedge_delay=5)
+        start = time.perf_counter()
+        with pytest.raises(RuntimeError, match="404"):
+            chain.resolve("unknown", 5)
+        assert time.perf_counter() - start < 5
+    finally:
+        for server in (slow_server, fast_server):
+            server.shutdown()
+            server.server_close()
+
+
+def test_resolver_chain_waits():
+    slow_server, slow_url = start_server(SlowHandler)
+    fast_server, fast_url = start_server()
+    slow = resolve.WikipediaBackend(slow_url)
+    fast = resolve.WikipediaBackend(fast_url)
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResponseCache(Path(tmpdir) / "responses.sqlite")
+            with cache:
+                with resolve.ResolverChain(
+                    [slow, fast], hedge_delay=0.2, cache=cache
+                ) as chain:
+                    library = chain.resolve("10.1/1", 5)
+                    assert library.entries[0].key == "entry_1"
+                    assert cache.get(slow_url, "10.1/1") is None
+
+                # the slow backend lost, but its response is stored before
+                # the cache is closed
+                assert cache.get(slow_url, "10.1/1").status == 200
+
+            # and a closed cache is not used
+            assert cache.get(slow_url, "10.1/1") is None
+            cache.put(slow_url, "10.1/2", 200, "")
+            cache.close()
+    finally:
+        for server in (slow_server, fast_server):
+            server.shutdown()
+            server.server_close()
+
+
+def test_resolver_chain_dois_only():
+    server, url = start_server()
+    wikipedia = resolve.WikipediaBackend(url)
+    crossref = resolve.CrossRefBackend()
+    try:
+        assert resolve.doi_of("https://doi.org/10.1021/Acs.JCTC.5b00001") == (
+            "10.1021/Acs.JCTC.5b00001"
+        )
+        assert resolve.doi_of("doi:10.1000/1") == "10.1000/1"
+        for identifier in ("https://arxiv.org/abs/2301.1", "PMC1234", "123"):
+            assert resolve.doi_of(identifier) is None
+            assert not crossref.accepts(identifier)
+        assert crossref.accepts("10.1000/1")
+
+        # CrossRef is never asked for an identifier that is not a DOI
+        chain = resolve.ResolverChain([crossref, wikipedia], hedge_delay=0)
+        assert chain.ordered("https://arxiv.org/abs/2301.1") == [wikipedia]
+        with pytest.raises(RuntimeError, match="404"):
+            chain.resolve("unknown", 5)
+        assert chain.stats.estimate(resolve.CROSSREF_SOURCE) is None
+
+        chain = resolve.ResolverChain([crossref], hedge_delay=0)
+        with pytest.raises(RuntimeError, match="No backend"):
+            chain.resolve("unknown", 5)
+    finally:
+        server.shutdown()
+        server.server_close()
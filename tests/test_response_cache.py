@@ -0,0 +1,44 @@
+from bibmancli.response_cache import ResponseCache
+from pathlib import Path
+import tempfile
+import time
+
+
+def test_response_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "responses.sqlite"
+        with ResponseCache(db_path, ttl=60, negative_ttl=0) as cache:
+            assert cache.get("api", "10.1/1") is None
+            cache.put("api", "10.1/1", 200, "@article{a,}")
+            cache.put("api", "10.1/2", 404, "")
+
+            found = cache.get("api", "10.1/1")
+            assert found.body == "@article{a,}"
+            assert cache.is_fresh(found)
+            assert not cache.is_fresh(cache.get("api", "10.1/2"))
+            assert cache.get("other", "10.1/1") is None
+
+        # the responses are kept between runs
+        with ResponseCache(db_path) as cache:
+            assert cache.get("api", "10.1/1").status == 200
+            cache.clear()
+            assert cache.get("api", "10.1/1") is None
+
+
+def test_response_cache_eviction():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "responses.sqlite"
+        with ResponseCache(db_path, max_size=1000) as cache:
+            body = "x" * 100
+            for n in range(8):
+                cache.put("api", str(n), 200, body)
+                time.sleep(0.001)
+            # "0" is used again, so "1" is the least recently used
+            cache.get("api", "0")
+            cache.put("api", "8", 200, body)
+            cache.put("api", "9", 200, body)
+
+            kept = [n for n in range(10) if cache.get("api", str(n))]
+            assert 0 in kept and 9 in kept
+            assert 1 not in kept
+            assert len(kept) * 104 <= 1000
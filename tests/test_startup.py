@@ -0,0 +1,63 @@
+from bibmancli.config_file import create_toml_contents
+import subprocess
+import sys
+import tempfile
+import pathlib
+
+# Modules that bibman note must not load at startup
+HEAVY_MODULES = [
+    "textual",
+    "pyfzf",
+    "requests",
+    "habanero",
+    "bs4",
+    "bibtexparser",
+    "pylatexenc",
+    "rich.syntax",
+    "rich.progress",
+]
+
+# Maximum cumulative import time of the bibmancli package, in microseconds
+IMPORT_BUDGET_US = 400_000
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """
+    Run bibman with python -X importtime and return the cumulative import
+    time of every module, in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "bibmancli", *args],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def test_note_startup():
+    with tempfile.TemporaryDirectory() as dir:
+        root = pathlib.Path(dir)
+        (root / ".bibman.toml").write_text(create_toml_contents("library"))
+        (root / "library").mkdir()
+        (root / "library" / ".entry.txt").write_text("Some note")
+
+        times = import_times("note", "entry", "--location", dir)
+
+    loaded = [
+        module
+        for module in HEAVY_MODULES
+        if any(
+            name == module or name.startswith(module + ".") for name in times
+        )
+    ]
+    assert loaded == []
+    assert times["bibmancli"] < IMPORT_BUDGET_US
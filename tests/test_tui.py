@@ -0,0 +1,124 @@
+from bibmancli.tui import BibApp, MainPane, FilenameTree, EntryTable, PAGE_SIZE
+from bibmancli.index import LibraryIndex
+from textual.widgets import TabbedContent
+import asyncio
+import tempfile
+import pathlib
+from entries import BIB_STR
+
+
+def test_tui_large_folder():
+    with tempfile.TemporaryDirectory() as dir:
+        library = pathlib.Path(dir) / "library"
+        big = library / "big"
+        big.mkdir(parents=True)
+        for i in range(PAGE_SIZE * 2 + 10):
+            (big / f"entry_{i:04d}.bib").write_text(BIB_STR)
+        (big / ".entry_0001.txt").write_text("A note")
+
+        async def run() -> None:
+            app = BibApp(location=library)
+            async with app.run_test(size=(100, 30)) as pilot:
+                await pilot.pause(0.2)
+                tree = app.query_one(FilenameTree)
+                node = tree.root.children[0]
+                node.expand()
+                for _ in range(100):
+                    if node.children:
+                        break
+                    await pilot.pause(0.05)
+
+                # a page of entries and a node for the others
+                assert len(node.children) == PAGE_SIZE + 1
+                assert (
+                    str(node.children[-1].label) == f"... {PAGE_SIZE + 10} more"
+                )
+
+                tree.scroll_end(animate=False)
+                await pilot.pause(0.2)
+                assert len(node.children) == 2 * PAGE_SIZE + 1
+
+                # selecting an entry shows it
+                tree.select_node(node.children[1])
+                await pilot.pause(0.1)
+                assert app.sub_title == "big/entry_0001.bib"
+
+                # reloading keeps the expanded folders
+                tree.reload()
+                for _ in range(100):
+                    await pilot.pause(0.05)
+                    if tree.root.children and tree.root.children[0] is not node:
+                        if len(tree.root.children[0].children) > 0:
+                            break
+                node = tree.root.children[0]
+                assert node.is_expanded
+                assert len(node.children) == PAGE_SIZE + 1
+
+                pane = app.query_one(MainPane)
+                pane.update_text(big / "entry_0001.bib")
+                # the files are read by a worker
+                for _ in range(100):
+                    if pane.note.text:
+                        break
+                    await pilot.pause(0.05)
+                assert pane.note.text == "A note"
+                assert pane.text_area.text == BIB_STR
+                assert big / "entry_0001.bib" in pane.previews
+
+        asyncio.run(run())
+
+
+def test_tui_table(library):
+    big = library / "big"
+    big.mkdir()
+    for i in range(PAGE_SIZE + 10):
+        (big / f"entry_{i:04d}.bib").write_text(BIB_STR)
+
+    async def run() -> None:
+        app = BibApp(location=library)
+        async with app.run_test(size=(100, 30)) as pilot:
+            await pilot.press("t")
+            table = app.query_one(EntryTable)
+            for _ in range(200):
+                if table.rows:
+                    break
+                await pilot.pause(0.05)
+
+            # the entries are read from the index, a page at a time
+            assert len(table.rows) == PAGE_SIZE + 14
+            assert table.table.row_count == PAGE_SIZE
+            table.table.scroll_end(animate=False)
+            await pilot.pause(0.2)
+            assert table.table.row_count == PAGE_SIZE + 14
+
+            table.sort_by(2)
+            assert table.table.get_row_at(0)[2].plain == "2003"
+            table.sort_by(2)
+            assert table.table.get_row_at(0)[2].plain == "2023"
+
+            # each keystroke narrows the entries
+            table.filter_box.value = "dens"
+            await pilot.pause(0.1)
+            assert table.table.row_count == 4
+            table.filter_box.value = "density rev"
+            await pilot.pause(0.1)
+            assert table.table.row_count == 1
+            assert table.table.get_row_at(0)[0].plain == (
+                "Density functional theory: Foundations reviewed"
+            )
+
+            # selecting an entry opens it in the files tab
+            table.table.focus()
+            table.table.move_cursor(row=0)
+            await pilot.press("enter")
+            await pilot.pause(0.1)
+            assert app.query_one(TabbedContent).active == "files"
+            assert app.sub_title == "kryachko_density_2014.bib"
+
+    # the entries are read from the files if the library has no index,
+    # which is not created
+    asyncio.run(run())
+    assert LibraryIndex.open(library) is None
+
+    LibraryIndex.open(library, create=True).close()
+    asyncio.run(run())
@@ -29,3 +29,47 @@ def test_Entry_class():
 
 def test_filtering_entries():
     pass
+
+
+def test_format_string():
+    with tempfile.TemporaryDirectory() as dir:
+        bib_file = pathlib.Path(dir + "/normal.bib")
+        bib_file.write_text(BIB_STR)
+        entry = utils.Entry(bib_file, bibtex.file_to_bib(bib_file).entries[0])
+
+        assert entry.format_string("{year}: {entry_type}") == "2023: article"
+        assert entry.format_string("{path}") == str(bib_file)
+        assert (
+            entry.format_string("{entry_name} {doi}")
+            == "beran_frontiers_2023 10.1039/D3SC03903J"
+        )
+        assert entry.format_string("{month}") == "ENTRY HAS NO MONTH"
+        assert entry.format_string("{isbn|-}") == "-"
+        assert entry.format_string("{year|-} {}") == "2023 {}"
+
+
+def test_export_entries():
+    with tempfile.TemporaryDirectory() as dir:
+        library = pathlib.Path(dir)
+        (library / "first.bib").write_text(BIB_STR.strip() + "\n")
+        (library / "folder").mkdir()
+        (library / "folder" / "second.bib").write_text(BIB_STR.strip())
+
+        exported = list(utils.export_entries(library))
+        assert sorted(e.key for e in exported) == [
+            "beran_frontiers_2023",
+            "beran_frontiers_2023_1",
+        ]
+        for entry in exported:
+            assert entry.text.endswith(b"\n")
+            if entry.key == entry.original_key:
+                # exported without parsing
+                assert entry.text == entry.path.read_bytes().rstrip() + b"\n"
+            else:
+                renamed = bibtex.string_to_bib(entry.text.decode())
+                assert renamed.entries[0].key == entry.key
+
+        skipped = [
+            e for e in utils.export_entries(library, rename=False) if not e.text
+        ]
+        assert len(skipped) == 1
@@ -6,3 +6,10 @@ def test_iterate_files():
     path = Path(__file__).parent / "files" / "library"
     files = iterate_files(path)
     assert len(list(files)) == 4
+
+
+def test_iterate_files_jobs():
+    path = Path(__file__).parent / "files" / "library"
+    serial = [(e.path, e.contents.key) for e in iterate_files(path)]
+    parallel = [(e.path, e.contents.key) for e in iterate_files(path, jobs=2)]
+    assert serial == parallel
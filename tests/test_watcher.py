@@ -0,0 +1,102 @@
+from bibmancli.watcher import (
+    LibraryWatcher,
+    ChangeEvent,
+    CREATED,
+    MODIFIED,
+    MOVED,
+    DELETED,
+)
+import os
+import time
+import queue
+import pathlib
+from entries import BIB_STR
+
+
+def changes(events: queue.Queue, count: int) -> set[ChangeEvent]:
+    """
+    Wait for a number of changes reported by the watcher
+    """
+    received = set()
+    deadline = time.monotonic() + 10
+    while len(received) < count and time.monotonic() < deadline:
+        try:
+            received.update(events.get(timeout=0.1))
+        except queue.Empty:
+            pass
+
+    return received
+
+
+def check_watcher(library: pathlib.Path, inotify: bool) -> None:
+    (library / "folder").mkdir()
+    (library / "folder" / "other.bib").write_text(BIB_STR)
+    events = queue.Queue()
+    watcher = LibraryWatcher(library, interval=0.1, inotify=inotify)
+    watcher.subscribe(events.put)
+
+    with watcher:
+        assert watcher.backend == ("inotify" if inotify else "polling")
+
+        (library / "new.bib").write_text(BIB_STR)
+        (library / "new.pdf").write_bytes(b"%PDF")
+        (library / "ignored.dat").write_text("")
+        assert changes(events, 2) == {
+            ChangeEvent(CREATED, "new.bib"),
+            ChangeEvent(CREATED, "new.pdf"),
+        }
+
+        (library / "jones_density_2015.bib").write_text(BIB_STR + "\n")
+        (library / ".jones_density_2015.txt").unlink()
+        assert changes(events, 2) == {
+            ChangeEvent(MODIFIED, "jones_density_2015.bib"),
+            ChangeEvent(DELETED, ".jones_density_2015.txt"),
+        }
+
+        os.rename(library / "new.bib", library / "folder" / "moved.bib")
+        assert changes(events, 1) == {
+            ChangeEvent(MOVED, "folder/moved.bib", "new.bib")
+        }
+
+        # the files of a folder are moved with it
+        os.rename(library / "folder", library / "renamed")
+        assert changes(events, 2) == {
+            ChangeEvent(MOVED, "renamed/moved.bib", "folder/moved.bib"),
+            ChangeEvent(MOVED, "renamed/other.bib", "folder/other.bib"),
+        }
+
+        # new folders are watched
+        (library / "renamed" / "sub").mkdir()
+        time.sleep(0.3)
+        (library / "renamed" / "sub" / "deep.bib").write_text(BIB_STR)
+        assert changes(events, 1) == {
+            ChangeEvent(CREATED, "renamed/sub/deep.bib")
+        }
+
+    assert events.empty()
+
+
+def test_watcher_inotify(library):
+    check_watcher(library, inotify=True)
+
+
+def test_watcher_polling(library):
+    check_watcher(library, inotify=False)
+
+
+def test_watcher_sync(library):
+    events = queue.Queue()
+    # the changes are reported by sync, not by the thread of the watcher
+    watcher = LibraryWatcher(library, interval=3600, inotify=False)
+    watcher.subscribe(events.put)
+
+    with watcher:
+        (library / "new.bib").write_text(BIB_STR)
+        watcher.sync()
+        assert events.get_nowait() == [ChangeEvent(CREATED, "new.bib")]
+
+        # modified in place, the folder does not change
+        with open(library / "new.bib", "a") as file:
+            file.write("\n")
+        watcher.sync()
+        assert events.get_nowait() == [ChangeEvent(MODIFIED, "new.bib")]
@@ -0,0 +1,134 @@
+from bibmancli import website
+from bibmancli.fuzzy import trigrams
+import tempfile
+import unicodedata
+import pathlib
+import json
+import shutil
+from entries import BIB_STR
+
+
+def test_write_site():
+    with tempfile.TemporaryDirectory() as dir:
+        library = pathlib.Path(dir) / "library"
+        (library / "sub").mkdir(parents=True)
+        (library / "beran_frontiers_2023.bib").write_text(BIB_STR)
+        (library / ".beran_frontiers_2023.txt").write_text("A note")
+        (library / "sub" / "copy.bib").write_text(BIB_STR)
+
+        folder = library / "_site"
+        result = website.write_site(library, folder)
+
+        assert result == (2, 2, 2, True)
+
+        page = (folder / "index.html").read_text()
+        assert '<option value="sub">sub (1 entries)</option>' in page
+
+        shard_file = folder / "data" / (website.folder_id(".") + "-0.js")
+        shard = shard_file.read_text()
+        search = (shard_file.with_suffix(".search.js")).read_text()
+        assert '" fr":[0]' in search
+        assert shard.startswith('bibmanShard("data/')
+        records = json.loads(shard[shard.index("[") : shard.rindex("]") + 1])
+        assert records[0]["path"] == "beran_frontiers_2023.bib"
+        assert records[0]["contents"]["note"] == "A note"
+
+
+def js_trigrams(text: str) -> set[str]:
+    """
+    Trigrams of the search page, whose tokenizer splits on [^\\p{L}\\p{N}]+
+    """
+    words = "".join(
+        c if unicodedata.category(c)[0] in "LN" else " " for c in text.lower()
+    ).split()
+    padded = [f"  {word} " for word in words]
+    return {p[i : i + 3] for p in padded for i in range(len(p) - 2)}
+
+
+def test_site_search_trigrams(tmp_path):
+    library = tmp_path / "library"
+    library.mkdir()
+    titles = {
+        "accents": "Théorie des fonctionnelles de la densité, l'état de l'art",
+        "latex": r"Schr\"{o}dinger's {\'E}quation for $\alpha$-helices",
+    }
+    for name, title in titles.items():
+        (library / f"{name}.bib").write_text(
+            BIB_STR.replace("beran_frontiers_2023", name).replace(
+                "Frontiers of molecular crystal structure prediction for "
+                "pharmaceuticals and functional organic materials",
+                title,
+            )
+        )
+
+    folder = library / "_site"
+    website.write_site(library, folder)
+
+    shard_file = folder / "data" / (website.folder_id(".") + "-0.js")
+    shard = shard_file.read_text()
+    records = json.loads(shard[shard.index("[") : shard.rindex("]") + 1])
+    search = shard_file.with_suffix(".search.js").read_text()
+    search = json.loads(search[search.index(",") + 1 : search.rindex(")")])
+
+    grams = [set() for _ in records]
+    for gram, entries in search["grams"].items():
+        for i in entries:
+            grams[i].add(gram)
+    assert search["sizes"] == [len(entry_grams) for entry_grams in grams]
+
+    for record, entry_grams in zip(records, grams):
+        contents = record["contents"]
+        text = " ".join(
+            contents.get(field, "") for field in website.SEARCH_FIELDS
+        )
+        assert "\\" not in contents["title"]
+        # the postings are the trigrams of bibman and of the search page
+        assert entry_grams == trigrams(text) == js_trigrams(text)
+
+    # accented letters and converted LaTeX are letters of the words
+    for gram in ("röd", "ödi", " éq", " ét", "ité", " α "):
+        assert gram in search["grams"]
+
+
+def test_update_site():
+    with tempfile.TemporaryDirectory() as dir:
+        library = pathlib.Path(dir) / "library"
+        for name in ("a", "b"):
+            (library / name).mkdir(parents=True)
+            (library / name / "entry.bib").write_text(BIB_STR)
+
+        folder = library / "_site"
+        assert website.write_site(library, folder) == (2, 2, 2, True)
+        assert website.write_site(library, folder) == (2, 2, 0, False)
+
+        # only the folder with the new note is written again
+        (library / "a" / ".entry.txt").write_text("A note")
+        assert website.write_site(library, folder) == (2, 2, 1, False)
+
+        shutil.rmtree(library / "b")
+        assert website.write_site(library, folder) == (1, 1, 0, True)
+        assert len(list((folder / "data").iterdir())) == 2
+
+        assert website.write_site(library, folder, full=True) == (
+            1,
+            1,
+            1,
+            False,
+        )
+
+
+def test_shard_writer():
+    with tempfile.TemporaryDirectory() as dir:
+        writer = website.ShardWriter(pathlib.Path(dir), shard_size=2)
+        for i in range(5):
+            writer.add(
+                "b" if i % 2 else "a",
+                {"path": str(i), "contents": {"title": f"Title {i}"}},
+            )
+        shards = writer.close()
+
+        assert [(shard["folder"], shard["count"]) for shard in shards] == [
+            ("a", 2),
+            ("a", 1),
+            ("b", 2),
+        ]